@@ -0,0 +1,447 @@
+"""
+Reproducible scan benchmark for the CPU and GPU engines.
+
+A run generates, from one seed,
+
+    corpora      every size x byte distribution in SIZES / DISTRIBUTIONS,
+                 with instances of some signatures planted in them
+    signatures   synthetic daily.ndb-style bodies (plain hex, '??' wildcards,
+                 multi-part with '*' and {n-m} gaps) plus the bodies of
+                 daily.ndb itself
+
+and times scan_file (cpu) and gpu_malware_scan (gpu) on every corpus file.
+Each engine / corpus case runs in its own process, so the peak RSS is that
+case's alone and the first (warm-up) scan pays the JIT and table builds.
+Without a CUDA device the gpu cases run on the CUDA simulator, which only
+gets corpora up to SIMULATOR_MAX_BYTES.
+
+    python benchmark.py                                 # writes bench_results.json
+    python benchmark.py --save-baseline baseline.json   # record a baseline
+    python benchmark.py --baseline baseline.json        # exit 1 on a regression
+
+A case regresses when its MB/s drops, or its peak RSS grows, by more than
+the tolerance against the baseline case of the same name; it also fails
+when the engines disagree on the match count of a corpus.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'Code_to_get_signature'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'CPU'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'GPU'))
+
+from ndb_convert import normalize_ndb_line
+
+RESULTS_VERSION = 1
+SIZES = {"tiny": 4 * 1024, "small": 64 * 1024, "medium": 1024 * 1024, "large": 16 * 1024 * 1024}
+DISTRIBUTIONS = ("zeros", "random", "text", "pe")
+ENGINES = ("cpu", "gpu")
+SIMULATOR_MAX_BYTES = 64 * 1024  # the CUDA simulator runs about 4 KB/s
+SIGNATURE_KINDS = ("literal", "wildcard", "multipart")
+PLANT_EVERY = 25                 # every 25th signature gets an instance in each corpus
+DEFAULT_NDB = os.path.join(os.path.dirname(__file__), '..', 'Code_to_get_signature', 'daily.ndb')
+
+_WORDS = (b"the", b"file", b"data", b"http", b"www", b"user", b"system", b"error", b"value", b"return",
+          b"function", b"var", b"if", b"else", b"for", b"int", b"char", b"string", b"null", b"true")
+
+
+# ---------------------------------------------------------------- inputs
+
+def make_signatures(count, rng, ndb_path=None):
+    """count synthetic signatures (kinds in turn) followed by the valid bodies of ndb_path."""
+    signatures = []
+    for i in range(count):
+        kind = SIGNATURE_KINDS[i % len(SIGNATURE_KINDS)]
+        if kind == "literal":
+            body = rng.bytes(int(rng.integers(6, 24))).hex()
+        elif kind == "wildcard":
+            pairs = [byte.hex() for byte in (rng.bytes(1) for _ in range(int(rng.integers(8, 24))))]
+            for k in rng.choice(np.arange(2, len(pairs) - 2), size=2, replace=False):
+                pairs[k] = "??"
+            body = "".join(pairs)
+        else:
+            parts = [rng.bytes(int(rng.integers(4, 12))).hex() for _ in range(int(rng.integers(2, 4)))]
+            body = parts[0]
+            for part in parts[1:]:
+                gap = "*" if rng.random() < 0.5 else f"{{{int(rng.integers(0, 8))}-{int(rng.integers(8, 64))}}}"
+                body += gap + part
+        # A tenth are PE-only, so target-type filtering is part of the measurement
+        signatures.append({"name": f"Bench.{kind}-{i}", "type": "1" if i % 10 == 9 else "0",
+                           "offset": "*", "pattern": body})
+
+    if ndb_path and os.path.exists(ndb_path):
+        with open(ndb_path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                sig, _ = normalize_ndb_line(line)
+                if sig is not None and sig["offset"] == "*":
+                    signatures.append(sig)
+    return signatures
+
+
+def instance(body, rng):
+    """Concrete bytes matching a synthetic body: wildcards and gaps filled with random bytes."""
+    out = bytearray()
+    pos = 0
+    while pos < len(body):
+        if body[pos] == "*":
+            out += rng.bytes(int(rng.integers(0, 16)))
+            pos += 1
+        elif body[pos] == "{":
+            end = body.index("}", pos)
+            low = body[pos + 1:end].split("-")[0]
+            out += rng.bytes(int(low or 0))
+            pos = end + 1
+        elif body[pos:pos + 2] == "??":
+            out += rng.bytes(1)
+            pos += 2
+        else:
+            out.append(int(body[pos:pos + 2], 16))
+            pos += 2
+    return bytes(out)
+
+
+def make_corpus(distribution, size, rng):
+    """size bytes of the given distribution."""
+    if distribution == "zeros":
+        return bytearray(size)
+    if distribution == "random":
+        return bytearray(rng.bytes(size))
+    if distribution == "text":
+        words = rng.choice(len(_WORDS), size=size // 4 + 1)
+        text = b" ".join(_WORDS[w] for w in words)
+        return bytearray(text[:size])
+    # pe: MZ / PE headers, then code-like bytes (a few byte values dominate)
+    data = bytearray(np.minimum(rng.geometric(0.08, size=size) - 1, 255).astype(np.uint8).tobytes())
+    header = b"MZ" + bytes(58) + (64).to_bytes(4, "little") + b"PE\x00\x00"
+    data[:len(header)] = header[:size]
+    return data
+
+
+def plant(data, signatures, rng):
+    """Write an instance of every PLANT_EVERY-th synthetic signature at a random offset."""
+    for sig in signatures[::PLANT_EVERY]:
+        if not sig["name"].startswith("Bench."):
+            continue
+        blob = instance(sig["pattern"], rng)
+        if len(blob) + 64 >= len(data):
+            continue
+        at = int(rng.integers(64, len(data) - len(blob)))  # past the file type header
+        data[at:at + len(blob)] = blob
+    return data
+
+
+def write_inputs(workdir, sizes, distributions, signature_count, seed, ndb_path):
+    """
+    Generate the signature file and corpora in workdir; returns
+    (signature path, signature summary, corpora).
+    """
+    rng = np.random.default_rng(seed)
+    signatures = make_signatures(signature_count, rng, ndb_path)
+    signature_path = os.path.join(workdir, "signatures.json")
+    text = json.dumps(signatures, indent=2)
+    with open(signature_path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+    corpora = []
+    for distribution in distributions:
+        for size_name in sizes:
+            size = SIZES[size_name]
+            # One stream per corpus: adding a size doesn't change the others
+            corpus_rng = np.random.default_rng([seed, DISTRIBUTIONS.index(distribution), size])
+            data = plant(make_corpus(distribution, size, corpus_rng), signatures, corpus_rng)
+            path = os.path.join(workdir, f"{distribution}-{size_name}.bin")
+            with open(path, "wb") as f:
+                f.write(data)
+            corpora.append({"name": f"{distribution}-{size_name}", "distribution": distribution,
+                            "size": size, "path": path})
+    summary = {"count": len(signatures), "synthetic": signature_count,
+               "digest": hashlib.sha256(text.encode()).hexdigest()[:16]}
+    return signature_path, summary, corpora
+
+
+# ---------------------------------------------------------------- one case (child process)
+
+def peak_rss():
+    """Peak resident set size of this process in bytes (None where unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_case(engine, corpus_path, signature_path, repeats, warmup):
+    """Time one engine on one corpus file; returns the case's measurements."""
+    from metrics import METRICS
+
+    if engine == "cpu":
+        from cpu_scanner_caller import scan_file
+
+        def scan():
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                return scan_file(corpus_path, signature_path)['matches_found']
+    else:
+        from gpu_scanner import gpu_malware_scan
+        from signature_stream import stream_signatures
+        signatures = list(stream_signatures(signature_path))
+
+        def scan():
+            return gpu_malware_scan(corpus_path, signatures)['matches_found']
+
+    for _ in range(warmup):
+        scan()
+
+    METRICS.enable()
+    METRICS.reset()
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        matches = scan()
+        runs.append((time.perf_counter_ns() - start) / 1e9)
+
+    # Mean time of each phase over the timed runs
+    phases = {}
+    for entry in METRICS.snapshot()["histograms"].get("scan_phase_seconds", []):
+        phases[entry["labels"]["phase"]] = entry["sum"] / repeats
+
+    size = os.path.getsize(corpus_path)
+    seconds = statistics.median(runs)
+    return {
+        "seconds": seconds,
+        "runs": runs,
+        "mb_per_s": size / (1024 * 1024) / seconds if seconds > 0 else 0.0,
+        "phases": phases,
+        "peak_rss_bytes": peak_rss(),
+        "matches": matches,
+    }
+
+
+# ---------------------------------------------------------------- suite
+
+def cuda_available():
+    try:
+        from numba import cuda
+        return cuda.is_available()
+    except Exception:
+        return False
+
+
+def environment(simulator):
+    versions = {}
+    for module in ("numpy", "numba"):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "cuda_simulator": simulator,
+        **versions,
+    }
+
+
+def run_suite(engines=ENGINES, sizes=tuple(SIZES), distributions=DISTRIBUTIONS, signature_count=600,
+              seed=1234, repeats=3, warmup=1, workdir=None, ndb_path=DEFAULT_NDB, simulator=None):
+    """
+    Generate the inputs and run every engine / corpus case, each in a fresh
+    interpreter. simulator=None uses the CUDA simulator only without a device.
+    Returns the results dict (see RESULTS_VERSION).
+    """
+    if simulator is None:
+        simulator = "gpu" in engines and not cuda_available()
+
+    with contextlib.ExitStack() as stack:
+        if workdir is None:
+            workdir = stack.enter_context(tempfile.TemporaryDirectory(prefix="scan-bench-"))
+        os.makedirs(workdir, exist_ok=True)
+        signature_path, signature_summary, corpora = write_inputs(workdir, sizes, distributions,
+                                                                 signature_count, seed, ndb_path)
+        cases = []
+        for corpus in corpora:
+            for engine in engines:
+                case = {"name": f"{engine}/{corpus['name']}", "engine": engine,
+                        "corpus": corpus["name"], "distribution": corpus["distribution"], "size": corpus["size"]}
+                if engine == "gpu" and simulator and corpus["size"] > SIMULATOR_MAX_BYTES:
+                    case["skipped"] = "too large for the CUDA simulator"
+                else:
+                    print(f"[i] {case['name']} ...", flush=True)
+                    case.update(_run_child(engine, corpus["path"], signature_path, repeats, warmup, simulator))
+                cases.append(case)
+
+    return {
+        "version": RESULTS_VERSION,
+        "timestamp": time.time(),
+        "seed": seed,
+        "repeats": repeats,
+        "warmup": warmup,
+        "signatures": signature_summary,
+        "environment": environment(simulator),
+        "cases": cases,
+    }
+
+
+def _run_child(engine, corpus_path, signature_path, repeats, warmup, simulator):
+    env = dict(os.environ)
+    env.pop("SCAN_METRICS", None)
+    if engine == "gpu" and simulator:
+        env["NUMBA_ENABLE_CUDASIM"] = "1"
+    command = [sys.executable, os.path.abspath(__file__), "--run-case", engine, corpus_path, signature_path,
+               "--repeats", str(repeats), "--warmup", str(warmup)]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else
+                f"exit status {completed.returncode}"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+# ---------------------------------------------------------------- reporting
+
+def check_consistency(results):
+    """Corpora on which the engines found different match counts."""
+    found = {}
+    for case in results["cases"]:
+        if "matches" in case:
+            found.setdefault(case["corpus"], {})[case["engine"]] = case["matches"]
+    return [f"{corpus}: match counts differ ({', '.join(f'{e} {n}' for e, n in sorted(counts.items()))})"
+            for corpus, counts in sorted(found.items()) if len(set(counts.values())) > 1]
+
+
+def compare(results, baseline, tolerance=0.10, rss_tolerance=0.25):
+    """
+    Regressions of results against baseline: (case name, message) for every
+    case whose MB/s fell by more than tolerance, or whose peak RSS grew by
+    more than rss_tolerance. Cases missing on either side are not compared.
+    """
+    regressions = []
+    previous = {case["name"]: case for case in baseline["cases"]}
+    for case in results["cases"]:
+        before = previous.get(case["name"])
+        if before is None or "mb_per_s" not in case or "mb_per_s" not in before:
+            continue
+        if case["mb_per_s"] < before["mb_per_s"] * (1 - tolerance):
+            regressions.append((case["name"], f"throughput {before['mb_per_s']:.2f} -> {case['mb_per_s']:.2f} MB/s "
+                                              f"({case['mb_per_s'] / before['mb_per_s'] - 1:+.0%})"))
+        if case["peak_rss_bytes"] and before["peak_rss_bytes"] and \
+                case["peak_rss_bytes"] > before["peak_rss_bytes"] * (1 + rss_tolerance):
+            regressions.append((case["name"], f"peak RSS {before['peak_rss_bytes'] / 2**20:.1f} -> "
+                                              f"{case['peak_rss_bytes'] / 2**20:.1f} MB"))
+    return regressions
+
+
+def baseline_warnings(results, baseline):
+    """Differences that make a baseline comparison less meaningful."""
+    warnings = []
+    if baseline.get("version") != results["version"]:
+        warnings.append(f"baseline format version {baseline.get('version')} != {results['version']}")
+    if baseline["signatures"]["digest"] != results["signatures"]["digest"]:
+        warnings.append("the signature set differs from the baseline's (seed, count or daily.ndb changed)")
+    for key in ("cuda_simulator", "cpu_count", "processor", "numba"):
+        if baseline["environment"].get(key) != results["environment"].get(key):
+            warnings.append(f"{key}: {baseline['environment'].get(key)} in the baseline, "
+                            f"{results['environment'].get(key)} now")
+    return warnings
+
+
+def format_table(results, baseline=None):
+    previous = {case["name"]: case for case in baseline["cases"]} if baseline else {}
+    lines = [f"{'case':<24} {'MB/s':>10} {'median s':>10} {'peak RSS':>10} {'matches':>8} {'vs base':>8}  phases"]
+    for case in results["cases"]:
+        if "mb_per_s" not in case:
+            lines.append(f"{case['name']:<24} {case.get('skipped') or 'error: ' + case.get('error', '')}")
+            continue
+        before = previous.get(case["name"])
+        delta = f"{case['mb_per_s'] / before['mb_per_s'] - 1:+.0%}" if before and before.get("mb_per_s") else ""
+        rss = f"{case['peak_rss_bytes'] / 2**20:.0f} MB" if case["peak_rss_bytes"] else "n/a"
+        phases = ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in case["phases"].items())
+        lines.append(f"{case['name']:<24} {case['mb_per_s']:>10.2f} {case['seconds']:>10.4f} {rss:>10} "
+                     f"{case['matches']:>8} {delta:>8}  {phases}")
+    return "\n".join(lines)
+
+
+def _write_json(data, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _csv(value, choices):
+    items = tuple(item.strip() for item in value.split(",") if item.strip())
+    unknown = [item for item in items if item not in choices]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown: {', '.join(unknown)} (choose from {', '.join(choices)})")
+    return items
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark scan_file (cpu) and gpu_malware_scan (gpu)")
+    parser.add_argument("--engines", type=lambda v: _csv(v, ENGINES), default=ENGINES)
+    parser.add_argument("--sizes", type=lambda v: _csv(v, tuple(SIZES)), default=tuple(SIZES))
+    parser.add_argument("--distributions", type=lambda v: _csv(v, DISTRIBUTIONS), default=DISTRIBUTIONS)
+    parser.add_argument("--signatures", type=int, default=600, help="synthetic signatures (daily.ndb is added)")
+    parser.add_argument("--ndb", default=DEFAULT_NDB, help="NDB file whose bodies join the signature set")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--repeats", type=int, default=3, help="timed scans per case (the median is reported)")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed scans per case first")
+    parser.add_argument("--simulator", choices=("auto", "on", "off"), default="auto",
+                        help="run the gpu engine on the CUDA simulator (auto: when there is no device)")
+    parser.add_argument("--workdir", default=None, help="keep the generated inputs here (default: a temp dir)")
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="results file to compare against")
+    parser.add_argument("--save-baseline", default=None, help="also write the results here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed MB/s drop (fraction)")
+    parser.add_argument("--rss-tolerance", type=float, default=0.25, help="allowed peak RSS growth (fraction)")
+    parser.add_argument("--run-case", nargs=3, metavar=("ENGINE", "CORPUS", "SIGNATURES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(*args.run_case, repeats=args.repeats, warmup=args.warmup)))
+        sys.exit(0)
+
+    results = run_suite(args.engines, args.sizes, args.distributions, args.signatures, args.seed,
+                        args.repeats, args.warmup, args.workdir, args.ndb,
+                        None if args.simulator == "auto" else args.simulator == "on")
+    _write_json(results, args.output)
+    if args.save_baseline:
+        _write_json(results, args.save_baseline)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print()
+    print(format_table(results, baseline))
+    print(f"\n[i] Results written to {args.output}")
+
+    failures = check_consistency(results)
+    for message in failures:
+        print(f"[!] {message}")
+    if baseline is not None:
+        for message in baseline_warnings(results, baseline):
+            print(f"[!] Baseline: {message}")
+        regressions = compare(results, baseline, args.tolerance, args.rss_tolerance)
+        for name, message in regressions:
+            print(f"[-] Regression in {name}: {message}")
+        if not regressions:
+            print(f"[+] No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        failures += regressions
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,229 @@
+import numpy as np
+from numba import njit
+
+
+class AhoCorasick:
+    """
+    Multi-pattern byte matcher. All patterns are compiled into one automaton
+    stored in flat arrays, so a buffer is scanned in a single pass no matter
+    how many patterns there are.
+
+    Layout (state 0 is the root):
+        root_next[256]     - dense transitions out of the root
+        edge_start[S + 1]  - CSR index into edge_byte / edge_next per state
+        edge_byte, edge_next - sorted outgoing edges of every non-root state
+        fail[S]            - failure link
+        out_start[S + 1], out_ids - patterns ending exactly at each state
+        dict_link[S]       - nearest state on the failure chain with output (-1 = none)
+    """
+
+    ARRAY_NAMES = (
+        "root_next", "edge_start", "edge_byte", "edge_next",
+        "fail", "out_start", "out_ids", "dict_link", "empty_ids",
+    )
+
+    def __init__(self, patterns=None, arrays=None):
+        if arrays is not None:
+            for name in self.ARRAY_NAMES:
+                setattr(self, name, arrays[name])
+            self.pattern_count = int(np.asarray(arrays["pattern_count"]).reshape(-1)[0])
+        else:
+            self._build(list(patterns or []))
+
+    def _build(self, patterns):
+        self.pattern_count = len(patterns)
+
+        # Trie: one dict for every edge, keyed by (state << 8) | byte
+        edges = {}
+        depth = [0]
+        terminals = []
+        empty_ids = []
+
+        for pid, pattern in enumerate(patterns):
+            if not pattern:
+                empty_ids.append(pid)
+                continue
+            state = 0
+            for b in pattern:
+                key = (state << 8) | b
+                nxt = edges.get(key)
+                if nxt is None:
+                    nxt = len(depth)
+                    edges[key] = nxt
+                    depth.append(depth[state] + 1)
+                state = nxt
+            terminals.append((state, pid))
+
+        state_count = len(depth)
+
+        # Sorted keys group edges by state, then by byte -> CSR directly
+        keys = np.fromiter(sorted(edges), dtype=np.int64, count=len(edges))
+        edge_src = keys >> 8
+        edge_byte = (keys & 0xFF).astype(np.uint8)
+        edge_next = np.fromiter((edges[k] for k in keys.tolist()), dtype=np.int32, count=len(keys))
+        edge_start = np.searchsorted(edge_src, np.arange(state_count + 1)).astype(np.int64)
+
+        root_next = np.zeros(256, dtype=np.int32)
+        root_edges = slice(edge_start[0], edge_start[1])
+        root_next[edge_byte[root_edges]] = edge_next[root_edges]
+
+        # Outputs per state (CSR)
+        terminals.sort()
+        out_states = np.array([s for s, _ in terminals], dtype=np.int64)
+        out_ids = np.array([pid for _, pid in terminals], dtype=np.int32)
+        out_start = np.searchsorted(out_states, np.arange(state_count + 1)).astype(np.int64)
+        has_output = out_start[1:] != out_start[:-1]
+
+        # Failure and dictionary links, computed in BFS (depth) order
+        fail = np.zeros(state_count, dtype=np.int32)
+        dict_link = np.full(state_count, -1, dtype=np.int32)
+        order = np.argsort(np.array(depth, dtype=np.int32), kind="stable")
+        byte_list = edge_byte.tolist()
+        next_list = edge_next.tolist()
+        start_list = edge_start.tolist()
+        fail_list = [0] * state_count
+        dict_list = [-1] * state_count
+        has_output_list = has_output.tolist()
+
+        for parent in order.tolist():
+            for e in range(start_list[parent], start_list[parent + 1]):
+                child = next_list[e]
+                b = byte_list[e]
+                if parent == 0:
+                    fail_list[child] = 0
+                    continue
+                f = fail_list[parent]
+                while True:
+                    target = edges.get((f << 8) | b)
+                    if target is not None:
+                        fail_list[child] = target
+                        break
+                    if f == 0:
+                        fail_list[child] = 0
+                        break
+                    f = fail_list[f]
+                f = fail_list[child]
+                dict_list[child] = f if has_output_list[f] else dict_list[f]
+
+        fail[:] = fail_list
+        dict_link[:] = dict_list
+
+        self.root_next = root_next
+        self.edge_start = edge_start
+        self.edge_byte = edge_byte
+        self.edge_next = edge_next
+        self.fail = fail
+        self.out_start = out_start
+        self.out_ids = out_ids
+        self.dict_link = dict_link
+        self.empty_ids = np.array(empty_ids, dtype=np.int32)
+
+    def arrays(self):
+        """Return the flat arrays backing the automaton (for persistence)."""
+        arrays = {name: getattr(self, name) for name in self.ARRAY_NAMES}
+        arrays["pattern_count"] = np.array(self.pattern_count, dtype=np.int64)
+        return arrays
+
+    def patterns(self):
+        """Recover the pattern bytes from the trie (walking up from each terminal state)."""
+        state_count = len(self.edge_start) - 1
+        parent = np.zeros(state_count, dtype=np.int64)
+        byte_in = np.zeros(state_count, dtype=np.uint8)
+        parent[self.edge_next] = np.repeat(np.arange(state_count), np.diff(self.edge_start))
+        byte_in[self.edge_next] = self.edge_byte
+
+        terminal = np.zeros(self.pattern_count, dtype=np.int64)
+        terminal[self.out_ids] = np.repeat(np.arange(state_count), np.diff(self.out_start))
+        parent_list = parent.tolist()
+        depth = [0] * state_count
+        for state in range(1, state_count):
+            # Children are always numbered after their parent
+            depth[state] = depth[parent_list[state]] + 1
+        lengths = np.array(depth, dtype=np.int64)[terminal]
+
+        # All patterns climb one level per step, longest first
+        out = np.zeros((self.pattern_count, int(lengths.max()) if len(lengths) else 0), dtype=np.uint8)
+        state = terminal.copy()
+        for level in range(out.shape[1] - 1, -1, -1):
+            climbing = lengths > level
+            out[climbing, level] = byte_in[state[climbing]]
+            state[climbing] = parent[state[climbing]]
+        return [out[pid, :lengths[pid]].tobytes() for pid in range(self.pattern_count)]
+
+    def scan(self, data, counts=None, state=0, report=None, count_from=0):
+        """
+        Scan a buffer in one pass.
+
+        Returns (counts, state): per-pattern occurrence counts and the final
+        automaton state, which can be passed back in to continue a stream.
+
+        If ``report`` (a bool array over patterns) is given, returns
+        (counts, state, hits) where hits is an (n, 2) array of
+        (pattern id, end offset) for every occurrence of a reported pattern.
+
+        Occurrences ending at or before ``count_from`` are not counted (they
+        are still reported), so overlapping stream windows count once.
+        """
+        if counts is None:
+            counts = np.zeros(self.pattern_count, dtype=np.int64)
+        buf = np.frombuffer(data, dtype=np.uint8)
+        if report is None:
+            report = np.zeros(self.pattern_count, dtype=np.bool_)
+            want_hits = False
+        else:
+            want_hits = True
+        hits = np.empty((64, 2), dtype=np.int64)
+        state, hits, nhits = _ac_scan(
+            buf, state, self.root_next, self.edge_start, self.edge_byte,
+            self.edge_next, self.fail, self.out_start, self.out_ids,
+            self.dict_link, counts, report, hits, count_from,
+        )
+        if len(self.empty_ids):
+            counts[self.empty_ids] = np.maximum(counts[self.empty_ids], 1)
+        if want_hits:
+            return counts, state, hits[:nhits]
+        return counts, state
+
+
+@njit(cache=True, nogil=True)  # releases the GIL, so a prefetch thread can read meanwhile
+def _ac_scan(data, state, root_next, edge_start, edge_byte, edge_next,
+             fail, out_start, out_ids, dict_link, counts, report, hits, count_from):
+    nhits = 0
+    for i in range(data.shape[0]):
+        b = data[i]
+        while True:
+            if state == 0:
+                state = root_next[b]
+                break
+            lo = edge_start[state]
+            end = edge_start[state + 1]
+            hi = end
+            while lo < hi:
+                mid = (lo + hi) >> 1
+                if edge_byte[mid] < b:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo < end and edge_byte[lo] == b:
+                state = edge_next[lo]
+                break
+            state = fail[state]
+
+        s = state
+        if out_start[s] == out_start[s + 1]:
+            s = dict_link[s]
+        while s > 0:
+            for k in range(out_start[s], out_start[s + 1]):
+                pid = out_ids[k]
+                if i >= count_from:
+                    counts[pid] += 1
+                if report[pid]:
+                    if nhits == hits.shape[0]:
+                        grown = np.empty((hits.shape[0] * 2, 2), dtype=np.int64)
+                        grown[:nhits] = hits
+                        hits = grown
+                    hits[nhits, 0] = pid
+                    hits[nhits, 1] = i + 1
+                    nhits += 1
+            s = dict_link[s]
+    return state, hits, nhits
@@ -1,72 +1,143 @@
-import json
-import time
-
-def read_file_bytes(filepath):
-    """Read full file as bytes"""
-    with open(filepath, "rb") as f:
-        return f.read()
-
-def stream_signatures(filepath):
-    """Generator that yields one JSON object at a time from a large JSON array file."""
-    with open(filepath, 'r') as f:
-        # Skip the initial whitespace and the opening '['
-        while (c := f.read(1)) and c not in ['[']:
-            continue
-
-        buffer = ''
-        depth = 0
-        in_string = False
-        inside_object = False
-
-        while True:
-            c = f.read(1)
-            if not c:
-                break
-
-            if c == '{' and not in_string:
-                depth += 1
-                inside_object = True
-
-            if inside_object:
-                buffer += c
-
-            if c == '"' and buffer and buffer[-2] != '\\':  # Handle escaped quotes
-                in_string = not in_string
-
-            if c == '}' and not in_string:
-                depth -= 1
-                if depth == 0:
-                    yield json.loads(buffer)
-                    buffer = ''
-                    inside_object = False
-
-
-def scan_file(file_path, signature_path):
-    start_time = time.time()
-    comparison_count = 0
-    file_bytes = read_file_bytes(file_path)
-
-    matches = []
+import os
+import sys
+from contextlib import ExitStack
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'Code_to_get_signature'))
+
+from file_utils import iter_mapped_windows, map_file, HOST_STREAM_THRESHOLD, STREAM_CHUNK_SIZE
+from file_types import classify, parse_target_type, target_names, HEADER_SIZE
+from metrics import METRICS
+from pattern_matcher import SignatureMatcher
+from progress import PROGRESS_CHUNK_SIZE, reporter, track_windows
+from result_cache import signature_fingerprint
+from scan_result import build_result, cached_scan, matched_signatures_from_counts
+from sigdb import open_signature_db
+from signature_stream import stream_signatures
+
+_matcher_cache = {}
+
+def build_signature_matcher(signature_path):
+    """Compile every signature into one anchor-prefiltered matcher (built once per path)."""
+    if signature_path in _matcher_cache:
+        return _matcher_cache[signature_path]
+
+    # Compiled DB from pyt.py: tables are mmapped, nothing to parse
+    if signature_path.endswith(".db"):
+        matcher = open_signature_db(signature_path).matcher()
+        _matcher_cache[signature_path] = matcher
+        return matcher
+
+    names = []
+    bodies = []
+    offsets = []
+    types = []
     for sig in stream_signatures(signature_path):
-        pattern_hex = sig.get("pattern", "").lower()
-        try:
-            pattern_bytes = bytes.fromhex(pattern_hex)
-        except ValueError:
-            continue
-
-        comparison_count += 1
-        if pattern_bytes in file_bytes:
-            print(f"[+] Match found: {sig['name']}")
-            matches.append(sig['name'])
-
-    elapsed = time.time() - start_time
+        names.append(sig['name'])
+        bodies.append(sig.get("pattern", ""))
+        offsets.append(sig.get("offset", "*"))
+        types.append(parse_target_type(sig.get("type", 0)))
+
+    matcher = SignatureMatcher(names, bodies, offsets=offsets, types=np.array(types, dtype=np.int16))
+    _matcher_cache[signature_path] = matcher
+    return matcher
+
+
+def scan_stream(matcher, file_path, chunk_size=STREAM_CHUNK_SIZE, tracker=None):
+    """
+    Scan a mapped file in place, window by window (iter_mapped_windows: the
+    next window is read ahead, finished ones are dropped); resident memory
+    stays at about two windows of chunk_size + max_span.
+    """
+    state = matcher.new_stream()
+    with map_file(file_path, sequential=True) as data:
+        windows = iter_mapped_windows(data, matcher.max_span - 1, chunk_size, release=True)
+        for base, new_start, window in track_windows(windows, tracker):
+            matcher.scan_window(window, base, new_start, state)
+        # Offset-bound signatures only touch their own windows of the file
+        matcher.scan_offsets(data, state.counts)
+    return state.counts
+
+
+def scan_file(file_path, signature_path, chunk_size=None, cache=None, progress=None, cancel=None):
+    """
+    Scan one file and print its matches. Returns the same result dict as
+    gpu_malware_scan (scan_result.build_result, backend 'cpu'): the matches,
+    the target types the file was classified as and signatures_checked, the
+    number of signatures evaluated for those types.
+    progress gets a ScanProgress after every window; once cancel (a
+    threading.Event) is set, the scan stops with ScanCancelled.
+    """
+    # An unchanged file scanned with the same signatures is answered from the cache
+    if cache is not None:
+        fingerprint = signature_fingerprint(signature_path)
+        result = cached_scan(cache, file_path, fingerprint,
+                             lambda path: scan_file(path, signature_path, chunk_size, progress=progress, cancel=cancel),
+                             progress)
+        if result.get("cached"):
+            for name in result["threat_names"]:
+                print(f"[+] Match found: {name}")
+            print(f"\n[-] Cached verdict ({result['scan_time']:.3f} seconds).")
+            if not result["threat_names"]:
+                print("[-] No matches found.")
+        return result
+
+    trace = METRICS.trace("cpu")
+    file_size = os.path.getsize(file_path)
+
+    # Large files are streamed in overlapping chunks instead of read whole
+    # (and tracked ones in progress-sized chunks, to report and cancel between)
+    if chunk_size is None and file_size > HOST_STREAM_THRESHOLD:
+        chunk_size = STREAM_CHUNK_SIZE
+    elif chunk_size is None and file_size > PROGRESS_CHUNK_SIZE and (progress is not None or cancel is not None):
+        chunk_size = PROGRESS_CHUNK_SIZE
+    tracker = reporter(file_path, file_size, chunk_size, progress, cancel)
+    if tracker:
+        tracker.start()
+
+    # The mapped file is closed however the scan ends (e.g. cancelled)
+    with ExitStack() as files:
+        with trace.phase("read"):
+            if chunk_size:
+                with open(file_path, "rb") as f:
+                    data = f.read(HEADER_SIZE)
+            else:
+                # Mapped, not read: matched in place from the page cache
+                data = files.enter_context(map_file(file_path, sequential=True))
+
+        # Only signatures for this kind of file (plus type 0) are evaluated
+        with trace.phase("load"):
+            targets = classify(data)
+            matcher = build_signature_matcher(signature_path).for_targets(targets)
+        names = matcher.names
+        comparison_count = matcher.signature_count
+
+        with trace.phase("match"):
+            if chunk_size:
+                counts = scan_stream(matcher, file_path, chunk_size, tracker)
+            else:
+                # Single pass over the file for all signature anchors
+                counts = matcher.scan(data)
+    if tracker:
+        tracker.done()
+
+    matched = matched_signatures_from_counts(counts, names)
+    for name, _ in matched:
+        print(f"[+] Match found: {name}")
+
+    elapsed = trace.finish(file_size, comparison_count, len(matched))
+    phases = trace.as_dict()
     print("\n[-] Scan finished.")
+    print(f"[i] File type: {', '.join(target_names(targets))}")
     print(f"[i] Total signatures scanned: {comparison_count}")
-    print(f"[i] Time taken: {elapsed:.2f} seconds")
+    print(f"[i] Time taken: {elapsed:.2f} seconds "
+          f"({', '.join(f'{name} {seconds:.3f}s' for name, seconds in phases.items())})")
 
-    if not matches:
+    if not matched:
         print("[-] No matches found.")
-    return matches
+    return build_result(file_path, file_size, comparison_count, matched, elapsed, trace.seconds("match"),
+                        targets, backend="cpu", phases=phases)
 
 if __name__ == "__main__":
     scan_file("malware_files/eicar.txt", "C:/Users/mahme/Downloads/extract/signatures.json")
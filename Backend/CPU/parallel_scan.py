@@ -0,0 +1,55 @@
+import numba
+import numpy as np
+from numba import njit, prange
+
+
+def chunk_count(data_len, min_chunk=64 * 1024):
+    """Slices to split a buffer into: one per thread, but none smaller than min_chunk."""
+    return max(1, min(numba.get_num_threads(), data_len // min_chunk))
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def scan_patterns_parallel(data, data_len, pattern_bytes, pattern_masks, pattern_offsets, ranges, min_end, chunks):
+    """
+    Multi-core twin of scan_kernel_optimized: same packed (CSR) patterns,
+    same (data & mask) == value byte test (mask 0x00 = '??'), same min_end
+    rule for stream windows. Only patterns in the [first, last) rows of
+    ``ranges`` are tried.
+
+    The buffer is split into ``chunks`` slices run with prange; every slice
+    counts into its own row, so no atomics are needed, and the rows are
+    summed at the end. Returns int64 counts, one per pattern.
+    """
+    pattern_count = pattern_offsets.shape[0] - 1
+    partial = np.zeros((chunks, pattern_count), dtype=np.int32)
+    chunk_len = (data_len + chunks - 1) // chunks
+
+    for c in prange(chunks):
+        lo = c * chunk_len
+        hi = min(lo + chunk_len, data_len)
+        for idx in range(lo, hi):
+            for r in range(ranges.shape[0]):
+                for s in range(ranges[r, 0], ranges[r, 1]):
+                    start = pattern_offsets[s]
+                    pat_len = pattern_offsets[s + 1] - start
+                    if idx + pat_len > data_len or idx + pat_len <= min_end:
+                        continue
+
+                    match = True
+                    for j in range(pat_len):
+                        mask = pattern_masks[start + j]
+                        if mask != 0:  # Not a wildcard
+                            if (data[idx + j] & mask) != pattern_bytes[start + j]:
+                                match = False
+                                break
+
+                    if match:
+                        partial[c, s] += 1
+
+    counts = np.zeros(pattern_count, dtype=np.int64)
+    for s in prange(pattern_count):
+        total = 0
+        for c in range(chunks):
+            total += partial[c, s]
+        counts[s] = total
+    return counts
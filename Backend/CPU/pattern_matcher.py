@@ -0,0 +1,466 @@
+import mmap
+import os
+import sys
+from array import array
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'Code_to_get_signature'))
+
+from aho_corasick import AhoCorasick
+from file_types import target_mask
+from ndb_offset import OffsetTable, parse_executable
+from ndb_pattern import candidate_starts, compile_pattern, match_part_at_anchor, match_part_at, count_in_window
+
+
+class SignatureMatcher:
+    """
+    Matcher for full NDB signature bodies (wildcards, gaps, alternations).
+
+    The anchor of every signature part goes into one Aho-Corasick automaton.
+    A buffer is scanned once for all anchors, and a part is only verified
+    around its anchor hits, so the cost follows how often anchors occur
+    rather than signatures x file length. Signatures that are a plain
+    literal are counted straight from the automaton.
+
+    Everything the scan loop needs lives in flat arrays (see ARRAY_NAMES), so
+    a matcher can be rebuilt from a compiled signature DB without creating a
+    Python object per signature. Pattern programs are only compiled for
+    signatures whose anchors actually hit.
+
+    With ``offsets`` (NDB offset specs or an OffsetTable), signatures bound
+    to an offset (EP+n, EOF-n, ...) stay out of the automaton and are only
+    checked inside their resolved window by scan_offsets.
+
+    With ``types`` (NDB target type per signature), for_targets gives the
+    matcher for one kind of file: type-0 signatures plus those aimed at
+    that file type.
+    """
+
+    ARRAY_NAMES = (
+        "anchor_part_start",  # CSR: parts using each anchor
+        "anchor_part_ids",
+        "anchor_lengths",
+        "part_sig",           # owning signature of each part
+        "part_index",         # position of the part inside its signature
+        "part_anchor",        # anchor id of each part (-1 = no literal byte)
+        "part_direct",        # literal single-part signature: count without verifying
+        "part_max_len",       # longest possible span of each part
+        "sig_part_start",     # CSR: parts of each signature
+        "compiled",           # signature compiled successfully
+    )
+
+    def __init__(self, names, bodies, arrays=None, automaton=None, active=None, offsets=None, types=None):
+        self.names = names
+        self.bodies = bodies
+        self.types = types
+        self._programs = {}
+        self._by_targets = {}
+        if offsets is not None and not isinstance(offsets, OffsetTable):
+            offsets = OffsetTable(offsets)
+        self.offset_table = offsets
+        self._shared = {}  # lazily built tables shared with restricted copies
+
+        if arrays is None:
+            arrays, automaton = self._compile(names, bodies)
+        for name in self.ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.automaton = automaton
+
+        self.skipped = int(len(self.compiled) - np.count_nonzero(self.compiled))
+        self.active = active
+        self._prepare()
+
+    def _compile(self, names, bodies):
+        bounded = self.offset_table.bounded if self.offset_table is not None else None
+        tables = PartTables()
+        for sig_idx, body in enumerate(bodies):
+            try:
+                program = compile_pattern(body)
+            except ValueError:
+                program = None
+            tables.add(program, bounded is not None and bool(bounded[sig_idx]))
+        return tables.build()
+
+    def _prepare(self):
+        """Derive the per-scan lookup arrays, honouring the active signature subset."""
+        sig_active = self.compiled.copy()
+        if self.active is not None:
+            sig_active &= np.asarray(self.active, dtype=np.bool_)
+        
+        # Offset-bound signatures are verified in their window, not swept
+        self._bounded = np.empty(0, dtype=np.int64)
+        if self.offset_table is not None:
+            self._bounded = np.flatnonzero(sig_active & self.offset_table.bounded)
+            sig_active &= ~self.offset_table.bounded
+        part_active = sig_active[self.part_sig]
+
+        direct = self.part_direct & part_active
+        self._direct_parts = np.flatnonzero(direct)
+        self._verify_part = ~self.part_direct & part_active
+        self._unanchored = np.flatnonzero((self.part_anchor < 0) & self._verify_part)
+
+        # Only anchors feeding a part that needs verification report positions
+        report = np.zeros(len(self.anchor_lengths), dtype=np.bool_)
+        verify_anchors = self.part_anchor[self._verify_part]
+        report[verify_anchors[verify_anchors >= 0]] = True
+        self.report = report
+
+        # Longest byte window any reported match (or anchor) can need
+        spans = self.part_max_len[part_active]
+        self.max_span = int(max(spans.max() if len(spans) else 1,
+                                self.anchor_lengths.max() if len(self.anchor_lengths) else 1))
+
+    def arrays(self):
+        """Return the flat arrays backing the matcher and its automaton (for persistence)."""
+        arrays = {name: getattr(self, name) for name in self.ARRAY_NAMES}
+        for name, value in self.automaton.arrays().items():
+            arrays["ac_" + name] = value
+        if self.offset_table is not None:
+            arrays.update(self.offset_table.arrays())
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, names, bodies, arrays, active=None, types=None):
+        automaton = AhoCorasick(arrays={
+            name: arrays["ac_" + name]
+            for name in AhoCorasick.ARRAY_NAMES + ("pattern_count",)
+        })
+        offsets = None
+        if OffsetTable.ARRAY_NAMES[0] in arrays:
+            offsets = OffsetTable(arrays=arrays)
+        return cls(names, bodies, arrays=arrays, automaton=automaton, active=active,
+                   offsets=offsets, types=types)
+
+    def splice(self, keep, other, names, bodies, types=None):
+        """
+        Matcher for this matcher's signatures at ``keep`` followed by every
+        signature of ``other``, reusing the compiled part tables of both.
+        Only the anchor automaton is rebuilt (from the anchors still in use);
+        no signature body is compiled again.
+        """
+        keep = np.asarray(keep, dtype=np.int64)
+        part_counts = []
+        flats = []
+        for matcher, sigs in ((self, keep), (other, np.arange(len(other.compiled)))):
+            starts = matcher.sig_part_start[sigs]
+            counts = matcher.sig_part_start[sigs + 1] - starts
+            part_counts.append(counts)
+            flats.append(np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum(), dtype=np.int64))
+        part_counts = np.concatenate(part_counts)
+
+        # Anchors used by the surviving parts, deduplicated across both matchers
+        anchor_ids = {}
+        part_anchor = []
+        for matcher, flat in zip((self, other), flats):
+            old = matcher.part_anchor[flat]
+            used = np.unique(old[old >= 0])
+            remap = np.full(len(matcher.anchor_lengths) + 1, -1, dtype=np.int32)
+            if len(used):
+                anchors = matcher.automaton.patterns()
+                for aid in used.tolist():
+                    remap[aid] = anchor_ids.setdefault(anchors[aid], len(anchor_ids))
+            part_anchor.append(remap[old])  # -1 indexes the trailing -1
+        part_anchor = np.concatenate(part_anchor).astype(np.int32)
+
+        # CSR of parts per anchor, in part order
+        order = np.argsort(part_anchor, kind="stable")
+        order = order[part_anchor[order] >= 0]
+        anchor_count = len(anchor_ids)
+        sig_part_start = np.zeros(len(part_counts) + 1, dtype=np.int64)
+        np.cumsum(part_counts, out=sig_part_start[1:])
+
+        arrays = {
+            "anchor_part_start": np.searchsorted(part_anchor[order], np.arange(anchor_count + 1)).astype(np.int64),
+            "anchor_part_ids": order.astype(np.int32),
+            "anchor_lengths": np.array([len(a) for a in anchor_ids], dtype=np.int32),
+            "part_sig": np.repeat(np.arange(len(part_counts), dtype=np.int32), part_counts),
+            "part_anchor": part_anchor,
+            "sig_part_start": sig_part_start,
+            "compiled": np.concatenate([self.compiled[keep], other.compiled]),
+        }
+        for name in ("part_index", "part_direct", "part_max_len"):
+            arrays[name] = np.concatenate([getattr(self, name)[flats[0]], getattr(other, name)[flats[1]]])
+
+        offsets = None
+        if self.offset_table is not None and other.offset_table is not None:
+            kept = self.offset_table.subset(keep).arrays()
+            offsets = OffsetTable(arrays={name: np.concatenate([kept[name], array])
+                                          for name, array in other.offset_table.arrays().items()})
+        return SignatureMatcher(names, bodies, arrays=arrays, automaton=AhoCorasick(list(anchor_ids)),
+                                offsets=offsets, types=types)
+
+    def restrict(self, active):
+        """Same compiled tables, but only the signatures flagged in ``active`` are reported."""
+        arrays = {name: getattr(self, name) for name in self.ARRAY_NAMES}
+        matcher = SignatureMatcher(self.names, self.bodies, arrays=arrays,
+                                   automaton=self.automaton, active=active,
+                                   offsets=self.offset_table, types=self.types)
+        matcher._programs = self._programs
+        matcher._shared = self._shared
+        return matcher
+
+    def for_targets(self, targets):
+        """Matcher limited to the signatures that apply to a file of these target types (cached)."""
+        if self.types is None:
+            return self
+        matcher = self._by_targets.get(targets)
+        if matcher is None:
+            active = target_mask(self.types, targets)
+            if self.active is not None:
+                active &= np.asarray(self.active, dtype=np.bool_)
+            matcher = self._by_targets[targets] = self.restrict(active)
+        return matcher
+
+    @property
+    def signature_count(self):
+        """Number of usable signatures this matcher reports on."""
+        usable = self.compiled if self.active is None else self.compiled & self.active
+        return int(np.count_nonzero(usable))
+
+    def program(self, sig_idx):
+        program = self._programs.get(sig_idx)
+        if program is None:
+            program = self._programs[sig_idx] = compile_pattern(self.bodies[sig_idx])
+        return program
+
+    def _part(self, flat):
+        return self.program(int(self.part_sig[flat])).parts[int(self.part_index[flat])]
+
+    def new_stream(self):
+        """Fresh state for scan_window (match counts plus multi-part progress)."""
+        return StreamState(len(self.compiled))
+
+    def scan(self, data):
+        """Return an int64 array of match counts, one per signature."""
+        state = self.new_stream()
+        self.scan_window(data, 0, 0, state)
+        self.scan_offsets(data, state.counts)
+        return state.counts
+
+    def scan_offsets(self, data, counts):
+        """
+        Count the offset-bound signatures over a whole file (bytes or mmap).
+        Streams call this once per file next to scan_window, which skips them.
+        """
+        if not len(self._bounded):
+            return counts
+        data = _searchable(data)
+        exe = parse_executable(data)
+        lo, hi, ok = self.offset_table.windows(self._bounded, len(data), exe)
+        sigs, lo, hi = self._bounded[ok], lo[ok], hi[ok]
+
+        # Fixed-length patterns: one vectorized compare over every candidate start
+        values, masks, offsets, is_fixed = self._bounded_patterns()
+        fixed = is_fixed[sigs]
+        if fixed.any():
+            np.add.at(counts, *_count_fixed(np.frombuffer(data, dtype=np.uint8), sigs[fixed], lo[fixed], hi[fixed],
+                                            values, masks, offsets))
+        for sig_idx, start, stop in zip(sigs[~fixed].tolist(), lo[~fixed].tolist(), hi[~fixed].tolist()):
+            counts[sig_idx] += count_in_window(self.program(sig_idx), data, start, stop)
+        return counts
+
+    def _bounded_patterns(self):
+        """Packed values/masks (CSR over signature index) of offset-bound fixed signatures, built once."""
+        if "offset_patterns" not in self._shared:
+            count = len(self.compiled)
+            is_fixed = np.zeros(count, dtype=np.bool_)
+            lengths = np.zeros(count, dtype=np.int64)
+            values = []
+            masks = []
+            for sig_idx in np.flatnonzero(self.offset_table.bounded & self.compiled).tolist():
+                program = self.program(sig_idx)
+                if program.is_fixed:
+                    token = program.parts[0].tokens[0]
+                    is_fixed[sig_idx] = True
+                    lengths[sig_idx] = len(token.values)
+                    values.append(token.values)
+                    masks.append(token.masks)
+            offsets = np.zeros(count + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            self._shared["offset_patterns"] = (np.frombuffer(b"".join(values), dtype=np.uint8),
+                                               np.frombuffer(b"".join(masks), dtype=np.uint8), offsets, is_fixed)
+        return self._shared["offset_patterns"]
+
+    def scan_window(self, data, base, new_start, state):
+        """
+        Scan one window of a stream. ``base`` is the stream offset of data[0]
+        and data[:new_start] was already covered by the previous window.
+
+        Windows must overlap by at least max_span - 1 bytes. A match is only
+        counted in the window where it ends past new_start, so matches that
+        cross a chunk boundary are found exactly once.
+        """
+        if not isinstance(data, (bytes, bytearray)):
+            data = memoryview(data).cast("B")
+        sig_counts = state.counts
+        counts, _, hits = self.automaton.scan(data, report=self.report, count_from=new_start)
+
+        # Literal signatures: the anchor count is the answer
+        direct = self._direct_parts
+        np.add.at(sig_counts, self.part_sig[direct], counts[self.part_anchor[direct]])
+
+        # Everything else: verify the part around each anchor hit
+        occurrences = {}
+        for aid, end in hits.tolist():
+            anchor_pos = end - int(self.anchor_lengths[aid])
+            start, stop = self.anchor_part_start[aid], self.anchor_part_start[aid + 1]
+            for flat in self.anchor_part_ids[start:stop].tolist():
+                if not self._verify_part[flat]:
+                    continue
+                occ = match_part_at_anchor(self._part(flat), data, anchor_pos)
+                if occ is not None and occ[1] > new_start:
+                    occurrences.setdefault(flat, []).append((base + occ[0], base + occ[1]))
+
+        for flat in self._unanchored.tolist():
+            part = self._part(flat)
+            for pos in candidate_starts(part, data).tolist():
+                occ = match_part_at(part, data, pos)
+                if occ is not None and occ[1] > new_start:
+                    occurrences.setdefault(flat, []).append((base + occ[0], base + occ[1]))
+
+        self._combine_parts(occurrences, state)
+        return sig_counts
+
+    def _combine_parts(self, occurrences, state):
+        """Single-part signatures count occurrences; multi-part ones must match in order."""
+        sig_counts = state.counts
+        candidates = {int(self.part_sig[flat]) for flat in occurrences}
+        for sig_idx in candidates:
+            first = int(self.sig_part_start[sig_idx])
+            part_count = int(self.sig_part_start[sig_idx + 1]) - first
+            if part_count == 1:
+                sig_counts[sig_idx] += len(occurrences[first])
+                continue
+
+            # Parts are separated by unbounded gaps, so taking the earliest
+            # ending occurrence of each part in turn is always optimal. The
+            # progress is kept in the stream state across windows.
+            k, pos = state.progress.get(sig_idx, (0, 0))
+            if k == part_count:
+                continue
+            parts = self.program(sig_idx).parts
+            while k < part_count:
+                lowest = pos + parts[k].gap_before if k else 0
+                ends = [e for s, e in occurrences.get(first + k, ()) if s >= lowest]
+                if not ends:
+                    break
+                pos = min(ends)
+                k += 1
+            state.progress[sig_idx] = (k, pos)
+            if k == part_count:
+                sig_counts[sig_idx] += 1
+
+
+class PartTables:
+    """
+    Builder of SignatureMatcher's part tables (ARRAY_NAMES) and anchor
+    automaton, one compiled program at a time. Programs are not kept: only
+    the flat per-part rows and the distinct anchors are, so a caller that
+    compiles every body anyway (build_sections) compiles it once and drops it.
+    """
+
+    def __init__(self):
+        self._anchor_ids = {}  # anchor bytes -> id, in first-seen order
+        self._part_sig = array("i")
+        self._part_index = array("i")
+        self._part_anchor = array("i")
+        self._part_direct = array("b")
+        self._part_max_len = array("q")
+        self._sig_part_start = array("q", [0])
+        self._compiled = array("b")
+
+    def __len__(self):
+        return len(self._compiled)
+
+    def add(self, program, bounded=False):
+        """Append the next signature: its compiled program (None: failed to compile)."""
+        sig_idx = len(self._compiled)
+        self._compiled.append(program is not None)
+        if program is not None:
+            for k, part in enumerate(program.parts):
+                self._part_sig.append(sig_idx)
+                self._part_index.append(k)
+                self._part_direct.append(part.is_literal and len(program.parts) == 1)
+                self._part_max_len.append(part.max_len)
+                # Offset-bound signatures are verified in their window, not through the automaton
+                if part.anchor is None or bounded:
+                    self._part_anchor.append(-1)
+                else:
+                    self._part_anchor.append(self._anchor_ids.setdefault(part.anchor, len(self._anchor_ids)))
+        self._sig_part_start.append(len(self._part_sig))
+
+    def build(self):
+        """Return (arrays, automaton) for SignatureMatcher(arrays=..., automaton=...)."""
+        part_anchor = np.asarray(self._part_anchor).astype(np.int32)
+        # CSR of parts per anchor, in part order
+        order = np.argsort(part_anchor, kind="stable")
+        order = order[part_anchor[order] >= 0]
+        anchors = list(self._anchor_ids)
+        arrays = {
+            "anchor_part_start": np.searchsorted(part_anchor[order], np.arange(len(anchors) + 1)).astype(np.int64),
+            "anchor_part_ids": order.astype(np.int32),
+            "anchor_lengths": np.array([len(a) for a in anchors], dtype=np.int32),
+            "part_sig": np.asarray(self._part_sig).astype(np.int32),
+            "part_index": np.asarray(self._part_index).astype(np.int32),
+            "part_anchor": part_anchor,
+            "part_direct": np.asarray(self._part_direct).astype(np.bool_),
+            "part_max_len": np.asarray(self._part_max_len).astype(np.int64),
+            "sig_part_start": np.asarray(self._sig_part_start).astype(np.int64),
+            "compiled": np.asarray(self._compiled).astype(np.bool_),
+        }
+        return arrays, AhoCorasick(anchors)
+
+
+class StreamState:
+    """Per-stream match state for SignatureMatcher.scan_window."""
+
+    def __init__(self, signature_count):
+        self.counts = np.zeros(signature_count, dtype=np.int64)
+        self.progress = {}  # multi-part signature -> (next part, end of last matched part)
+
+
+def _searchable(data):
+    """
+    data as an object with find() (bytes, bytearray or mmap) for the offset
+    pass: a memoryview over the whole of one is unwrapped, so mapped input
+    isn't copied; any other buffer is.
+    """
+    if isinstance(data, (bytes, bytearray, mmap.mmap)):
+        return data
+    view = memoryview(data)
+    if isinstance(view.obj, (bytes, bytearray, mmap.mmap)) and view.c_contiguous and view.nbytes == len(view.obj):
+        return view.obj
+    return view.cast("B").tobytes()
+
+
+def _count_fixed(data, sigs, lo, hi, values, masks, offsets, max_cells=1 << 22):
+    """
+    Match fixed patterns at every start in [lo, hi] with array ops only.
+    Returns (signature ids, ones) ready for np.add.at.
+    """
+    lengths = offsets[sigs + 1] - offsets[sigs]
+    hi = np.minimum(hi, len(data) - lengths)
+    widths = np.maximum(hi - lo + 1, 0)
+
+    # One candidate per (signature, start)
+    cand_sig = np.repeat(np.arange(len(sigs)), widths)
+    cand_start = np.repeat(lo - np.cumsum(widths) + widths, widths) + np.arange(widths.sum())
+    cells_before = np.cumsum(lengths[cand_sig]) - lengths[cand_sig]
+    matched = []
+    first = 0
+    while first < len(cand_sig):
+        # Bounded batches of byte cells keep memory flat for wide windows
+        last = max(first + 1, int(np.searchsorted(cells_before, cells_before[first] + max_cells)))
+        batch_sig = cand_sig[first:last]
+        batch_len = lengths[batch_sig]
+        cell_cand = np.repeat(np.arange(len(batch_sig)), batch_len)
+        cell_step = np.arange(batch_len.sum()) - np.repeat(np.cumsum(batch_len) - batch_len, batch_len)
+        src = offsets[sigs[batch_sig]][cell_cand] + cell_step
+        got = data[cand_start[first:last][cell_cand] + cell_step]
+        mismatch = (got & masks[src]) != values[src]
+        bad = np.bincount(cell_cand[mismatch], minlength=len(batch_sig)) > 0
+        matched.append(sigs[batch_sig[~bad]])
+        first = last
+    hits = np.concatenate(matched) if matched else np.empty(0, dtype=np.int64)
+    return hits, 1
@@ -0,0 +1,123 @@
+"""
+Magic-byte file classification for NDB target types.
+
+The second field of an NDB line says which kind of file a signature is
+for. A file is classified once from its first bytes, and only signatures
+whose target type is 0 (any file) or one of the file's types are
+evaluated against it.
+"""
+
+import numpy as np
+
+TARGET_ANY = 0
+TARGET_PE = 1
+TARGET_OLE2 = 2
+TARGET_HTML = 3
+TARGET_MAIL = 4
+TARGET_GRAPHICS = 5
+TARGET_ELF = 6
+TARGET_TEXT = 7
+TARGET_MACHO = 9
+TARGET_PDF = 10
+TARGET_FLASH = 11
+TARGET_JAVA = 12
+
+TARGET_NAMES = {
+    TARGET_ANY: "any",
+    TARGET_PE: "pe",
+    TARGET_OLE2: "ole2",
+    TARGET_HTML: "html",
+    TARGET_MAIL: "mail",
+    TARGET_GRAPHICS: "graphics",
+    TARGET_ELF: "elf",
+    TARGET_TEXT: "text",
+    TARGET_MACHO: "macho",
+    TARGET_PDF: "pdf",
+    TARGET_FLASH: "flash",
+    TARGET_JAVA: "java",
+}
+
+KNOWN_TARGETS = np.array(sorted(TARGET_NAMES), dtype=np.int16)
+
+# Bytes looked at by classify()
+HEADER_SIZE = 4096
+
+_GRAPHICS_MAGIC = (
+    b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a", b"\xff\xd8\xff",
+    b"BM", b"II*\x00", b"MM\x00*",
+)
+_MACHO_MAGIC = (b"\xfe\xed\xfa\xce", b"\xce\xfa\xed\xfe", b"\xfe\xed\xfa\xcf", b"\xcf\xfa\xed\xfe")
+_MAIL_HEADERS = (b"from ", b"received:", b"return-path:", b"delivered-to:", b"message-id:", b"mime-version:")
+_HTML_MARKERS = (b"<html", b"<!doctype html", b"<script", b"<body", b"<iframe")
+_TEXT_BYTES = np.zeros(256, dtype=np.bool_)
+_TEXT_BYTES[32:127] = True
+_TEXT_BYTES[[8, 9, 10, 12, 13, 27]] = True
+_TEXT_BYTES[128:] = True  # UTF-8 / Latin-1
+
+
+def classify(data):
+    """
+    Target types of a file from its first HEADER_SIZE bytes (any bytes-like
+    object). Always contains TARGET_ANY; returned sorted as a tuple.
+    """
+    head = bytes(memoryview(data)[:HEADER_SIZE])
+    types = {TARGET_ANY}
+
+    if head[:2] == b"MZ":
+        types.add(TARGET_PE)
+    elif head[:4] == b"\x7fELF":
+        types.add(TARGET_ELF)
+    elif head[:4] in _MACHO_MAGIC:
+        types.add(TARGET_MACHO)
+    elif head[:4] == b"\xca\xfe\xba\xbe":
+        # Java class (major version >= 45) and Mach-O fat binary share a magic
+        major = int.from_bytes(head[6:8], "big")
+        types.add(TARGET_JAVA if major >= 45 else TARGET_MACHO)
+    elif head[:8] == b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1":
+        types.add(TARGET_OLE2)
+    elif head[:3] in (b"FWS", b"CWS", b"ZWS"):
+        types.add(TARGET_FLASH)
+    elif head.startswith(_GRAPHICS_MAGIC):
+        types.add(TARGET_GRAPHICS)
+
+    if b"%PDF-" in head[:1024]:
+        types.add(TARGET_PDF)
+
+    if len(types) == 1 and head and _TEXT_BYTES[np.frombuffer(head, dtype=np.uint8)].all():
+        types.add(TARGET_TEXT)
+        lowered = head.lower()
+        if lowered.lstrip().startswith(_MAIL_HEADERS):
+            types.add(TARGET_MAIL)
+        if any(marker in lowered for marker in _HTML_MARKERS):
+            types.add(TARGET_HTML)
+    return tuple(sorted(types))
+
+
+def parse_target_type(value):
+    """NDB type field -> int (-1 when it isn't a number)."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def target_mask(types, targets):
+    """
+    Signatures (by target type array) to evaluate for a file of the given
+    target types. Unknown target types are always evaluated, since leaving
+    them out could miss a match.
+    """
+    types = np.asarray(types)
+    return np.isin(types, targets) | ~np.isin(types, KNOWN_TARGETS)
+
+
+def target_names(targets):
+    return [TARGET_NAMES.get(t, str(t)) for t in targets]
+
+
+def target_bits(targets):
+    """Bitmask of target types for GPU kernels; bit 31 (unknown types) is always set."""
+    bits = 1 << 31
+    for t in targets:
+        bits |= 1 << t
+    return bits
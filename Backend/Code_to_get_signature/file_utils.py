@@ -1,16 +1,52 @@
+import mmap
+import multiprocessing
 import os
+import queue
+import threading
+from contextlib import contextmanager
+
+# Files larger than this are scanned as a stream of overlapping chunks; the
+# next chunk is read on a prefetch thread while the current one is scanned,
+# so streaming costs about max(I/O, scan) rather than the sum
+STREAM_THRESHOLD = 64 * 1024 * 1024
+STREAM_CHUNK_SIZE = 16 * 1024 * 1024
+PREFETCH_DEPTH = 2  # chunks / files read ahead of the one being scanned
+# The host matchers scan mapped files in place, where windows cost nothing
+# but the overlap, so they stream anything above one chunk: resident
+# memory stays about two windows (see iter_mapped_windows)
+HOST_STREAM_THRESHOLD = STREAM_CHUNK_SIZE
+
+def iter_files_in_directory(directory, extensions=None):
+    """
+    Generator version of list_files_in_directory: yields paths while the
+    tree is walked, so a scan can start before the walk finishes.
+    Symlinks are not followed and unreadable directories are skipped.
+    """
+    if extensions is not None:
+        extensions = tuple(ext.lower() for ext in extensions)
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            if extensions is None or entry.name.lower().endswith(extensions):
+                                yield entry.path
+                    except OSError:
+                        continue
+        except OSError:
+            continue
 
 def list_files_in_directory(directory, extensions=None):
     """
     Recursively list all files in the given directory.
     If extensions is provided, filter by file extensions (e.g., ['.exe', '.dll']).
     """
-    files = []
-    for root, _, filenames in os.walk(directory):
-        for fname in filenames:
-            if extensions is None or any(fname.lower().endswith(ext.lower()) for ext in extensions):
-                files.append(os.path.join(root, fname))
-    return files
+    return list(iter_files_in_directory(directory, extensions))
 
 def read_file_in_chunks(filepath, chunk_size=1024*1024):
     """
@@ -22,3 +58,217 @@ def read_file_in_chunks(filepath, chunk_size=1024*1024):
             if not chunk:
                 break
             yield chunk
+
+def read_file_with_overlap(filepath, overlap, chunk_size=1024*1024):
+    """
+    Generator over read_file_in_chunks that prepends the last `overlap` bytes
+    of the previous chunk, so a match of up to overlap + 1 bytes that crosses
+    a chunk boundary is still fully inside one window.
+
+    Yields (base, new_start, window): `base` is the file offset of window[0]
+    and window[new_start:] is the part not seen in the previous window.
+    Memory stays at chunk_size + overlap whatever the file size.
+    """
+    tail = b""
+    base = 0
+    for chunk in read_file_in_chunks(filepath, chunk_size):
+        window = tail + chunk if tail else chunk
+        yield base, len(tail), window
+        keep = min(overlap, len(window))
+        tail = window[len(window) - keep:] if keep else b""
+        base += len(window) - keep
+
+def read_windows_into(filepath, overlap, chunk_size, buffers):
+    """
+    read_file_with_overlap into a ring of preallocated buffers (each at
+    least chunk_size + overlap bytes, any writable buffer: bytearray,
+    pinned host memory, ...) instead of new bytes objects. Every window is
+    a memoryview into buffers[k % len(buffers)], so it is only valid until
+    len(buffers) - 1 further windows have been read.
+    """
+    ring = [memoryview(buf).cast("B") for buf in buffers]
+    base = 0
+    tail = 0
+    previous = None
+    k = 0
+    with open(filepath, 'rb', buffering=0) as f:
+        while True:
+            buf = ring[k % len(ring)]
+            if tail:
+                buf[:tail] = previous[len(previous) - tail:]
+            filled = 0
+            while filled < chunk_size:
+                n = f.readinto(buf[tail + filled:tail + chunk_size])
+                if not n:
+                    break
+                filled += n
+            if not filled:
+                return
+            window = buf[:tail + filled]
+            yield base, tail, window
+            keep = min(overlap, len(window))
+            base += len(window) - keep
+            tail = keep
+            previous = window
+            k += 1
+
+def worker_context():
+    """
+    multiprocessing context for worker process pools. Forking a process
+    whose thread pools are running (numba's prange workers, prefetch
+    threads) can leave a lock held in the child forever, so workers come
+    from a fork server (or are spawned where there is none).
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def prefetch(iterable, depth=PREFETCH_DEPTH):
+    """
+    Iterate over iterable with its items produced on a reader thread, up to
+    depth items ahead of the consumer, so the I/O behind each item overlaps
+    with the work on the previous ones. An exception in the reader is raised
+    in the consumer; leaving the loop early stops (and closes) the reader.
+    """
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    return
+            put((False, None))
+        except BaseException as e:
+            put((False, e))
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+
+    reader = threading.Thread(target=produce, name="prefetch", daemon=True)
+    reader.start()
+    try:
+        while True:
+            more, item = items.get()
+            if not more:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stop.set()
+        reader.join()
+
+def prefetch_file_windows(filepath, overlap, chunk_size=STREAM_CHUNK_SIZE, depth=PREFETCH_DEPTH, buffers=None):
+    """
+    The windows of read_file_with_overlap, read ahead on a prefetch thread
+    into reusable buffers: depth + 2 new bytearrays, or the given buffers
+    (more than depth + 2 of them keep each window valid for that many more
+    windows, e.g. while an asynchronous copy still reads from it).
+    """
+    if buffers is None:
+        size = max(1, min(chunk_size, os.path.getsize(filepath)) + overlap)
+        buffers = [bytearray(size) for _ in range(depth + 2)]
+    return prefetch(read_windows_into(filepath, overlap, chunk_size, buffers), depth)
+
+def iter_buffer_windows(buffer, overlap, chunk_size=1024*1024):
+    """
+    Same windows as read_file_with_overlap, over an in-memory buffer.
+    Windows are memoryview slices, so nothing is copied.
+    """
+    view = memoryview(buffer).cast("B")
+    length = len(view)
+    start = 0
+    new_start = 0
+    while True:
+        end = min(start + new_start + chunk_size, length)
+        yield start, new_start, view[start:end]
+        if end >= length:
+            break
+        keep = min(overlap, end - start)
+        new_start = keep
+        start = end - keep
+
+def iter_mapped_windows(mapped, overlap, chunk_size=STREAM_CHUNK_SIZE, release=False):
+    """
+    iter_buffer_windows over a file mapping, scanned in place: the kernel is
+    asked for the next window (MADV_WILLNEED) while one is scanned. With
+    release, the pages no later window needs are dropped (MADV_DONTNEED)
+    once it is done, so resident memory stays about two windows whatever
+    the file size. Only pass release for a read-only map of our own
+    (open_mapped / map_file): on a private or copy-on-write map DONTNEED
+    discards the contents. Any other buffer just gets iter_buffer_windows.
+    """
+    if not isinstance(mapped, mmap.mmap):
+        yield from iter_buffer_windows(mapped, overlap, chunk_size)
+        return
+    length = len(mapped)
+    released = 0
+    for base, new_start, window in iter_buffer_windows(mapped, overlap, chunk_size):
+        end = base + len(window)
+        ahead = end - end % mmap.PAGESIZE
+        _advise(mapped, "MADV_WILLNEED", ahead, min(chunk_size + overlap, length - ahead))
+        yield base, new_start, window
+        if not release:
+            continue
+        # The next window starts overlap bytes before this one's end
+        keep_from = max(end - overlap, 0)
+        keep_from -= keep_from % mmap.PAGESIZE
+        if keep_from > released:
+            _advise(mapped, "MADV_DONTNEED", released, keep_from - released)
+            released = keep_from
+
+def _advise(mapped, option, start, length):
+    """madvise hint on part of a mapping; ignored where unsupported."""
+    flag = getattr(mmap, option, None)
+    if flag is None or length <= 0:
+        return
+    try:
+        mapped.madvise(flag, start, length)
+    except (OSError, ValueError):
+        pass
+
+def open_mapped(filepath, sequential=True):
+    """
+    A whole file as a read-only mmap (b"" when empty), for zero-copy
+    scanning: np.frombuffer and memoryview slices of it read the page cache
+    directly. sequential hints a front-to-back read (MADV_SEQUENTIAL:
+    aggressive read-ahead). The map is closed when its last reference (or
+    view) is released, or with close().
+    """
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if sequential:
+        _advise(mapped, "MADV_SEQUENTIAL", 0, len(mapped))
+    return mapped
+
+@contextmanager
+def map_file(filepath, sequential=False):
+    """
+    Read-only mmap of a file (open_mapped), closed on leaving the block.
+    Without sequential it is meant for random access (offset-bound
+    signatures on streamed files). Empty files, which can't be mapped, give b"".
+    """
+    mapped = open_mapped(filepath, sequential)
+    if not isinstance(mapped, mmap.mmap):
+        yield mapped
+        return
+    try:
+        yield mapped
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            pass  # a view is still alive (e.g. in a traceback): closed when it goes
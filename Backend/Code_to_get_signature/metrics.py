@@ -0,0 +1,283 @@
+"""
+Scan metrics: counters, histograms and phase timers.
+
+One process-wide registry, METRICS, collects labelled counters and
+histograms; times are taken with perf_counter_ns and stored in seconds.
+It is disabled by default (set SCAN_METRICS=1 or call METRICS.enable()):
+while disabled, inc / observe return after one attribute test and timer
+hands back a shared no-op context manager.
+
+    from metrics import METRICS
+    METRICS.enable()
+    with METRICS.timer("scan_phase_seconds", phase="read", backend="cpu"):
+        data = f.read()
+    METRICS.inc("bytes_scanned_total", len(data), backend="cpu")
+    METRICS.write("scan_metrics.prom")     # Prometheus text format
+    METRICS.snapshot()                     # same numbers as a dict (to_json for a string)
+
+A ScanTrace keeps the phase times of one scan whether or not the
+registry is enabled, so a scan can report its own breakdown.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(float(1 << shift) for shift in range(12, 32, 2))  # 4 KB .. 1 GB
+
+# name: (type, help) of the metrics the scanners record
+METRIC_DESCRIPTIONS = {
+    "files_scanned_total": ("counter", "Files or buffers scanned"),
+    "bytes_scanned_total": ("counter", "Input bytes scanned"),
+    "signatures_evaluated_total": ("counter", "Signatures applied to scanned inputs, summed over scans"),
+    "matches_total": ("counter", "Signatures that matched, summed over scans"),
+    "cache_hits_total": ("counter", "Scans answered from the verdict cache"),
+    "scan_seconds": ("histogram", "Wall time of one scan"),
+    "scan_phase_seconds": ("histogram", "Wall time of one phase of a scan"),
+    "file_size_bytes": ("histogram", "Size of scanned inputs"),
+}
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _NullTimer:
+    elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "start", "elapsed")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = (time.perf_counter_ns() - self.start) / 1e9
+        self.metrics.observe(self.name, self.elapsed, **self.labels)
+        return False
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Registry of labelled counters and histograms (thread safe)."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}    # name -> {label key: value}
+        self._histograms = {}  # name -> {label key: _Histogram}
+        self._help = {name: text for name, (_, text) in METRIC_DESCRIPTIONS.items()}
+        self._buckets = {"file_size_bytes": SIZE_BUCKETS}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def describe(self, name, help_text, buckets=None):
+        """Help text (and histogram buckets) of a metric not in METRIC_DESCRIPTIONS."""
+        self._help[name] = help_text
+        if buckets is not None:
+            self._buckets[name] = tuple(float(b) for b in buckets)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            family = self._counters.setdefault(name, {})
+            family[key] = family.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            family = self._histograms.setdefault(name, {})
+            histogram = family.get(key)
+            if histogram is None:
+                histogram = family[key] = _Histogram(self._buckets.get(name, TIME_BUCKETS))
+            histogram.observe(value)
+
+    def timer(self, name, **labels):
+        """Context manager observing its wall time (seconds) into histogram name."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def trace(self, backend):
+        return ScanTrace(self, backend)
+
+    def record_scan(self, backend, size, signatures, matches, seconds, cached=False):
+        """The standard per-scan counters and histograms."""
+        if not self.enabled:
+            return
+        if cached:
+            self.inc("cache_hits_total", backend=backend)
+            return
+        self.inc("files_scanned_total", backend=backend)
+        self.inc("bytes_scanned_total", size, backend=backend)
+        self.inc("signatures_evaluated_total", signatures, backend=backend)
+        self.inc("matches_total", matches, backend=backend)
+        self.observe("scan_seconds", seconds, backend=backend)
+        self.observe("file_size_bytes", size, backend=backend)
+
+    def snapshot(self):
+        """Every metric as plain data: {"counters": {...}, "histograms": {...}}."""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in sorted(family.items())]
+                for name, family in sorted(self._counters.items())
+            }
+            histograms = {
+                name: [{"labels": dict(key), "buckets": list(h.buckets), "counts": list(h.counts),
+                        "sum": h.sum, "count": h.count} for key, h in sorted(family.items())]
+                for name, family in sorted(self._histograms.items())
+            }
+        return {"timestamp": time.time(), "counters": counters, "histograms": histograms}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, series in snapshot["counters"].items():
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for entry in series:
+                key = _label_key(entry["labels"])
+                lines.append(f"{name}{_format_labels(key)} {_format_number(entry['value'])}")
+        for name, series in snapshot["histograms"].items():
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for entry in series:
+                key = _label_key(entry["labels"])
+                cumulative = 0
+                for bound, count in zip(entry["buckets"] + [float("inf")], entry["counts"]):
+                    cumulative += count
+                    le = (("le", _format_number(bound)),)
+                    lines.append(f"{name}_bucket{_format_labels(key, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_number(entry['sum'])}")
+                lines.append(f"{name}_count{_format_labels(key)} {entry['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write a snapshot: Prometheus text for *.prom, JSON otherwise (atomically)."""
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+class ScanTrace:
+    """
+    Phase times of one scan. They're always kept (a couple of clock reads
+    per phase) so the caller can report them, and go to the registry as
+    scan_phase_seconds{phase, backend} only while it is enabled.
+    """
+
+    def __init__(self, metrics, backend):
+        self.metrics = metrics
+        self.backend = backend
+        self.phases = {}  # name -> ns
+        self.start = time.perf_counter_ns()
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def add(self, name, ns):
+        self.phases[name] = self.phases.get(name, 0) + ns
+        self.metrics.observe("scan_phase_seconds", ns / 1e9, phase=name, backend=self.backend)
+
+    def seconds(self, name):
+        return self.phases.get(name, 0) / 1e9
+
+    @property
+    def elapsed(self):
+        """Seconds since the trace started."""
+        return (time.perf_counter_ns() - self.start) / 1e9
+
+    def as_dict(self):
+        return {name: ns / 1e9 for name, ns in self.phases.items()}
+
+    def finish(self, size, signatures, matches):
+        """Record the scan as a whole; returns its total seconds."""
+        total = self.elapsed
+        self.metrics.record_scan(self.backend, size, signatures, matches, total)
+        return total
+
+
+class _Phase:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, time.perf_counter_ns() - self.start)
+        return False
+
+
+METRICS = Metrics(enabled=os.environ.get("SCAN_METRICS", "") not in ("", "0"))
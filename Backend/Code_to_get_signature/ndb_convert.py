@@ -0,0 +1,226 @@
+"""
+Parallel NDB -> JSON / JSON Lines converter.
+
+The input is split into byte ranges that start and end on line
+boundaries; worker processes parse their ranges independently, validate
+and normalize every record (hex body lower-cased and checked against
+the NDB pattern syntax, name / type / offset stripped) and write what they
+accept straight to a part file. The parts are then appended to the
+output in input order, so neither the workers nor the parent ever hold
+more than a block of records, whatever the size of main.ndb.
+
+Rejected lines are counted per category, with a few examples each:
+
+    malformed        fewer than four ':' separated fields
+    encoding         not valid UTF-8
+    empty_name       no signature name
+    bad_type         target type is not a number
+    empty_body       no hex body
+    invalid_hex      odd-length body or a non-hex character
+    invalid_pattern  broken gap / alternation syntax
+
+    report = convert_ndb("main.ndb", "signatures.jsonl")
+"""
+
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from file_utils import worker_context
+from ndb_pattern import compile_pattern
+
+MIN_RANGE_BYTES = 1024 * 1024  # smaller inputs aren't worth another range
+RANGES_PER_WORKER = 4          # more ranges than workers evens out slow ranges
+WRITE_BATCH = 4096             # records per write() in a worker
+REJECT_EXAMPLES = 5            # example lines kept per reject category
+
+REJECT_CATEGORIES = ("malformed", "encoding", "empty_name", "bad_type", "empty_body",
+                     "invalid_hex", "invalid_pattern")
+
+# Bodies made of hex pairs ('?' nibble wildcards), '*', (aa|bb) alternations and
+# {n-m} / [n-m] gaps are checked by regex; anything else goes through the
+# pattern compiler, which also names the error
+_HEX_PAIRS = r"(?:[0-9a-f?]{2})+"
+_GAP = r"\{(?:\d+|\d*-\d*)\}|\[(?:\d+|\d*-\d*)\]"
+_SIMPLE_BODY = re.compile(rf"(?:[0-9a-f?]{{2}}|\*|{_GAP}|\({_HEX_PAIRS}(?:\|{_HEX_PAIRS})*\))+")
+_GAPS = re.compile(_GAP)
+_GAP_RANGES = re.compile(r"[{\[](\d+)-(\d+)[}\]]")
+_CONTENT = re.compile(r"[0-9a-f?(]")
+
+
+def _simple_body_valid(body):
+    """True when the regex alone proves compile_pattern accepts body."""
+    if not _SIMPLE_BODY.fullmatch(body):
+        return False
+    if "{" not in body and "[" not in body:
+        return _CONTENT.search(body) is not None
+    if any(int(lo) > int(hi) for lo, hi in _GAP_RANGES.findall(body)):
+        return False
+    return _CONTENT.search(_GAPS.sub("", body)) is not None
+
+
+def normalize_ndb_line(line):
+    """
+    Parse one NDB line into a signature dict: (signature, None) when it is
+    valid, (None, category) when it is rejected and (None, None) for
+    comments and blank lines.
+    """
+    if not line.strip() or line.startswith("#"):
+        return None, None
+    parts = line.strip().split(":")
+    if len(parts) < 4:
+        return None, "malformed"
+
+    name = parts[0].strip()
+    if not name:
+        return None, "empty_name"
+    pattern_type = parts[1].strip()
+    if not pattern_type.isdigit():
+        return None, "bad_type"
+    body = parts[3].strip().lower()
+    if not body:
+        return None, "empty_body"
+    if not _simple_body_valid(body):
+        try:
+            compile_pattern(body)
+        except ValueError as e:
+            return None, "invalid_hex" if "hex" in str(e) else "invalid_pattern"
+
+    return {
+        "name": name,
+        "type": pattern_type,
+        "offset": parts[2].strip() or "*",
+        "pattern": body,
+    }, None
+
+
+def split_ranges(path, count):
+    """Split a file into at most count (start, end) byte ranges aligned to line starts."""
+    size = os.path.getsize(path)
+    count = max(1, min(count, size // MIN_RANGE_BYTES))
+    bounds = [0]
+    with open(path, "rb") as f:
+        for k in range(1, count):
+            f.seek(max(size * k // count, bounds[-1]))
+            f.readline()  # finish the line the cut fell into
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def _new_report():
+    return {"accepted": 0, "rejected": {category: 0 for category in REJECT_CATEGORIES}, "examples": {}}
+
+
+def _merge_report(total, part):
+    total["accepted"] += part["accepted"]
+    for category, count in part["rejected"].items():
+        total["rejected"][category] += count
+    for category, examples in part["examples"].items():
+        kept = total["examples"].setdefault(category, [])
+        kept.extend(examples[:REJECT_EXAMPLES - len(kept)])
+
+
+def _convert_range(input_path, start, end, part_path, jsonl):
+    """Worker: convert the lines in [start, end) of input_path into part_path; returns the range's report."""
+    report = _new_report()
+    separator = "\n" if jsonl else ",\n"
+    first = True
+    batch = []
+    position = start
+    with open(input_path, "rb") as src, open(part_path, "w", encoding="utf-8") as out:
+        src.seek(start)
+        while position < end:
+            raw = src.readline()
+            if not raw:
+                break
+            line_offset = position
+            position += len(raw)
+            try:
+                line = raw.decode("utf-8")
+            except UnicodeDecodeError:
+                sig, category = None, "encoding"
+                line = raw.decode("utf-8", "replace")
+            else:
+                sig, category = normalize_ndb_line(line)
+
+            if sig is not None:
+                batch.append(json.dumps(sig))
+                report["accepted"] += 1
+                if len(batch) >= WRITE_BATCH:
+                    out.write(("" if first else separator) + separator.join(batch))
+                    first = False
+                    batch = []
+            elif category is not None:
+                report["rejected"][category] += 1
+                examples = report["examples"].setdefault(category, [])
+                if len(examples) < REJECT_EXAMPLES:
+                    examples.append({"offset": line_offset, "line": line.rstrip("\r\n")[:200]})
+        if batch:
+            out.write(("" if first else separator) + separator.join(batch))
+    return report
+
+
+def convert_ndb(input_path, output_path, jsonl=None, workers=None):
+    """
+    Convert an NDB file to a JSON array (default) or JSON Lines (jsonl=True,
+    or an output path ending in .jsonl) with a pool of worker processes.
+    Returns the report: accepted count, rejected count per category and up
+    to REJECT_EXAMPLES example lines (with their byte offset) per category.
+    """
+    if jsonl is None:
+        jsonl = output_path.endswith(".jsonl")
+    workers = workers or os.cpu_count() or 1
+    ranges = split_ranges(input_path, workers * RANGES_PER_WORKER)
+    part_paths = [f"{output_path}.part{i}" for i in range(len(ranges))]
+
+    report = _new_report()
+    try:
+        if len(ranges) == 1 or workers == 1:
+            reports = [_convert_range(input_path, start, end, part, jsonl)
+                       for (start, end), part in zip(ranges, part_paths)]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=worker_context()) as pool:
+                futures = [pool.submit(_convert_range, input_path, start, end, part, jsonl)
+                           for (start, end), part in zip(ranges, part_paths)]
+                reports = [future.result() for future in futures]
+
+        # Append the parts in input order (written to a temp file, renamed at the end)
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            if not jsonl:
+                out.write("[\n")
+            wrote = False
+            for part, part_report in zip(part_paths, reports):
+                _merge_report(report, part_report)
+                if not part_report["accepted"]:
+                    continue
+                if wrote:
+                    out.write("\n" if jsonl else ",\n")
+                with open(part, "r", encoding="utf-8") as src:
+                    shutil.copyfileobj(src, out, 1024 * 1024)
+                wrote = True
+            out.write("\n]\n" if not jsonl else "\n" if wrote else "")
+        os.replace(tmp_path, output_path)
+    finally:
+        for part in part_paths:
+            if os.path.exists(part):
+                os.remove(part)
+
+    report["rejected_total"] = sum(report["rejected"].values())
+    return report
+
+
+def format_report(report):
+    """Human-readable summary of a convert_ndb report."""
+    lines = [f"Accepted {report['accepted']:,} signatures, rejected {report['rejected_total']:,}"]
+    for category in REJECT_CATEGORIES:
+        count = report["rejected"][category]
+        if not count:
+            continue
+        lines.append(f"  {category}: {count:,}")
+        for example in report["examples"].get(category, []):
+            lines.append(f"    @{example['offset']}: {example['line']}")
+    return "\n".join(lines)
@@ -0,0 +1,239 @@
+"""
+NDB offset specifiers and the executable headers needed to resolve them.
+
+The third field of an NDB line restricts where a signature may start:
+
+    *              anywhere (the signature is swept over the whole file)
+    n              exactly at file offset n
+    EOF-n          n bytes before the end of the file
+    EP+n / EP-n    relative to the entry point (PE / ELF only)
+    Sx+n           relative to the start of section x (PE / ELF only)
+    SL+n           relative to the start of the last section
+    SEx            anywhere inside section x
+
+Any of the fixed forms may be followed by ``,m`` to allow the start to
+shift by up to m bytes. Everything except ``*`` resolves to a small window
+of start positions per file, so those signatures only need a few bounded
+compares instead of a sweep.
+"""
+
+import struct
+
+import numpy as np
+
+# Offset kinds
+OFFSET_ANY = 0
+OFFSET_ABSOLUTE = 1
+OFFSET_EOF = 2
+OFFSET_EP = 3
+OFFSET_SECTION = 4
+OFFSET_LAST_SECTION = 5
+OFFSET_SECTION_ENTIRE = 6
+
+
+def parse_offset(spec):
+    """
+    Parse an NDB offset spec into (kind, value, shift, section).
+
+    Unknown forms fall back to OFFSET_ANY: sweeping the whole file can only
+    find more candidates, never miss one.
+    """
+    spec = str(spec).strip().upper()
+    if not spec or spec == "*":
+        return OFFSET_ANY, 0, 0, -1
+
+    shift = 0
+    if "," in spec:
+        spec, max_shift = spec.split(",", 1)
+        try:
+            shift = int(max_shift)
+        except ValueError:
+            return OFFSET_ANY, 0, 0, -1
+        if shift < 0:
+            return OFFSET_ANY, 0, 0, -1
+
+    try:
+        if spec.isdigit():
+            return OFFSET_ABSOLUTE, int(spec), shift, -1
+        if spec.startswith("EOF-"):
+            return OFFSET_EOF, int(spec[4:]), shift, -1
+        if spec.startswith("EP+") or spec.startswith("EP-"):
+            return OFFSET_EP, int(spec[2:]), shift, -1
+        if spec.startswith("SL+"):
+            return OFFSET_LAST_SECTION, int(spec[3:]), shift, -1
+        if spec.startswith("SE"):
+            return OFFSET_SECTION_ENTIRE, 0, 0, int(spec[2:])
+        if spec.startswith("S") and "+" in spec:
+            section, value = spec[1:].split("+", 1)
+            return OFFSET_SECTION, int(value), shift, int(section)
+    except ValueError:
+        pass
+    return OFFSET_ANY, 0, 0, -1
+
+
+class OffsetTable:
+    """
+    Parsed offset specs of a signature set, one entry per signature, kept in
+    flat arrays (see ARRAY_NAMES) so a compiled DB can store them as is.
+    """
+
+    ARRAY_NAMES = ("offset_kind", "offset_value", "offset_shift", "offset_section")
+
+    def __init__(self, specs=None, arrays=None):
+        if arrays is None:
+            parsed = [parse_offset(spec) for spec in specs]
+            arrays = {
+                "offset_kind": np.array([p[0] for p in parsed], dtype=np.uint8),
+                "offset_value": np.array([p[1] for p in parsed], dtype=np.int64),
+                "offset_shift": np.array([p[2] for p in parsed], dtype=np.int64),
+                "offset_section": np.array([p[3] for p in parsed], dtype=np.int32),
+            }
+        self.kind = arrays["offset_kind"]
+        self.value = arrays["offset_value"]
+        self.shift = arrays["offset_shift"]
+        self.section = arrays["offset_section"]
+        self.bounded = self.kind != OFFSET_ANY
+
+    def __len__(self):
+        return len(self.kind)
+
+    def arrays(self):
+        return {
+            "offset_kind": self.kind,
+            "offset_value": self.value,
+            "offset_shift": self.shift,
+            "offset_section": self.section,
+        }
+
+    def subset(self, index):
+        """Table for the signatures at ``index`` (in that order)."""
+        return OffsetTable(arrays={name: array[index] for name, array in self.arrays().items()})
+
+    def windows(self, index, file_size, exe=None):
+        """
+        Resolve the signatures at ``index`` for one file.
+
+        Returns (lo, hi, ok): the inclusive range of allowed start positions
+        clipped to the file, and whether the signature can apply at all (EP /
+        section offsets need an executable, and the window must overlap the file).
+        """
+        kind = self.kind[index]
+        value = self.value[index]
+        lo = np.zeros(len(index), dtype=np.int64)
+        hi = np.zeros(len(index), dtype=np.int64)
+        known = np.zeros(len(index), dtype=np.bool_)
+
+        absolute = kind == OFFSET_ABSOLUTE
+        lo[absolute] = value[absolute]
+        eof = kind == OFFSET_EOF
+        lo[eof] = file_size - value[eof]
+        known |= absolute | eof
+
+        if exe is not None:
+            ep = kind == OFFSET_EP
+            lo[ep] = exe.entry_point + value[ep]
+            known |= ep
+            if exe.sections:
+                starts = np.array([start for start, _ in exe.sections], dtype=np.int64)
+                sizes = np.array([size for _, size in exe.sections], dtype=np.int64)
+                section = self.section[index]
+                last = kind == OFFSET_LAST_SECTION
+                lo[last] = starts[-1] + value[last]
+                in_range = (section >= 0) & (section < len(starts))
+                numbered = (kind == OFFSET_SECTION) & in_range
+                lo[numbered] = starts[section[numbered]] + value[numbered]
+                entire = (kind == OFFSET_SECTION_ENTIRE) & in_range
+                lo[entire] = starts[section[entire]]
+                hi[entire] = starts[section[entire]] + sizes[section[entire]] - 1
+                known |= last | numbered | entire
+
+        fixed_window = kind != OFFSET_SECTION_ENTIRE
+        hi[fixed_window] = lo[fixed_window] + self.shift[index][fixed_window]
+
+        # A window reaching outside the file is clipped to it, not dropped
+        # (EP-16,32 near the start, EOF-n on a file shorter than n)
+        ok = known & (hi >= lo) & (hi >= 0) & (lo < file_size)
+        return np.maximum(lo, 0), np.minimum(hi, file_size - 1), ok
+
+
+class ExecutableInfo:
+    """Entry point and sections of a PE / ELF file, as file offsets."""
+
+    def __init__(self, file_format, entry_point, sections):
+        self.file_format = file_format
+        self.entry_point = entry_point
+        self.sections = sections  # [(file offset, size on disk), ...]
+
+
+def parse_executable(data):
+    """Parse PE or ELF headers from a bytes-like object; None if it is neither (or is malformed)."""
+    try:
+        if data[:2] == b"MZ":
+            return _parse_pe(data)
+        if data[:4] == b"\x7fELF":
+            return _parse_elf(data)
+    except (struct.error, IndexError, ValueError):
+        pass
+    return None
+
+
+def _parse_pe(data):
+    pe_offset = struct.unpack_from("<I", data, 0x3C)[0]
+    if data[pe_offset:pe_offset + 4] != b"PE\0\0":
+        return None
+    section_count, = struct.unpack_from("<H", data, pe_offset + 6)
+    optional_size, = struct.unpack_from("<H", data, pe_offset + 20)
+    optional = pe_offset + 24
+    entry_rva, = struct.unpack_from("<I", data, optional + 16)
+
+    sections = []
+    rva_map = []
+    table = optional + optional_size
+    for i in range(section_count):
+        entry = table + 40 * i
+        virtual_size, virtual_address, raw_size, raw_offset = struct.unpack_from("<IIII", data, entry + 8)
+        sections.append((raw_offset, raw_size))
+        rva_map.append((virtual_address, max(virtual_size, raw_size), raw_offset))
+
+    # Entry point RVA -> file offset through the section containing it
+    entry_point = entry_rva
+    for virtual_address, size, raw_offset in rva_map:
+        if virtual_address <= entry_rva < virtual_address + size:
+            entry_point = entry_rva - virtual_address + raw_offset
+            break
+    return ExecutableInfo("pe", entry_point, sections)
+
+
+def _parse_elf(data):
+    is_64 = data[4] == 2
+    endian = "<" if data[5] == 1 else ">"
+    if is_64:
+        entry, ph_offset, sh_offset = struct.unpack_from(endian + "QQQ", data, 24)
+        ph_size, ph_count, sh_size, sh_count = struct.unpack_from(endian + "HHHH", data, 54)
+        ph_format, sh_format = endian + "IIQQQQ", endian + "IIQQQQ"
+    else:
+        entry, ph_offset, sh_offset = struct.unpack_from(endian + "III", data, 24)
+        ph_size, ph_count, sh_size, sh_count = struct.unpack_from(endian + "HHHH", data, 42)
+        ph_format, sh_format = endian + "IIIII", endian + "IIIIII"
+
+    # Entry point: virtual address -> file offset through the PT_LOAD segment holding it
+    entry_point = None
+    for i in range(ph_count):
+        fields = struct.unpack_from(ph_format, data, ph_offset + i * ph_size)
+        if is_64:
+            p_type, _, p_offset, p_vaddr, _, p_filesz = fields
+        else:
+            p_type, p_offset, p_vaddr, _, p_filesz = fields
+        if p_type == 1 and p_vaddr <= entry < p_vaddr + p_filesz:
+            entry_point = entry - p_vaddr + p_offset
+            break
+    if entry_point is None:
+        return None
+
+    sections = []
+    for i in range(sh_count):
+        fields = struct.unpack_from(sh_format, data, sh_offset + i * sh_size)
+        sh_type, offset, size = fields[1], fields[4], fields[5]
+        if sh_type not in (0, 8):  # skip SHT_NULL and SHT_NOBITS (.bss)
+            sections.append((offset, size))
+    return ExecutableInfo("elf", entry_point, sections)
@@ -0,0 +1,464 @@
+"""
+Compiler for ClamAV NDB signature bodies.
+
+A body such as
+
+    6a617661*2A0332C000??4C2A{-15}BEA200(ffff|0000)840?01
+
+is split at every unbounded gap (``*`` or ``{n-}``) into *parts*. Each part
+has a bounded span and is a list of tokens:
+
+    BYTES  - fixed run of bytes with a per-byte mask (``??`` -> 0x00,
+             nibble wildcards ``a?`` / ``?a`` -> 0xF0 / 0x0F)
+    GAP    - bounded gap ``{n}``, ``{-n}``, ``{n-m}`` (or ``[n-m]``)
+    ALT    - alternation ``(aa|bbcc|...)``
+
+Every part carries its anchor: the longest fully literal run of bytes
+(capped at MAX_ANCHOR_LENGTH). Scanners search for anchors first and only
+check the full part around anchor hits.
+"""
+
+import numpy as np
+
+BYTES = 0
+GAP = 1
+ALT = 2
+
+# Anchors longer than this are truncated; the rest of the run is verified
+MAX_ANCHOR_LENGTH = 32
+
+_HEX = "0123456789abcdef"
+
+
+class Token:
+    def __init__(self, kind, values=b"", masks=b"", lo=0, hi=0, options=None):
+        self.kind = kind
+        self.values = values
+        self.masks = masks
+        self.lo = lo
+        self.hi = hi
+        self.options = options or []
+        self.checks = _build_checks(values, masks) if kind == BYTES else None
+
+    @property
+    def min_len(self):
+        if self.kind == BYTES:
+            return len(self.values)
+        if self.kind == GAP:
+            return self.lo
+        return min(len(v) for v, _ in self.options)
+
+    @property
+    def max_len(self):
+        if self.kind == BYTES:
+            return len(self.values)
+        if self.kind == GAP:
+            return self.hi
+        return max(len(v) for v, _ in self.options)
+
+
+class Part:
+    def __init__(self, tokens, gap_before=0):
+        self.tokens = tokens
+        self.gap_before = gap_before  # minimum distance from the previous part
+        self.min_len = sum(t.min_len for t in tokens)
+        self.max_len = sum(t.max_len for t in tokens)
+        self.anchor, self.anchor_token, self.anchor_offset = _pick_anchor(tokens)
+
+    @property
+    def is_literal(self):
+        """True when the anchor alone is the whole part (no verification needed)."""
+        return (
+            len(self.tokens) == 1
+            and self.anchor is not None
+            and len(self.anchor) == self.max_len
+        )
+
+
+class PatternProgram:
+    def __init__(self, parts):
+        self.parts = parts
+
+    @property
+    def is_fixed(self):
+        """True for a single fixed-length run (literal bytes and byte/nibble wildcards)."""
+        return len(self.parts) == 1 and len(self.parts[0].tokens) == 1 \
+            and self.parts[0].tokens[0].kind == BYTES
+
+    @property
+    def max_span(self):
+        """Longest possible match, or None when the pattern has an unbounded gap."""
+        if len(self.parts) > 1:
+            return None
+        return self.parts[0].max_len
+
+
+def compile_pattern(body):
+    """Compile an NDB hex body into a PatternProgram. Raises ValueError on bad syntax."""
+    body = body.strip().lower()
+    parts = []
+    tokens = []
+    gap_before = 0
+    values = bytearray()
+    masks = bytearray()
+
+    def flush_bytes():
+        if values:
+            tokens.append(Token(BYTES, bytes(values), bytes(masks)))
+            values.clear()
+            masks.clear()
+
+    def add_gap(lo, hi):
+        flush_bytes()
+        if tokens and tokens[-1].kind == GAP:
+            tokens[-1].lo += lo
+            tokens[-1].hi += hi
+        else:
+            tokens.append(Token(GAP, lo=lo, hi=hi))
+
+    def end_part(next_gap):
+        nonlocal tokens, gap_before
+        flush_bytes()
+        if any(t.kind != GAP for t in tokens):
+            parts.append(Part(tokens, gap_before))
+            gap_before = next_gap
+        else:
+            gap_before += next_gap + sum(t.lo for t in tokens)
+        tokens = []
+
+    i = 0
+    n = len(body)
+    while i < n:
+        c = body[i]
+        if c == "*":
+            end_part(0)
+            i += 1
+        elif c in "{[":
+            close = "}" if c == "{" else "]"
+            j = body.find(close, i)
+            if j < 0:
+                raise ValueError(f"Unterminated gap in pattern at {i}")
+            lo, hi = _parse_gap(body[i + 1:j])
+            if hi is None:
+                end_part(lo)
+            else:
+                add_gap(lo, hi)
+            i = j + 1
+        elif c == "(":
+            j = body.find(")", i)
+            if j < 0:
+                raise ValueError(f"Unterminated alternation in pattern at {i}")
+            options = [_parse_hex(opt) for opt in body[i + 1:j].split("|")]
+            if not options or any(not v for v, _ in options):
+                raise ValueError(f"Empty alternative in pattern at {i}")
+            flush_bytes()
+            if len(options) == 1:
+                tokens.append(Token(BYTES, options[0][0], options[0][1]))
+            else:
+                tokens.append(Token(ALT, options=options))
+            i = j + 1
+        else:
+            v, m = _parse_hex(body[i:i + 2])
+            values += v
+            masks += m
+            i += 2
+    end_part(0)
+
+    if not parts:
+        raise ValueError("Pattern has no content")
+    return PatternProgram(parts)
+
+
+def _parse_gap(spec):
+    """'{n}' -> (n, n), '{-n}' -> (0, n), '{n-}' -> (n, None), '{n-m}' -> (n, m)."""
+    try:
+        if "-" not in spec:
+            lo = hi = int(spec)
+        else:
+            a, b = spec.split("-", 1)
+            lo = int(a) if a else 0
+            hi = int(b) if b else None
+    except ValueError:
+        raise ValueError(f"Invalid gap '{{{spec}}}'")
+    if lo < 0 or (hi is not None and hi < lo):
+        raise ValueError(f"Invalid gap '{{{spec}}}'")
+    return lo, hi
+
+
+def _parse_hex(text):
+    """Parse hex pairs with '??' and nibble wildcards into (values, masks)."""
+    if len(text) % 2 != 0:
+        raise ValueError(f"Odd-length hex '{text}'")
+    values = bytearray()
+    masks = bytearray()
+    for k in range(0, len(text), 2):
+        hi_c, lo_c = text[k], text[k + 1]
+        value = 0
+        mask = 0
+        if hi_c != "?":
+            if hi_c not in _HEX:
+                raise ValueError(f"Invalid hex pair '{text[k:k + 2]}'")
+            value |= _HEX.index(hi_c) << 4
+            mask |= 0xF0
+        if lo_c != "?":
+            if lo_c not in _HEX:
+                raise ValueError(f"Invalid hex pair '{text[k:k + 2]}'")
+            value |= _HEX.index(lo_c)
+            mask |= 0x0F
+        values.append(value)
+        masks.append(mask)
+    return bytes(values), bytes(masks)
+
+
+def _build_checks(values, masks):
+    """Split a masked run into literal slices and single masked bytes (skipping '??')."""
+    checks = []
+    k = 0
+    n = len(values)
+    while k < n:
+        if masks[k] == 0xFF:
+            j = k
+            while j < n and masks[j] == 0xFF:
+                j += 1
+            checks.append((k, values[k:j], None))
+            k = j
+        else:
+            if masks[k]:
+                checks.append((k, values[k], masks[k]))
+            k += 1
+    return checks
+
+
+def _pick_anchor(tokens):
+    best = None
+    best_token = -1
+    best_offset = 0
+    for t_idx, tok in enumerate(tokens):
+        if tok.kind != BYTES:
+            continue
+        for offset, lit, mask in tok.checks:
+            if mask is None and (best is None or len(lit) > len(best)):
+                best = lit
+                best_token = t_idx
+                best_offset = offset
+    if best is not None:
+        best = best[:MAX_ANCHOR_LENGTH]
+    return best, best_token, best_offset
+
+
+def match_bytes(tok, data, pos):
+    """Check a BYTES token (or an ALT option) at data[pos:]."""
+    if pos < 0 or pos + len(tok.values) > len(data):
+        return False
+    for offset, lit, mask in tok.checks:
+        p = pos + offset
+        if mask is None:
+            if data[p:p + len(lit)] != lit:
+                return False
+        elif data[p] & mask != lit:
+            return False
+    return True
+
+
+def _match_option(values, masks, data, pos):
+    if pos < 0 or pos + len(values) > len(data):
+        return False
+    for k in range(len(values)):
+        if data[pos + k] & masks[k] != values[k]:
+            return False
+    return True
+
+
+def _forward(tokens, i, pos, data, memo):
+    """Smallest end such that tokens[i:] match starting exactly at pos, or -1."""
+    if i == len(tokens):
+        return pos
+    key = (i, pos)
+    if key in memo:
+        return memo[key]
+    tok = tokens[i]
+    best = -1
+    if tok.kind == BYTES:
+        if match_bytes(tok, data, pos):
+            best = _forward(tokens, i + 1, pos + len(tok.values), data, memo)
+    elif tok.kind == ALT:
+        for values, masks in tok.options:
+            if _match_option(values, masks, data, pos):
+                end = _forward(tokens, i + 1, pos + len(values), data, memo)
+                if end >= 0 and (best < 0 or end < best):
+                    best = end
+    else:
+        for p in range(pos + tok.lo, min(pos + tok.hi, len(data)) + 1):
+            end = _forward(tokens, i + 1, p, data, memo)
+            if end >= 0 and (best < 0 or end < best):
+                best = end
+    memo[key] = best
+    return best
+
+
+def _backward(tokens, i, end, data, memo):
+    """Largest start such that tokens[:i] match ending exactly at end, or -1."""
+    if i == 0:
+        return end
+    key = (i, end)
+    if key in memo:
+        return memo[key]
+    tok = tokens[i - 1]
+    best = -1
+    if tok.kind == BYTES:
+        start = end - len(tok.values)
+        if match_bytes(tok, data, start):
+            best = _backward(tokens, i - 1, start, data, memo)
+    elif tok.kind == ALT:
+        for values, masks in tok.options:
+            start = end - len(values)
+            if _match_option(values, masks, data, start):
+                s = _backward(tokens, i - 1, start, data, memo)
+                if s > best:
+                    best = s
+    else:
+        for p in range(end - tok.lo, max(end - tok.hi, 0) - 1, -1):
+            s = _backward(tokens, i - 1, p, data, memo)
+            if s > best:
+                best = s
+    memo[key] = best
+    return best
+
+
+def match_part_at_anchor(part, data, anchor_pos):
+    """
+    Verify a part whose anchor was found at data[anchor_pos:].
+
+    Returns (start, end) of the occurrence - the latest possible start and the
+    earliest possible end - or None if the part does not match there.
+    """
+    tok = part.tokens[part.anchor_token]
+    tok_start = anchor_pos - part.anchor_offset
+    if not match_bytes(tok, data, tok_start):
+        return None
+    tok_end = tok_start + len(tok.values)
+    end = _forward(part.tokens, part.anchor_token + 1, tok_end, data, {})
+    if end < 0:
+        return None
+    start = _backward(part.tokens, part.anchor_token, tok_start, data, {})
+    if start < 0:
+        return None
+    return start, end
+
+
+def match_part_at(part, data, pos):
+    """Verify a part starting exactly at pos (used for parts without an anchor)."""
+    end = _forward(part.tokens, 0, pos, data, {})
+    if end < 0:
+        return None
+    return pos, end
+
+
+def find_part_from(part, data, lowest):
+    """Occurrence of a part starting at or after lowest with the earliest end, or None."""
+    best = None
+    if part.anchor is not None:
+        # Anchor hits in order; a later anchor can't end before the best so far
+        pos = data.find(part.anchor, max(lowest, 0))
+        while pos >= 0 and (best is None or pos < best[1]):
+            occ = match_part_at_anchor(part, data, pos)
+            if occ is not None and occ[0] >= lowest and (best is None or occ[1] < best[1]):
+                best = occ
+            pos = data.find(part.anchor, pos + 1)
+        return best
+    for pos in candidate_starts(part, data, max(lowest, 0)).tolist():
+        if best is not None and pos >= best[1]:
+            break
+        occ = match_part_at(part, data, pos)
+        if occ is not None and (best is None or occ[1] < best[1]):
+            best = occ
+    return best
+
+
+def _token_hits(tok, data):
+    """Bool per position of data: a BYTES/ALT token can match there (None if it checks no bits)."""
+    options = [(tok.values, tok.masks)] if tok.kind == BYTES else tok.options
+    hits = np.zeros(len(data), dtype=np.bool_)
+    for values, masks in options:
+        if not any(masks):
+            return None
+        count = len(data) - len(values) + 1
+        if count <= 0:
+            continue
+        ok = np.ones(count, dtype=np.bool_)
+        for k in range(len(values)):
+            if masks[k]:
+                ok &= (data[k:k + count] & masks[k]) == values[k]
+        hits[:count] |= ok
+    return hits
+
+
+def candidate_starts(part, data, lowest=0):
+    """
+    Start positions (from lowest) where a part without an anchor may match:
+    each of its tokens must match somewhere in its range of offsets from
+    the start. Vectorised, so only these positions are verified one by one.
+    """
+    data = np.frombuffer(data, dtype=np.uint8)
+    starts = np.arange(lowest, len(data) - part.min_len + 1)
+    least = most = 0
+    for tok in part.tokens:
+        if not len(starts):
+            break
+        if tok.kind != GAP:
+            hits = _token_hits(tok, data)
+            if hits is not None:
+                seen = np.concatenate(([0], np.cumsum(hits)))
+                end = len(data)
+                starts = starts[seen[np.minimum(starts + most + 1, end)] > seen[np.minimum(starts + least, end)]]
+        least += tok.min_len
+        most += tok.max_len
+    return starts
+
+
+def _window_starts(part, data, lo, hi):
+    """Start positions in [lo, hi] worth verifying: all of them, or only those near an anchor hit."""
+    if part.anchor is None or hi - lo < 64:
+        return range(lo, hi + 1)
+    # Bytes between the part start and its anchor
+    before = part.tokens[:part.anchor_token]
+    least = sum(t.min_len for t in before) + part.anchor_offset
+    most = sum(t.max_len for t in before) + part.anchor_offset
+    starts = set()
+    pos = data.find(part.anchor, lo + least, hi + most + len(part.anchor))
+    while pos >= 0:
+        starts.update(range(max(lo, pos - most), min(hi, pos - least) + 1))
+        pos = data.find(part.anchor, pos + 1, hi + most + len(part.anchor))
+    return sorted(starts)
+
+
+def count_in_window(program, data, lo, hi):
+    """
+    Count matches of a program starting in data[lo:hi + 1] (NDB offset
+    windows). Single-part programs count every start; a multi-part
+    program counts once, like the sweep.
+    """
+    first = program.parts[0]
+    hi = min(hi, len(data) - first.min_len)
+    if hi < lo:
+        return 0
+    starts = _window_starts(first, data, lo, hi)
+    if len(program.parts) == 1:
+        return sum(1 for pos in starts if match_part_at(first, data, pos) is not None)
+
+    # Earliest end of the first part inside the window, then the rest in order
+    end = None
+    for pos in starts:
+        if end is not None and pos >= end:
+            break
+        occ = match_part_at(first, data, pos)
+        if occ is not None and (end is None or occ[1] < end):
+            end = occ[1]
+    if end is None:
+        return 0
+    for part in program.parts[1:]:
+        occ = find_part_from(part, data, end + part.gap_before)
+        if occ is None:
+            return 0
+        end = occ[1]
+    return 1
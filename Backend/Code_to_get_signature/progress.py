@@ -0,0 +1,100 @@
+"""
+Scan progress events and cancellation.
+
+Every scan entry point takes progress= (any callable; queue.put works
+too) and cancel= (a threading.Event). The engine calls progress with a
+ScanProgress after each window it has matched, and checks cancel before
+each one: once it is set the scan stops with ScanCancelled.
+
+    cancel = threading.Event()
+    events = queue.Queue()
+    result = scanner.scan(path, progress=events.put, cancel=cancel)
+
+With neither given, the scan's windows are used as they are.
+"""
+
+PROGRESS_CHUNK_SIZE = 16 * 1024 * 1024  # larger inputs are scanned (and reported) in windows this size
+
+
+class ScanCancelled(Exception):
+    """Raised by a scan whose cancel event was set."""
+
+
+class ScanProgress:
+    """
+    One progress event. phase is "start" (nothing matched yet), "scan"
+    (after a window) or "done" (the scan is complete, or answered from the cache).
+    """
+
+    __slots__ = ("path", "phase", "bytes_done", "bytes_total", "chunks_done", "chunks_total")
+
+    def __init__(self, path, phase, bytes_done, bytes_total, chunks_done, chunks_total):
+        self.path = path
+        self.phase = phase
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+        self.chunks_done = chunks_done
+        self.chunks_total = chunks_total
+
+    @property
+    def fraction(self):
+        return self.bytes_done / self.bytes_total if self.bytes_total else 1.0
+
+    def __repr__(self):
+        return (f"ScanProgress({self.path!r}, {self.phase}, {self.bytes_done}/{self.bytes_total} bytes, "
+                f"{self.chunks_done}/{self.chunks_total} chunks)")
+
+
+class ProgressReporter:
+    """Progress events and the cancel check of one scan."""
+
+    def __init__(self, path, total, chunk_size, progress=None, cancel=None):
+        self.path = path
+        self.total = total
+        self.chunks_total = max(1, -(-total // chunk_size)) if chunk_size else 1
+        self.chunks_done = 0
+        self.progress = progress
+        self.cancel = cancel
+
+    def check(self):
+        if self.cancel is not None and self.cancel.is_set():
+            raise ScanCancelled(self.path)
+
+    def emit(self, phase, bytes_done):
+        if self.progress is not None:
+            self.progress(ScanProgress(self.path, phase, bytes_done, self.total, self.chunks_done, self.chunks_total))
+
+    def start(self):
+        self.check()
+        self.emit("start", 0)
+
+    def window_done(self, end):
+        self.chunks_done += 1
+        self.emit("scan", min(end, self.total))
+
+    def done(self):
+        self.chunks_done = self.chunks_total
+        self.emit("done", self.total)
+
+
+def reporter(path, total, chunk_size, progress=None, cancel=None):
+    """A ProgressReporter, or None when there is nothing to report to or cancel with."""
+    if progress is None and cancel is None:
+        return None
+    return ProgressReporter(path, total, chunk_size, progress, cancel)
+
+
+def track_windows(windows, tracker):
+    """
+    Pass (base, new_start, window) triples through, checking for
+    cancellation before each and reporting it once the consumer asks for
+    the next (so after it was matched).
+    """
+    if tracker is None:
+        yield from windows
+        return
+    for item in windows:
+        tracker.check()
+        yield item
+        base, _, window = item
+        tracker.window_done(base + len(window))
@@ -1,46 +1,89 @@
+import argparse
 import json
+import os
+import time
 
-def parse_ndb_line(line):
-    parts = line.strip().split(':')
-    if len(parts) < 4:
-        return None  # malformed line
-
-    name = parts[0]
-    pattern_type = parts[1]
-    offset = parts[2]
-    hex_pattern = parts[3]
-
-    # Optionally validate hex pattern (allow hex + wildcards)
-    return {
-        "name": name,
-        "type": pattern_type,
-        "offset": offset,
-        "pattern": hex_pattern.lower()
-    }
-
-def parse_ndb_file(file_path):
-    signatures = []
+from sigdb import compile_signature_db, update_signature_db
+from ndb_convert import convert_ndb, format_report
+from result_cache import ResultCache, signature_fingerprint
+from signature_stream import stream_signatures, write_signatures_jsonl
+
+def parse_drop_file(file_path):
+    """Signature names to drop, one per line (ClamAV .ign2 style; anything after ':' is ignored)."""
     with open(file_path, 'r') as f:
-        for line in f:
-            if line.startswith('#') or not line.strip():
-                continue  # skip comments/empty lines
-            parsed = parse_ndb_line(line)
-            if parsed:
-                signatures.append(parsed)
-    return signatures
+        return [line.strip().split(':')[0] for line in f if line.strip() and not line.startswith('#')]
 
 def save_to_json(data, output_path):
     with open(output_path, 'w') as f:
         json.dump(data, f, indent=2)
 
+def save_to_jsonl(data, output_path):
+    """JSON Lines: one signature per line, streamed back by signature_stream.stream_signatures."""
+    write_signatures_jsonl(data, output_path)
+
+def update_db(db_file, delta_file, drop_file=None, cache_file=None, workers=None):
+    """
+    Apply a daily.ndb delta (plus optional drop list) to an existing compiled
+    DB; with cache_file, the verdicts of older signature sets are dropped from it.
+    The delta goes through the same converter as a full build (validated,
+    with a reject report) and is streamed from its JSON Lines output.
+    """
+    print(f"Converting {delta_file}...")
+    delta_jsonl = db_file + ".delta.jsonl"
+    try:
+        report = convert_ndb(delta_file, delta_jsonl, jsonl=True, workers=workers)
+        print(format_report(report))
+        drops = parse_drop_file(drop_file) if drop_file else []
+        print(f"Applying {report['accepted']} signatures, {len(drops)} drops to {db_file}...")
+        stats = update_signature_db(db_file, stream_signatures(delta_jsonl), drops)
+    finally:
+        if os.path.exists(delta_jsonl):
+            os.remove(delta_jsonl)
+    print(f"Generation {stats['generation']}: {stats['signatures']} signatures "
+          f"(+{stats['added']} added, {stats['replaced']} replaced, -{stats['dropped']} dropped) ✅")
+    if cache_file:
+        cache = ResultCache(cache_file)
+        dropped = cache.drop_stale(signature_fingerprint(db_file))
+        cache.close()
+        print(f"Dropped {dropped} stale verdicts from {cache_file}")
+    return stats
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert NDB signatures to JSON and a compiled DB")
+    parser.add_argument("--update", metavar="DAILY_NDB",
+                        help="apply this NDB as a delta to signatures.db instead of a full rebuild")
+    parser.add_argument("--drop", metavar="IGN2", help="names to drop with --update (one per line)")
+    parser.add_argument("--cache", metavar="SQLITE",
+                        help="verdict cache to clear of older signature sets after --update")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="write signatures.jsonl (one signature per line) instead of signatures.json")
+    parser.add_argument("--workers", type=int, default=None, help="converter processes (default: all cores)")
+    parser.add_argument("--report", metavar="JSON", help="also write the reject report to this file")
+    parser.add_argument("--no-db", action="store_true", help="only convert, skip compiling signatures.db")
+    args = parser.parse_args()
+
     input_file = "main.ndb"
-    output_file = "signatures.json"
-
-    print(f"Parsing {input_file}...")
-    signatures = parse_ndb_file(input_file)
-    print(f"Parsed {len(signatures)} signatures.")
-    
-    print(f"Saving to {output_file}...")
-    save_to_json(signatures, output_file)
+    output_file = "signatures.jsonl" if args.jsonl else "signatures.json"
+    db_file = "signatures.db"
+
+    if args.update:
+        update_db(db_file, args.update, args.drop, args.cache, args.workers)
+        raise SystemExit
+
+    # Parsed in parallel and streamed to the output: memory stays flat
+    print(f"Converting {input_file} to {output_file}...")
+    start = time.time()
+    report = convert_ndb(input_file, output_file, jsonl=args.jsonl, workers=args.workers)
+    print(format_report(report))
+    print(f"Converted in {time.time() - start:.2f} seconds.")
+    if args.report:
+        save_to_json(report, args.report)
+
+    if args.no_db:
+        raise SystemExit
+
+    # Compile once here so scanners can mmap the DB instead of parsing JSON
+    print(f"Compiling {db_file}...")
+    # Streamed in batches: only packed tables, not every signature dict, are held
+    compile_signature_db(stream_signatures(output_file), db_file)
     print("Done ✅")
@@ -0,0 +1,249 @@
+"""
+Persistent scan verdict cache.
+
+Verdicts are stored in SQLite keyed by (content hash, signature set
+fingerprint, result kind), so an unchanged file is never rescanned with the same
+signatures, even after it was renamed or copied. A second table remembers
+(device, inode, size, mtime) per path: as long as those still match, the
+stored content hash is reused and the file isn't read at all, so a repeat
+sweep costs about one stat() per file.
+
+Verdicts of different signature sets live side by side, so sessions with
+different sets (CPU and GPU callers, a JSON and a .db source) can share
+one cache file. The store is bounded by size: least recently used entries
+are evicted once the accounted bytes pass max_bytes, which also ages out
+the verdicts of a set no longer in use; drop_stale() removes them at once
+when a signature update is applied.
+
+    cache = ResultCache("scan_cache.sqlite")
+    result = cache.scan(path, fingerprint, scan_function)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from sigdb import SignatureDB
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+_HASH_CHUNK = 1024 * 1024
+_TOUCH_INTERVAL = 3600  # seconds between LRU timestamp updates of a hot entry
+_FILE_ROW_BYTES = 64    # accounted overhead of a path row besides the path itself
+_EVICT_BATCH = 512      # least recently used rows fetched per eviction step
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, dev INTEGER, inode INTEGER, size INTEGER, mtime_ns INTEGER,
+    hash TEXT, entry_bytes INTEGER, last_used REAL
+);
+CREATE TABLE IF NOT EXISTS verdicts (
+    hash TEXT, fingerprint TEXT, kind TEXT, result TEXT, entry_bytes INTEGER, last_used REAL,
+    PRIMARY KEY (hash, fingerprint, kind)
+);
+CREATE INDEX IF NOT EXISTS verdicts_lru ON verdicts (last_used);
+CREATE INDEX IF NOT EXISTS files_lru ON files (last_used);
+"""
+
+
+def hash_file(path):
+    """BLAKE2b content hash of a file, read in 1 MB chunks."""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_file_fingerprints = {}
+
+
+def signature_fingerprint(signatures, max_signatures=None):
+    """
+    Fingerprint of a signature set: a compiled DB (object or path), a JSON
+    path or a list of signature dicts, optionally limited to the first
+    max_signatures. File hashes are memoized per (path, size, mtime) for
+    the life of the process.
+    """
+    if isinstance(signatures, SignatureDB):
+        signatures = signatures.path
+    if isinstance(signatures, (str, os.PathLike)):
+        path = os.path.abspath(os.fspath(signatures))
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime_ns)
+        if key not in _file_fingerprints:
+            _file_fingerprints[key] = hash_file(path)
+        if not max_signatures:
+            return _file_fingerprints[key]
+        return hashlib.blake2b(f"{_file_fingerprints[key]}:{max_signatures}".encode(), digest_size=32).hexdigest()
+
+    if max_signatures:
+        signatures = signatures[:max_signatures]
+    digest = hashlib.blake2b(digest_size=32)
+    for sig in signatures:
+        fields = (sig.get("name", ""), sig.get("type", 0), sig.get("offset", "*"), sig.get("pattern", ""))
+        digest.update("\0".join(str(f) for f in fields).encode("utf-8", "replace"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed verdict cache (safe to share between threads and processes)."""
+
+    def __init__(self, path, max_bytes=DEFAULT_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        # Running total of the accounted bytes, adjusted on every insert and delete
+        self._bytes = self._total()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def scan(self, path, fingerprint, scan_function, kind="result"):
+        """
+        Return the cached verdict for path, or run scan_function(path) and
+        cache what it returns (any JSON-serialisable value). ``kind`` keeps
+        differently shaped results of the same scan apart (a result dict
+        vs. a list of names).
+        """
+        st = os.stat(path)
+        content_hash = self.content_hash(path, st)
+        result = self.get(content_hash, fingerprint, kind)
+        if result is not None:
+            return result
+
+        result = scan_function(path)
+        # Only cache if the file didn't change while it was being scanned
+        after = os.stat(path)
+        if result is not None and (after.st_size, after.st_mtime_ns) == (st.st_size, st.st_mtime_ns):
+            self.put(content_hash, fingerprint, result, kind)
+        return result
+
+    def content_hash(self, path, st=None):
+        """Content hash of a file, reused from the path table while (dev, inode, size, mtime) match."""
+        st = st or os.stat(path)
+        path = os.path.abspath(path)
+        identity = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT dev, inode, size, mtime_ns, hash, last_used FROM files WHERE path = ?", (path,)
+            ).fetchone()
+        now = time.time()
+        if row is not None and tuple(row[:4]) == identity:
+            if now - row[5] > _TOUCH_INTERVAL:
+                with self._lock:
+                    self._db.execute("UPDATE files SET last_used = ? WHERE path = ?", (now, path))
+            return row[4]
+
+        content_hash = hash_file(path)
+        entry_bytes = len(path.encode("utf-8", "replace")) + _FILE_ROW_BYTES
+        with self._lock:
+            replaced = self._db.execute("SELECT entry_bytes FROM files WHERE path = ?", (path,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, *identity, content_hash, entry_bytes, now),
+            )
+            self._bytes += entry_bytes - (replaced[0] if replaced else 0)
+        self._evict()
+        return content_hash
+
+    def get(self, content_hash, fingerprint, kind="result"):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result, last_used FROM verdicts WHERE hash = ? AND fingerprint = ? AND kind = ?",
+                (content_hash, fingerprint, kind),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            now = time.time()
+            if now - row[1] > _TOUCH_INTERVAL:
+                self._db.execute(
+                    "UPDATE verdicts SET last_used = ? WHERE hash = ? AND fingerprint = ? AND kind = ?",
+                    (now, content_hash, fingerprint, kind),
+                )
+        result = json.loads(row[0])
+        if isinstance(result, dict):
+            result["cached"] = True
+        return result
+
+    def put(self, content_hash, fingerprint, result, kind="result"):
+        encoded = json.dumps(result)
+        entry_bytes = len(encoded) + len(content_hash) + len(fingerprint) + len(kind)
+        with self._lock:
+            replaced = self._db.execute(
+                "SELECT entry_bytes FROM verdicts WHERE hash = ? AND fingerprint = ? AND kind = ?",
+                (content_hash, fingerprint, kind),
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?)",
+                (content_hash, fingerprint, kind, encoded, entry_bytes, time.time()),
+            )
+            self._bytes += entry_bytes - (replaced[0] if replaced else 0)
+        self._evict()
+
+    def size(self):
+        """Accounted bytes of every entry (verdicts plus path rows), as tracked by this instance."""
+        return self._bytes
+
+    def _total(self):
+        """Accounted bytes summed over both tables (a full pass: only at open and before evicting)."""
+        verdicts, = self._db.execute("SELECT COALESCE(SUM(entry_bytes), 0) FROM verdicts").fetchone()
+        files, = self._db.execute("SELECT COALESCE(SUM(entry_bytes), 0) FROM files").fetchone()
+        return verdicts + files
+
+    def stats(self):
+        with self._lock:
+            verdicts, = self._db.execute("SELECT COUNT(*) FROM verdicts").fetchone()
+            files, = self._db.execute("SELECT COUNT(*) FROM files").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "verdicts": verdicts,
+                "files": files, "bytes": self.size(), "max_bytes": self.max_bytes}
+
+    def drop_stale(self, fingerprint):
+        """
+        Drop the verdicts of every signature set but this one (e.g. right
+        after an update replaced the DB); returns how many were removed.
+        """
+        with self._lock:
+            freed, = self._db.execute(
+                "SELECT COALESCE(SUM(entry_bytes), 0) FROM verdicts WHERE fingerprint != ?", (fingerprint,)
+            ).fetchone()
+            cursor = self._db.execute("DELETE FROM verdicts WHERE fingerprint != ?", (fingerprint,))
+            self._bytes -= freed
+        return cursor.rowcount
+
+    def _evict(self):
+        """Drop least recently used verdicts and path rows until back under 90% of max_bytes."""
+        if self._bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 9 // 10
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            # Other processes sharing the file may have added or evicted entries meanwhile
+            total = self._total()
+            while total > target:
+                rows = self._db.execute(
+                    "SELECT 'verdicts', rowid, entry_bytes, last_used FROM verdicts "
+                    "UNION ALL SELECT 'files', rowid, entry_bytes, last_used FROM files "
+                    "ORDER BY last_used LIMIT ?", (_EVICT_BATCH,)
+                ).fetchall()
+                if not rows:
+                    break
+                for table, rowid, entry_bytes, _ in rows:
+                    if total <= target:
+                        break
+                    self._db.execute(f"DELETE FROM {table} WHERE rowid = ?", (rowid,))
+                    total -= entry_bytes
+            self._db.execute("COMMIT")
+            self._bytes = total
@@ -0,0 +1,71 @@
+"""
+The result dict every scan path returns (gpu_malware_scan, the Scanner
+sessions, scan_file and the directory sweep), so callers and the cache see
+one schema whatever engine matched.
+"""
+
+import time
+
+import numpy as np
+
+from file_types import target_names
+from metrics import METRICS
+from progress import ScanProgress
+
+
+def cached_scan(cache, file_path, fingerprint, scan_function, progress=None):
+    """
+    Result dict for file_path from the ResultCache, running scan_function(file_path)
+    on a miss. A cached dict has 'cached': True and reports this path and lookup time;
+    progress (if given) gets its "done" event.
+    """
+    start = time.perf_counter()
+    result = cache.scan(file_path, fingerprint, scan_function)
+    if result and result.get('cached'):
+        METRICS.record_scan(result.get('backend', 'gpu'), result['file_size'], 0, 0, 0.0, cached=True)
+        # JSON turned the (name, count) tuples into lists
+        result['matched_signatures'] = [tuple(match) for match in result['matched_signatures']]
+        result['file_path'] = file_path
+        result['scan_time'] = time.perf_counter() - start
+        result['kernel_time'] = 0.0
+        if progress is not None:
+            progress(ScanProgress(file_path, "done", result['file_size'], result['file_size'], 1, 1))
+    return result
+
+
+def matched_signatures_from_counts(results, sig_names):
+    """(name, count) for every signature with a non-zero count."""
+    return [(sig_names[i], int(results[i])) for i in np.flatnonzero(results)]
+
+
+def build_result(file_path, file_size, signatures_checked, matched_signatures, scan_time, kernel_time,
+                 targets=(0,), prefilter=None, backend='gpu', phases=None):
+    """
+    Result dict shared by gpu_malware_scan, the Scanner classes, scan_file and scan_directory.
+    signatures_checked counts the signatures evaluated for the file's target types;
+    prefilter (FilterStats) adds the q-gram prefilter hit rate when it ran;
+    backend names the engine that matched ('gpu', 'numba' or 'cpu');
+    phases ({phase: seconds}) adds the scan's time breakdown.
+    """
+    matches_found = len(matched_signatures)
+    result = {
+    'file_path': file_path,
+    'file_size': file_size,
+    'signatures_checked': signatures_checked,
+    'matches_found': matches_found,
+    'total_occurrences': sum(count for _, count in matched_signatures),
+    'matched_signatures': matched_signatures,  # List of (name, count) tuples
+    'scan_time': scan_time,
+    'kernel_time': kernel_time,
+    'is_infected': matches_found > 0,
+    'status': 'INFECTED' if matches_found > 0 else 'CLEAN',
+    'threat_names': [sig_name for sig_name, count in matched_signatures],  # Just names for UI
+    'target_types': list(targets),  # NDB target types whose signatures were evaluated
+    'file_types': target_names(targets),
+    'backend': backend
+    }
+    if prefilter is not None:
+        result['prefilter'] = prefilter.as_dict()
+    if phases is not None:
+        result['phase_times'] = phases
+    return result
@@ -0,0 +1,387 @@
+"""
+Compiled, memory-mappable signature database.
+
+On-disk layout (little endian):
+
+    header   : magic "PDCSIGDB", uint32 version, uint32 section count
+    sections : one table entry per section
+               (name[24], numpy dtype[8], uint64 offset, uint64 count, uint64 reserved)
+    data     : every section is a flat 1-D array, aligned to 64 bytes
+
+Opening a DB maps the file and exposes each section as a read-only NumPy
+view over the map; nothing is parsed or copied per signature. Strings
+(names, NDB bodies, offset specs) are stored as a byte blob plus an
+offsets array and decoded only when asked for.
+
+Sections written by compile_signature_db:
+
+    names_blob / names_offsets       signature names
+    bodies_blob / bodies_offsets     original NDB hex bodies
+    offset_blob / offset_offsets     NDB offset specs ("*", "EP+0,100", ...)
+    types                            NDB target type
+    kinds                            PATTERN_* kind of each signature
+    pattern_bytes / pattern_masks    packed fixed-length patterns (empty for gapped ones)
+    pattern_offsets                  CSR offsets into pattern_bytes (count + 1)
+    m_* / m_ac_*                     SignatureMatcher and Aho-Corasick tables
+    m_offset_*                       parsed offset specs (OffsetTable)
+    generation                       update count (0 = full compile, +1 per delta)
+
+update_signature_db applies a daily delta (add / replace / drop by name)
+to an existing DB without recompiling the signatures it keeps.
+"""
+
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'CPU'))
+
+from file_types import parse_target_type
+from ndb_offset import OffsetTable
+from ndb_pattern import compile_pattern
+from pattern_matcher import PartTables, SignatureMatcher
+
+SIGDB_MAGIC = b"PDCSIGDB"
+SIGDB_VERSION = 3
+
+_HEADER = struct.Struct("<8sII")
+_ENTRY = struct.Struct("<24s8sQQQ")
+_ALIGN = 64
+
+# Signature kinds
+PATTERN_LITERAL = 0   # plain bytes
+PATTERN_WILDCARD = 1  # fixed length with '??' bytes
+PATTERN_NIBBLE = 2    # fixed length with nibble wildcards
+PATTERN_VARIABLE = 3  # gaps or alternations (no fixed byte layout)
+PATTERN_INVALID = 255
+
+
+class StringTable:
+    """Lazy sequence of strings stored as a blob plus an offsets array."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.blob[start:end].tobytes().decode("utf-8", "replace")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _pack_strings(values):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def _compile_body(body):
+    """Compiled program of a signature body, or None if it doesn't compile."""
+    try:
+        return compile_pattern(body)
+    except ValueError:
+        return None
+
+
+def _classify(program):
+    """Return (kind, values, masks) for a compiled signature body (None: invalid)."""
+    if program is None:
+        return PATTERN_INVALID, b"", b""
+    if not program.is_fixed:
+        return PATTERN_VARIABLE, b"", b""
+    token = program.parts[0].tokens[0]
+    masks = set(token.masks)
+    if masks <= {0xFF}:
+        kind = PATTERN_LITERAL
+    elif masks <= {0x00, 0xFF}:
+        kind = PATTERN_WILDCARD
+    else:
+        kind = PATTERN_NIBBLE
+    return kind, token.values, token.masks
+
+
+COMPILE_BATCH = 65536  # signature dicts parsed at a time by build_sections
+
+
+def build_sections(signatures, batch_size=COMPILE_BATCH):
+    """
+    Build every DB section from signature dicts (name/type/offset/pattern).
+
+    signatures can be any iterable (e.g. stream_signatures): it is consumed
+    in batches of batch_size. Each body is compiled once, straight into the
+    matcher's part tables (PartTables), and the batch is packed into blobs
+    and arrays right away, so neither the dicts nor the compiled programs of
+    more than one batch are alive. What grows with the set is only packed
+    data: strings, part rows and the distinct anchors of the automaton.
+    """
+    tables = PartTables()
+    batches = [_pack_batch([], tables)]
+    batch = []
+    for sig in signatures:
+        batch.append(sig)
+        if len(batch) >= batch_size:
+            batches.append(_pack_batch(batch, tables))
+            batch = []
+    if batch:
+        batches.append(_pack_batch(batch, tables))
+
+    sections = {}
+    for key in ("names", "bodies", "offset"):
+        sections[key + "_blob"], sections[key + "_offsets"] = _join_packed([b[key] for b in batches])
+    sections["types"] = np.concatenate([b["types"] for b in batches])
+    sections["kinds"] = np.concatenate([b["kinds"] for b in batches])
+    (sections["pattern_bytes"], sections["pattern_masks"]), sections["pattern_offsets"] = _join_packed(
+        [b["patterns"] for b in batches])
+    offsets = OffsetTable(arrays={name: np.concatenate([b["offset_table"][name] for b in batches])
+                                  for name in OffsetTable.ARRAY_NAMES})
+    del batches
+
+    arrays, automaton = tables.build()
+    matcher = SignatureMatcher(StringTable(sections["names_blob"], sections["names_offsets"]),
+                               StringTable(sections["bodies_blob"], sections["bodies_offsets"]),
+                               arrays=arrays, automaton=automaton, offsets=offsets, types=sections["types"])
+    for name, array in matcher.arrays().items():
+        sections["m_" + name] = np.asarray(array)
+    return sections
+
+
+def _pack_batch(signatures, tables):
+    """
+    Packed strings, types, kinds, fixed patterns and offset table of a list
+    of signature dicts (CSR rows per section); their compiled bodies are
+    appended to tables.
+    """
+    bodies = [sig.get("pattern", "").strip().lower() for sig in signatures]
+    offset_specs = [str(sig.get("offset", "*")) for sig in signatures]
+    offset_table = OffsetTable(offset_specs)
+    kinds = np.empty(len(signatures), dtype=np.uint8)
+    values = []
+    masks = []
+    for i, body in enumerate(bodies):
+        program = _compile_body(body)
+        kinds[i], v, m = _classify(program)
+        tables.add(program, bool(offset_table.bounded[i]))
+        values.append(v)
+        masks.append(m)
+    pattern_offsets = np.zeros(len(signatures) + 1, dtype=np.uint64)
+    np.cumsum([len(v) for v in values], out=pattern_offsets[1:])
+    return {
+        "names": _pack_strings([sig.get("name", "") for sig in signatures]),
+        "bodies": _pack_strings(bodies),
+        "offset": _pack_strings(offset_specs),
+        "offset_table": offset_table.arrays(),
+        "types": np.array([parse_target_type(sig.get("type", 0)) for sig in signatures], dtype=np.int16),
+        "kinds": kinds,
+        "patterns": ((np.frombuffer(b"".join(values), dtype=np.uint8),
+                      np.frombuffer(b"".join(masks), dtype=np.uint8)), pattern_offsets),
+    }
+
+
+def _join_packed(parts):
+    """_concat_packed over a list of (blob or tuple of blobs, offsets), in one pass."""
+    lengths = np.concatenate([np.diff(np.asarray(offsets, dtype=np.int64)) for _, offsets in parts])
+    offsets = np.zeros(len(lengths) + 1, dtype=np.uint64)
+    np.cumsum(lengths, out=offsets[1:])
+    if isinstance(parts[0][0], tuple):
+        return tuple(np.concatenate(blobs) for blobs in zip(*(blobs for blobs, _ in parts))), offsets
+    return np.concatenate([blob for blob, _ in parts]), offsets
+
+
+def write_sections(sections, output_path):
+    """Write named 1-D arrays in the SIGDB layout (atomically, via a temp file)."""
+    table_size = _HEADER.size + _ENTRY.size * len(sections)
+    offset = _aligned(table_size)
+    entries = []
+    for name, array in sections.items():
+        array = np.ascontiguousarray(array).reshape(-1)
+        entries.append((name, array, offset))
+        offset = _aligned(offset + array.nbytes)
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(SIGDB_MAGIC, SIGDB_VERSION, len(entries)))
+        for name, array, data_offset in entries:
+            f.write(_ENTRY.pack(name.encode(), array.dtype.str.encode(), data_offset, array.size, 0))
+        for name, array, data_offset in entries:
+            f.seek(data_offset)
+            f.write(array.tobytes())
+        f.truncate(offset)
+    os.replace(tmp_path, output_path)
+
+
+def compile_signature_db(signatures, output_path):
+    """Compile parsed NDB signatures (a list or any iterable) into a memory-mappable DB file."""
+    write_sections(build_sections(signatures), output_path)
+    return output_path
+
+
+def update_signature_db(db_path, upserts, drops=(), output_path=None):
+    """
+    Apply a delta to a compiled DB and write the next generation.
+
+    Signatures in ``upserts`` are added, or replace every signature with the
+    same name; names in ``drops`` are removed. Only the delta is compiled:
+    the sections of the kept signatures are copied as arrays and the
+    matcher tables are spliced (see SignatureMatcher.splice), so the cost
+    follows the size of the delta plus one automaton rebuild.
+
+    The new file replaces output_path (default: db_path) atomically; open
+    SignatureDB objects keep reading the previous generation. Returns a
+    summary dict.
+    """
+    upserts = list({sig.get("name", ""): sig for sig in upserts}.values())  # last one of a name wins
+    removed_names = set(drops) | {sig.get("name", "") for sig in upserts}
+
+    db = open_signature_db(db_path)
+    try:
+        base_names = list(db.names)
+        removed = np.fromiter((name in removed_names for name in base_names), dtype=np.bool_, count=len(base_names))
+        keep = np.flatnonzero(~removed)
+        delta = build_sections(upserts)
+
+        sections = {}
+        for blob, offsets in (("names_blob", "names_offsets"), ("bodies_blob", "bodies_offsets"),
+                              ("offset_blob", "offset_offsets")):
+            sections[blob], sections[offsets] = _concat_packed(
+                _take_packed(db.sections[blob], db.sections[offsets], keep), (delta[blob], delta[offsets]))
+        sections["types"] = np.concatenate([db.types[keep], delta["types"]])
+        sections["kinds"] = np.concatenate([db.kinds[keep], delta["kinds"]])
+        (sections["pattern_bytes"], sections["pattern_masks"]), sections["pattern_offsets"] = _concat_packed(
+            _take_packed((db.pattern_bytes, db.pattern_masks), db.pattern_offsets, keep),
+            ((delta["pattern_bytes"], delta["pattern_masks"]), delta["pattern_offsets"]))
+
+        names = StringTable(sections["names_blob"], sections["names_offsets"])
+        bodies = StringTable(sections["bodies_blob"], sections["bodies_offsets"])
+        matcher = db.matcher().splice(keep, _sections_matcher(delta), names, bodies, sections["types"])
+        for name, array in matcher.arrays().items():
+            sections["m_" + name] = np.asarray(array)
+        generation = db.generation + 1
+        sections["generation"] = np.array([generation], dtype=np.uint64)
+    finally:
+        db.close()
+
+    write_sections(sections, output_path or db_path)
+    upsert_names = {sig.get("name", "") for sig in upserts}
+    base_names = set(base_names)
+    replaced = len(upsert_names & base_names)
+    return {
+        "generation": generation,
+        "signatures": len(sections["kinds"]),
+        "added": len(upserts) - replaced,
+        "replaced": replaced,
+        "dropped": len((set(drops) - upsert_names) & base_names),
+    }
+
+
+def _take_packed(blobs, offsets, index):
+    """
+    Gather CSR rows ``index`` of one blob (or a tuple of blobs sharing the
+    same offsets). Returns (blob(s), uint64 offsets).
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    starts = offsets[index]
+    lengths = offsets[index + 1] - starts
+    new_offsets = np.zeros(len(index) + 1, dtype=np.uint64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    cells = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum(), dtype=np.int64)
+    if isinstance(blobs, tuple):
+        return tuple(blob[cells] for blob in blobs), new_offsets
+    return blobs[cells], new_offsets
+
+
+def _concat_packed(first, second):
+    """Append CSR rows: each argument is (blob or tuple of blobs, offsets)."""
+    (blobs_a, offsets_a), (blobs_b, offsets_b) = first, second
+    offsets = np.concatenate([offsets_a[:-1], np.asarray(offsets_b, dtype=np.uint64) + offsets_a[-1]])
+    if isinstance(blobs_a, tuple):
+        return tuple(np.concatenate([a, b]) for a, b in zip(blobs_a, blobs_b)), offsets
+    return np.concatenate([blobs_a, blobs_b]), offsets
+
+
+def _sections_matcher(sections):
+    """SignatureMatcher over the m_* tables of a section dict."""
+    arrays = {name[2:]: array for name, array in sections.items() if name.startswith("m_")}
+    return SignatureMatcher.from_arrays(StringTable(sections["names_blob"], sections["names_offsets"]),
+                                        StringTable(sections["bodies_blob"], sections["bodies_offsets"]),
+                                        arrays, types=sections["types"])
+
+
+def _aligned(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class SignatureDB:
+    """A compiled signature DB opened with mmap; sections are zero-copy NumPy views."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = _HEADER.unpack_from(self._map, 0)
+        if magic != SIGDB_MAGIC:
+            raise ValueError(f"{path} is not a compiled signature DB")
+        if version != SIGDB_VERSION:
+            raise ValueError(f"{path}: unsupported signature DB version {version}")
+
+        self.sections = {}
+        for i in range(count):
+            raw_name, dtype, offset, size, _ = _ENTRY.unpack_from(self._map, _HEADER.size + i * _ENTRY.size)
+            name = raw_name.rstrip(b"\0").decode()
+            dtype = np.dtype(dtype.rstrip(b"\0").decode())
+            if size:
+                self.sections[name] = np.frombuffer(self._map, dtype=dtype, count=size, offset=offset)
+            else:
+                self.sections[name] = np.empty(0, dtype=dtype)
+
+        self.names = StringTable(self.sections["names_blob"], self.sections["names_offsets"])
+        self.bodies = StringTable(self.sections["bodies_blob"], self.sections["bodies_offsets"])
+        self.offsets = StringTable(self.sections["offset_blob"], self.sections["offset_offsets"])
+        self.types = self.sections["types"]
+        self.kinds = self.sections["kinds"]
+        self.pattern_bytes = self.sections["pattern_bytes"]
+        self.pattern_masks = self.sections["pattern_masks"]
+        self.pattern_offsets = self.sections["pattern_offsets"]
+        self.generation = int(self.sections["generation"][0]) if "generation" in self.sections else 0
+        self._matcher = None
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def pattern_lengths(self):
+        return np.diff(self.pattern_offsets)
+
+    def matcher(self):
+        """SignatureMatcher over every signature, backed by the mapped tables."""
+        if self._matcher is None:
+            self._matcher = _sections_matcher(self.sections)
+        return self._matcher
+
+    def close(self):
+        self.sections = {}
+        self._matcher = None
+        self.names = self.bodies = self.offsets = None
+        self.types = self.kinds = None
+        self.pattern_bytes = self.pattern_masks = self.pattern_offsets = None
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # views still alive elsewhere; the map is released with them
+        self._file.close()
+
+
+def open_signature_db(path):
+    return SignatureDB(path)
@@ -0,0 +1,147 @@
+"""
+Incremental reader for signature files.
+
+stream_signatures(path) yields one signature dict at a time from either
+
+    signatures.json    a JSON array of objects (what pyt.py writes by default)
+    signatures.jsonl   JSON Lines, one object per line (pyt.py --jsonl)
+
+The file is read in blocks, and the complete elements of each block are
+decoded by one json.loads call, so the per-signature work all happens in
+the C decoder; memory stays at about one block plus the largest element.
+The format is taken from the first non-blank character, not the name.
+"""
+
+import json
+
+READ_BLOCK = 1024 * 1024  # characters per read
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def stream_signatures(filepath, block_size=READ_BLOCK):
+    """Generator that yields one signature dict at a time from a JSON array or JSON Lines file."""
+    with open(filepath, "r", encoding="utf-8") as f:
+        first = f.read(block_size)
+        while first and not first.strip(_WHITESPACE) and (chunk := f.read(block_size)):
+            first += chunk
+        start = len(first) - len(first.lstrip(_WHITESPACE))
+        if start < len(first) and first[start] == "[":
+            yield from _iter_array(f, first, start + 1, block_size)
+        else:
+            yield from _iter_lines(f, first, block_size)
+
+
+def _iter_array(f, buffer, pos, block_size):
+    """Elements of a JSON array whose '[' ends just before buffer[pos]."""
+    eof = False
+    batch = True  # try decoding the buffer's complete elements in one call
+    expect_value = True  # after '[' or ',': a value (or the closing ']') comes next
+    while True:
+        # Skip whitespace and the comma between elements
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "," and not expect_value:
+                pos += 1
+                expect_value = True
+                continue
+            if pos < len(buffer) or eof:
+                break
+            buffer, pos, eof = _refill(f, buffer, pos, block_size)
+            batch = True
+
+        if pos == len(buffer):
+            raise ValueError(f"{f.name}: unterminated JSON array")
+        if buffer[pos] == "]":
+            return
+        if not expect_value:
+            raise ValueError(f"{f.name}: expected ',' or ']' at character {f.tell()}")
+
+        # Fast path: everything up to the last "}," as one array. A cut inside a
+        # string or a nested value leaves unbalanced JSON and fails to decode.
+        cut = _last_element_end(buffer, pos) if batch else 0
+        if cut:
+            try:
+                elements = json.loads("[" + buffer[pos:cut] + "]")
+            except json.JSONDecodeError:
+                batch = False  # decode element by element until the next block
+            else:
+                yield from elements
+                pos = cut
+                expect_value = False
+                continue
+
+        # Decode the next element; an element cut off by the block edge (or one
+        # touching it, which may be a truncated number) waits for more input
+        read_size = block_size
+        while True:
+            try:
+                element, end = _decoder.raw_decode(buffer, pos)
+                if end < len(buffer) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            buffer, pos, eof = _refill(f, buffer, pos, read_size)
+            batch = True
+            read_size *= 2  # an element larger than a block: grow instead of rescanning it per block
+        yield element
+        pos = end
+        expect_value = False
+
+
+def _last_element_end(buffer, pos, tries=8):
+    """Index just past the last '}' in buffer[pos:] that a ',' follows (0 if none found)."""
+    end = len(buffer)
+    for _ in range(tries):
+        brace = buffer.rfind("}", pos, end)
+        if brace < 0:
+            return 0
+        after = brace + 1
+        while after < len(buffer) and buffer[after] in _WHITESPACE:
+            after += 1
+        if after < len(buffer) and buffer[after] == ",":
+            return brace + 1
+        end = brace
+    return 0
+
+
+def _iter_lines(f, buffer, block_size):
+    """Objects of a JSON Lines file, decoded a block of complete lines at a time."""
+    eof = False
+    while not eof:
+        chunk = f.read(block_size)
+        eof = not chunk
+        buffer += chunk
+        cut = len(buffer) if eof else buffer.rfind("\n") + 1
+        if cut:
+            yield from _decode_lines(buffer[:cut])
+            buffer = buffer[cut:]
+
+
+def _decode_lines(text):
+    """Decode complete JSON lines: one json.loads for the block, line by line if it has blank lines."""
+    text = text.strip(_WHITESPACE)
+    if not text:
+        return []
+    try:
+        # A raw newline can't occur inside a JSON value, so each one separates two records
+        return json.loads("[" + text.replace("\n", ",") + "]")
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.split("\n") if line.strip(_WHITESPACE)]
+
+
+def _refill(f, buffer, pos, block_size):
+    """Drop what was consumed and append the next block: (buffer, pos, eof)."""
+    chunk = f.read(block_size)
+    return buffer[pos:] + chunk, 0, not chunk
+
+
+def write_signatures_jsonl(signatures, output_path):
+    """Write signatures as JSON Lines: one compact object per line."""
+    with open(output_path, "w", encoding="utf-8") as f:
+        for sig in signatures:
+            f.write(json.dumps(sig, separators=(",", ":")))
+            f.write("\n")
@@ -0,0 +1,116 @@
+"""
+Client for scan_daemon.py.
+
+    with ScanClient() as client:           # or ScanClient("/run/scan.sock")
+        result = client.scan("upload.bin")  # same dict as gpu_malware_scan
+        result = client.scan_bytes(body)    # an object that isn't a file
+        results = client.scan_batch(paths)  # one round trip; a failed entry is {"error": ...}
+
+One connection is kept open for all calls; a ScanClient is not meant to
+be shared between threads (open one per thread). A request the daemon
+rejects raises ScanDaemonError.
+"""
+
+import json
+import os
+import socket
+import tempfile
+
+DEFAULT_SOCKET = os.environ.get("SCAN_DAEMON_SOCKET", os.path.join(tempfile.gettempdir(), "scan_daemon.sock"))
+
+
+class ScanDaemonError(Exception):
+    """The daemon answered a request with an error."""
+
+
+class ScanClient:
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def connect(self):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._sock = sock
+            self._file = sock.makefile("rb")
+        return self
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = None
+            self._file = None
+
+    def ping(self):
+        """True when the daemon answers."""
+        return self._request(b"PING\n")["ok"]
+
+    def scan(self, path):
+        """Result dict for a file the daemon can read."""
+        return self._request(f"SCAN {_path_line(path)}\n".encode("utf-8"))["result"]
+
+    def scan_bytes(self, data):
+        """Result dict for any bytes-like object, sent over the socket."""
+        view = memoryview(data)
+        return self._request(f"INSTREAM {view.nbytes}\n".encode("ascii"), view)["result"]
+
+    def scan_batch(self, paths):
+        """Result dicts for many files, in order; a file that failed gets {"error": message}."""
+        lines = "".join(f"{_path_line(path)}\n" for path in paths)
+        return self._request(f"BATCH {len(paths)}\n{lines}".encode("utf-8"))["results"]
+
+    def stats(self):
+        return self._request(b"STATS\n")["stats"]
+
+    def _request(self, header, body=None):
+        self.connect()
+        try:
+            self._sock.sendall(header)
+            if body is not None:
+                self._sock.sendall(body)
+            line = self._file.readline()
+        except OSError:
+            self.close()
+            raise
+        if not line:
+            self.close()
+            raise ConnectionError("the scan daemon closed the connection")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise ScanDaemonError(response.get("error", "request failed"))
+        if "result" in response:
+            _restore_matches(response["result"])
+        for result in response.get("results", ()):
+            _restore_matches(result)
+        return response
+
+
+def _path_line(path):
+    path = os.path.abspath(os.fspath(path))
+    if "\n" in path or "\r" in path:
+        raise ValueError(f"path contains a line break: {path!r}")
+    return path
+
+
+def _restore_matches(result):
+    # JSON turned the (name, count) tuples into lists
+    if "matched_signatures" in result:
+        result["matched_signatures"] = [tuple(match) for match in result["matched_signatures"]]
+
+
+def scan_file(path, socket_path=DEFAULT_SOCKET, timeout=None):
+    """One-off scan over a short-lived connection."""
+    with ScanClient(socket_path, timeout) as client:
+        return client.scan(path)
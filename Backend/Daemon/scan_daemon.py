@@ -0,0 +1,325 @@
+"""
+Long-lived scan daemon on a UNIX domain socket (in the spirit of clamd).
+
+The signature set is loaded and compiled once; clients then send
+requests over the socket and get one JSON line back per request. A
+connection can carry any number of requests, and clients are served
+concurrently:
+
+    PING                         {"ok": true}
+    SCAN <path>                  {"ok": true, "result": {...}}     (same dict as gpu_malware_scan)
+    INSTREAM <length>            {"ok": true, "result": {...}}     followed by <length> raw bytes
+    BATCH <count>                {"ok": true, "results": [...]}    followed by <count> path lines
+    STATS                        {"ok": true, "stats": {...}}
+
+A failed request answers {"ok": false, "error": "..."} (a BATCH entry
+that failed is {"error": "..."}) and the connection stays usable, except
+after a bad INSTREAM length or BATCH count, whose body can't be skipped. Paths
+are opened by the daemon, so they must be absolute or relative to its
+working directory; scan_client.ScanClient makes them absolute.
+
+With --backend cpu the work goes to a pool of worker processes, each with
+its own CPUScanner over the same mmapped signature DB (as in
+directory_scanner). Any other backend uses one session (with the GPU,
+numba or auto engine) driven by a single thread, in request order. Either
+way a signature file replaced by `pyt.py --update` is picked up before the
+next scan.
+
+    python scan_daemon.py signatures.db --socket /run/scan.sock --backend cpu -j 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'Code_to_get_signature'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'GPU'))
+
+from metrics import METRICS
+from result_cache import ResultCache
+from scan_client import DEFAULT_SOCKET
+from scanner import CPUScanner, create_scanner
+
+MAX_STREAM_BYTES = 256 * 1024 * 1024  # largest INSTREAM object
+MAX_BATCH = 10000                     # most paths in one BATCH request
+SOCKET_MODE = 0o660
+WARM_UP_BYTES = 4096
+
+
+class FramingError(ValueError):
+    """A request whose body can't be skipped; the connection is closed after the answer."""
+
+
+def _json_default(value):
+    # numpy scalars in result dicts
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _response(payload):
+    return (json.dumps(payload, default=_json_default) + "\n").encode("utf-8")
+
+
+# Set once per worker process by _init_worker
+_worker_session = None
+
+
+def _init_worker(signature_path, cache_path=None):
+    """Load the signature set once per worker process; a .db is mmapped and shared."""
+    global _worker_session
+    _worker_session = CPUScanner(signature_path, cache=ResultCache(cache_path) if cache_path else None)
+    _warm_up(_worker_session)
+
+
+def _warm_up(session):
+    """One throwaway scan, so the first request doesn't pay for loading the compiled matchers."""
+    session.counts(bytes(WARM_UP_BYTES))
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+def _worker_scan(path):
+    _worker_session.refresh()
+    return _worker_session.scan(path)
+
+
+def _worker_scan_bytes(data, name):
+    _worker_session.refresh()
+    return _worker_session.scan_bytes(data, name)
+
+
+class SessionEngine:
+    """One scanner session used from a single thread, so its requests run one at a time."""
+
+    records_metrics = False  # the session records its own scans in this process
+
+    def __init__(self, signature_path, backend="auto", cache_path=None):
+        self.backend = backend
+        self.workers = 1
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scan-session")
+        self.session = self.executor.submit(self._open, signature_path, backend, cache_path).result()
+
+    @staticmethod
+    def _open(signature_path, backend, cache_path):
+        cache = ResultCache(cache_path) if cache_path else None
+        session = create_scanner(signature_path, cache=cache, backend=backend)
+        _warm_up(session)
+        return session
+
+    def scan(self, path):
+        return self.executor.submit(self._scan, path)
+
+    def scan_bytes(self, data, name):
+        return self.executor.submit(self._scan_bytes, data, name)
+
+    def _scan(self, path):
+        self.session.refresh()
+        return self.session.scan(path)
+
+    def _scan_bytes(self, data, name):
+        self.session.refresh()
+        return self.session.scan_bytes(data, name)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ProcessPoolEngine:
+    """CPUScanner sessions in worker processes; requests are spread over them."""
+
+    records_metrics = True  # worker processes have their own METRICS
+
+    def __init__(self, signature_path, workers=None, cache_path=None):
+        self.backend = "cpu"
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(signature_path, cache_path))
+        # Start the workers (and load the signatures) now rather than on the first request
+        for future in [self.executor.submit(_worker_ready) for _ in range(self.workers)]:
+            future.result()
+
+    def scan(self, path):
+        return self.executor.submit(_worker_scan, path)
+
+    def scan_bytes(self, data, name):
+        return self.executor.submit(_worker_scan_bytes, data, name)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ScanDaemon:
+    """asyncio server answering the requests above with an engine (SessionEngine or ProcessPoolEngine)."""
+
+    def __init__(self, engine, socket_path=DEFAULT_SOCKET, socket_mode=SOCKET_MODE):
+        self.engine = engine
+        self.socket_path = socket_path
+        self.socket_mode = socket_mode
+        self.started = time.time()
+        self.requests = 0
+        self.active = 0
+        self.clients = 0
+        self._server = None
+
+    async def start(self):
+        _remove_stale_socket(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path,
+                                                       limit=64 * 1024)
+        os.chmod(self.socket_path, self.socket_mode)
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        print(f"[i] Listening on {self.socket_path} ({self.engine.backend}, {self.engine.workers} worker(s))")
+        try:
+            await stop.wait()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    async def _handle(self, reader, writer):
+        self.clients += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command, _, argument = line.decode("utf-8", "replace").rstrip("\r\n").partition(" ")
+                self.requests += 1
+                self.active += 1
+                framing_error = False
+                try:
+                    payload = await self._dispatch(command.upper(), argument, reader)
+                except FramingError as e:
+                    payload = {"ok": False, "error": str(e)}
+                    framing_error = True
+                except (ValueError, OSError) as e:
+                    payload = {"ok": False, "error": str(e)}
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as e:  # keep serving: one bad input mustn't take the daemon down
+                    payload = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                finally:
+                    self.active -= 1
+                writer.write(_response(payload))
+                await writer.drain()
+                if framing_error:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    async def _dispatch(self, command, argument, reader):
+        if command == "PING":
+            return {"ok": True}
+        if command == "SCAN":
+            if not argument:
+                raise ValueError("SCAN needs a path")
+            return {"ok": True, "result": await self._run(self.engine.scan(argument))}
+        if command == "INSTREAM":
+            length = _count(argument, MAX_STREAM_BYTES, "INSTREAM length")
+            data = await reader.readexactly(length)
+            return {"ok": True, "result": await self._run(self.engine.scan_bytes(data, "<stream>"))}
+        if command == "BATCH":
+            count = _count(argument, MAX_BATCH, "BATCH count")
+            paths = [(await reader.readline()).decode("utf-8", "replace").rstrip("\r\n") for _ in range(count)]
+            futures = [self.engine.scan(path) for path in paths]
+            results = await asyncio.gather(*(self._run(future) for future in futures), return_exceptions=True)
+            return {"ok": True, "results": [
+                {"error": str(result)} if isinstance(result, BaseException) else result for result in results
+            ]}
+        if command == "STATS":
+            return {"ok": True, "stats": self.stats()}
+        raise ValueError(f"unknown command: {command!r}")
+
+    async def _run(self, future):
+        result = await asyncio.wrap_future(future)
+        if self.engine.records_metrics:
+            METRICS.record_scan(result.get("backend", "cpu"), result["file_size"], result["signatures_checked"],
+                                result["matches_found"], result["scan_time"], cached=bool(result.get("cached")))
+        return result
+
+    def stats(self):
+        return {
+            "backend": self.engine.backend,
+            "workers": self.engine.workers,
+            "uptime": time.time() - self.started,
+            "requests": self.requests,
+            "active": self.active,
+            "clients": self.clients,
+            "metrics": METRICS.snapshot(),
+        }
+
+
+def _count(argument, limit, what):
+    if not argument.isdigit():
+        raise FramingError(f"{what} must be a number")
+    value = int(argument)
+    if value > limit:
+        raise FramingError(f"{what} {value} is over the limit of {limit}")
+    return value
+
+
+def _remove_stale_socket(path):
+    """Remove a socket file left by a daemon that is gone; refuse to replace a live one."""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(path)
+    else:
+        raise RuntimeError(f"a scan daemon is already listening on {path}")
+    finally:
+        probe.close()
+
+
+def create_engine(signature_path, backend="auto", workers=None, cache_path=None):
+    """ProcessPoolEngine for backend "cpu", a SessionEngine for the others."""
+    if backend == "cpu":
+        return ProcessPoolEngine(signature_path, workers, cache_path)
+    return SessionEngine(signature_path, backend, cache_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan daemon: signatures loaded once, requests over a UNIX socket")
+    parser.add_argument("signatures", help="signatures.db (preferred), signatures.json or signatures.jsonl")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--backend", choices=("auto", "gpu", "numba", "cpu"), default="auto")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes for --backend cpu (default: one per core)")
+    parser.add_argument("--cache", default=None, help="SQLite verdict cache shared by all requests")
+    args = parser.parse_args()
+
+    METRICS.enable()
+    start = time.perf_counter()
+    engine = create_engine(args.signatures, args.backend, args.workers, args.cache)
+    print(f"[i] Signatures loaded in {time.perf_counter() - start:.2f} seconds")
+    try:
+        asyncio.run(ScanDaemon(engine, args.socket).serve_forever())
+    finally:
+        engine.shutdown()
@@ -1,7 +1,13 @@
 # gpu_scan_caller.py
 
-from signature_loader import load_signatures
+import os
+
+from signature_loader import load_signatures, load_signature_db
 from gpu_scanner import gpu_malware_scan
 
-signatures = load_signatures("C:/Users/mahme/Downloads/extract/Backend/signatures.json")
-result =gpu_malware_scan("C:/Users/mahme/Downloads/extract/Backend/malware_files/eicar.txt", signatures)
+# Prefer the compiled DB written by pyt.py; fall back to the JSON export
+if os.path.exists("C:/Users/mahme/Downloads/extract/Backend/signatures.db"):
+    signatures = load_signature_db("C:/Users/mahme/Downloads/extract/Backend/signatures.db")
+else:
+    signatures = load_signatures("C:/Users/mahme/Downloads/extract/Backend/signatures.json")
+result =gpu_malware_scan("C:/Users/mahme/Downloads/extract/Backend/malware_files/eicar.txt", signatures, verbose=True)
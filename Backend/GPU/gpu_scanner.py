@@ -2,28 +2,51 @@ import numpy as np
 from numba import cuda
 import math
 import time
-import json
+import os
+import sys
+from contextlib import ExitStack
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'Code_to_get_signature'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'CPU'))
+
+from file_utils import prefetch_file_windows, map_file, STREAM_THRESHOLD, STREAM_CHUNK_SIZE, PREFETCH_DEPTH
+from file_types import classify, target_bits, HEADER_SIZE
+from metrics import METRICS
+from progress import PROGRESS_CHUNK_SIZE, reporter, track_windows
+from result_cache import signature_fingerprint
+from scan_result import build_result, cached_scan, matched_signatures_from_counts
+from sigdb import SignatureDB
+from signature_loader import PreparedSignatures, prepare_signatures
+from signature_stream import stream_signatures
 
 MAX_SIGNATURES = 50000000
 MAX_PATTERN_LENGTH = 10000
+PREFILTER_MIN_PATTERNS = 64  # automatic q-gram prefilter from this many covered patterns
 
 @cuda.jit
-def scan_kernel_optimized(file_data, file_len, patterns, pattern_lengths, results):
-    """Optimized kernel with better memory access patterns"""
+def scan_kernel_optimized(file_data, file_len, pattern_bytes, pattern_masks, pattern_offsets, results, min_end):
+    """
+    Optimized kernel over the packed (CSR) pattern layout: pattern s is
+    pattern_bytes[pattern_offsets[s]:pattern_offsets[s + 1]], and a byte
+    matches when (data & mask) == value (mask 0x00 = '??', 0xF0/0x0F = nibble).
+    Matches ending at or before min_end are skipped (already counted in the
+    previous overlapping stream window).
+    """
     idx = cuda.grid(1)
     stride = cuda.gridsize(1)
     
     while idx < file_len:
-        for s in range(patterns.shape[0]):
-            pat_len = pattern_lengths[s]
-            if idx + pat_len > file_len:
+        for s in range(pattern_offsets.shape[0] - 1):
+            start = pattern_offsets[s]
+            pat_len = pattern_offsets[s + 1] - start
+            if idx + pat_len > file_len or idx + pat_len <= min_end:
                 continue
 
             match = True
             for j in range(pat_len):
-                pattern_byte = patterns[s, j]
-                if pattern_byte != 256:  # Not a wildcard
-                    if file_data[idx + j] != pattern_byte:
+                mask = pattern_masks[start + j]
+                if mask != 0:  # Not a wildcard
+                    if (file_data[idx + j] & mask) != pattern_bytes[start + j]:
                         match = False
                         break
 
@@ -32,252 +55,398 @@ def scan_kernel_optimized(file_data, file_len, patterns, pattern_lengths, result
         
         idx += stride
 
-def gpu_malware_scan(file_path, signatures_data, max_signatures=None):
+@cuda.jit
+def scan_kernel_batched(file_data, data_len, file_offsets, file_targets, pattern_bytes, pattern_masks,
+                        pattern_offsets, pattern_bits, results):
     """
-    Complete GPU malware scanner - one function does it all!
-    
-    Args:
-        file_path: Path to file to scan
-        signatures_data: List of signature dictionaries OR path to JSON file
-        max_signatures: Limit number of signatures (optional)
+    scan_kernel_optimized over many files packed back to back: file f is
+    file_data[file_offsets[f]:file_offsets[f + 1]]. A match must end inside
+    the file it starts in, and is counted in results[f, s]. Pattern s is only
+    tried on files whose target bitmask has bit pattern_bits[s] set.
     """
-    
-    print("🚀 GPU MALWARE SCANNER")
-    print("=" * 50)
-    
-    # ===== TOTAL TIMING START =====
-    total_start = time.time()
-    
-    # ===== 1. LOAD SIGNATURES =====
-    print("📖 Loading signatures...")
-    load_start = time.time()
-    
-    # Handle both list input and file path input
-    if isinstance(signatures_data, list):
-        all_signatures = signatures_data
-        print(f"   ✅ Using provided signature list")
-    else:
-        # Assume it's a file path
-        with open(signatures_data, "r") as f:
-            all_signatures = json.load(f)
-        print(f"   ✅ Loaded from file: {signatures_data}")
-    
-    if max_signatures:
-        all_signatures = all_signatures[:max_signatures]
-    
-    load_time = time.time() - load_start
-    print(f"   ✅ Total signatures: {len(all_signatures):,} ({load_time:.3f}s)")
-    
-    # ===== 2. READ FILE =====
-    print("📄 Reading target file...")
-    read_start = time.time()
-    
-    with open(file_path, "rb") as f:
-        file_bytes = f.read()
-    file_len = len(file_bytes)
-    
-    read_time = time.time() - read_start
-    print(f"   ✅ File: {file_path}")
-    print(f"   ✅ Size: {file_len:,} bytes ({read_time:.3f}s)")
-    
-    # ===== 3. PROCESS SIGNATURES =====
-    print("🔧 Processing signatures for GPU...")
-    prep_start = time.time()
-    
-    valid_patterns = []
-    pattern_lengths = []
-    sig_names = []
-    skipped = 0
-    
-    for sig in all_signatures:
-        hex_str = sig["pattern"].strip().lower()
+    idx = cuda.grid(1)
+    stride = cuda.gridsize(1)
+    file_count = file_offsets.shape[0] - 1
+    
+    while idx < data_len:
+        # Last file starting at or before idx (skips empty files)
+        lo = 0
+        hi = file_count
+        while hi - lo > 1:
+            mid = (lo + hi) >> 1
+            if file_offsets[mid] <= idx:
+                lo = mid
+            else:
+                hi = mid
+        file_end = file_offsets[lo + 1]
+        targets = file_targets[lo]
         
-        # Validate hex pattern
-        if len(hex_str) % 2 != 0 or len(hex_str) > MAX_PATTERN_LENGTH * 2:
-            skipped += 1
-            continue
-            
-        try:
-            # Parse hex pattern
-            pattern = []
-            for i in range(0, len(hex_str), 2):
-                pair = hex_str[i:i+2]
-                if pair == '??':
-                    pattern.append(256)  # Wildcard
-                else:
-                    pattern.append(int(pair, 16))
+        for s in range(pattern_offsets.shape[0] - 1):
+            start = pattern_offsets[s]
+            pat_len = pattern_offsets[s + 1] - start
+            if idx + pat_len > file_end or not (targets >> pattern_bits[s]) & 1:
+                continue
             
-            valid_patterns.append(pattern)
-            pattern_lengths.append(len(pattern))
-            sig_names.append(sig["name"])
+            match = True
+            for j in range(pat_len):
+                mask = pattern_masks[start + j]
+                if mask != 0:  # Not a wildcard
+                    if (file_data[idx + j] & mask) != pattern_bytes[start + j]:
+                        match = False
+                        break
             
-        except ValueError:
-            skipped += 1
-            continue
-    
-    prep_time = time.time() - prep_start
-    print(f"   ✅ Valid signatures: {len(valid_patterns):,}")
-    if skipped > 0:
-        print(f"   ⚠️ Skipped invalid: {skipped:,}")
-    print(f"   ✅ Processing time: {prep_time:.3f}s")
-    
-    if not valid_patterns:
-        print("❌ No valid signatures found!")
-        return
-    
-    # ===== 4. CREATE GPU ARRAYS =====
-    print("🔧 Creating GPU arrays...")
-    array_start = time.time()
-    
-    # Create pattern array (optimized with uint16)
-    pattern_array = np.full((len(valid_patterns), MAX_PATTERN_LENGTH), 256, dtype=np.uint16)
-    pattern_lengths_array = np.array(pattern_lengths, dtype=np.uint16)
-    
-    for i, pattern in enumerate(valid_patterns):
-        plen = len(pattern)
-        pattern_array[i, :plen] = np.array(pattern, dtype=np.uint16)
-    
-    array_time = time.time() - array_start
-    print(f"   ✅ Arrays created ({array_time:.3f}s)")
-    
-    # ===== 5. GPU CONFIGURATION =====
-    print("🎯 Configuring GPU...")
-    config_start = time.time()
+            if match:
+                cuda.atomic.add(results, (lo, s), 1)
+        
+        idx += stride
+
+@cuda.jit
+def scan_kernel_prefiltered(file_data, file_len, positions, hashes, bucket_start, bucket_patterns, gram_offsets,
+                            pattern_bytes, pattern_masks, pattern_offsets, pattern_bits, targets, results, min_end):
+    """
+    Exact verification behind the q-gram prefilter (see qgram_filter.py):
+    one thread per surviving offset, which only tries the patterns whose
+    first literal 4-gram hashes to the same bucket, aligned so that gram
+    sits at the offset. Same match rules as scan_kernel_optimized; pattern
+    s is only tried when bit pattern_bits[s] of targets is set.
+    """
+    idx = cuda.grid(1)
+    stride = cuda.gridsize(1)
     
-    device = cuda.get_current_device()
-    multiprocessor_count = device.MULTIPROCESSOR_COUNT
+    while idx < positions.shape[0]:
+        h = hashes[idx]
+        for k in range(bucket_start[h], bucket_start[h + 1]):
+            s = bucket_patterns[k]
+            if not (targets >> pattern_bits[s]) & 1:
+                continue
+            pos = positions[idx] - gram_offsets[s]
+            start = pattern_offsets[s]
+            pat_len = pattern_offsets[s + 1] - start
+            if pos < 0 or pos + pat_len > file_len or pos + pat_len <= min_end:
+                continue
+            
+            match = True
+            for j in range(pat_len):
+                mask = pattern_masks[start + j]
+                if mask != 0:  # Not a wildcard
+                    if (file_data[pos + j] & mask) != pattern_bytes[start + j]:
+                        match = False
+                        break
+            
+            if match:
+                cuda.atomic.add(results, s, 1)
+        
+        idx += stride
+
+def _multiprocessor_count():
+    """SM count of the current device (1 under the CUDA simulator, which has no such attribute)."""
+    return getattr(cuda.current_context().device, "MULTIPROCESSOR_COUNT", 1)
+
+def launch_config(scan_len):
+    """(blocks, threads per block) for a buffer of scan_len bytes."""
+    multiprocessor_count = _multiprocessor_count()
     
     # Optimize configuration based on file size
-    if file_len < 1024 * 1024:  # Small files
+    if scan_len < 1024 * 1024:  # Small files
         threads_per_block = 128
-        blocks_per_grid = min(multiprocessor_count * 8, (file_len + threads_per_block - 1) // threads_per_block)
+        blocks_per_grid = min(multiprocessor_count * 8, (scan_len + threads_per_block - 1) // threads_per_block)
     else:  # Large files
         threads_per_block = 256
-        blocks_per_grid = min(multiprocessor_count * 16, (file_len + threads_per_block - 1) // threads_per_block)
+        blocks_per_grid = min(multiprocessor_count * 16, (scan_len + threads_per_block - 1) // threads_per_block)
     
     blocks_per_grid = max(blocks_per_grid, multiprocessor_count * 2)
-    total_threads = blocks_per_grid * threads_per_block
-    
-    config_time = time.time() - config_start
-    print(f"   ✅ Blocks: {blocks_per_grid:,}")
-    print(f"   ✅ Threads per block: {threads_per_block}")
-    print(f"   ✅ Total threads: {total_threads:,}")
-    print(f"   ✅ Config time: {config_time:.3f}s")
-    
-    # ===== 6. GPU MEMORY TRANSFER =====
-    print("📤 Transferring to GPU...")
-    transfer_start = time.time()
-    
-    # Transfer data to GPU
-    file_data_gpu = cuda.to_device(np.frombuffer(file_bytes, dtype=np.uint8))
-    patterns_gpu = cuda.to_device(pattern_array)
-    lengths_gpu = cuda.to_device(pattern_lengths_array)
-    results_gpu = cuda.device_array(len(valid_patterns), dtype=np.int32)
-    
-    transfer_time = time.time() - transfer_start
-    print(f"   ✅ GPU transfer complete ({transfer_time:.3f}s)")
-    
-    # ===== 7. GPU KERNEL EXECUTION =====
-    print("🚀 Launching GPU scan kernel...")
-    kernel_start = time.time()
-    
-    scan_kernel_optimized[blocks_per_grid, threads_per_block](
-        file_data_gpu, file_len, patterns_gpu, lengths_gpu, results_gpu
-    )
-    cuda.synchronize()
-    
-    kernel_time = time.time() - kernel_start
-    print(f"   ✅ GPU kernel complete ({kernel_time:.3f}s)")
-    
-    # ===== 8. RETRIEVE RESULTS =====
-    print("📥 Getting results...")
-    retrieve_start = time.time()
-    
-    results = results_gpu.copy_to_host()
-    
-    retrieve_time = time.time() - retrieve_start
-    print(f"   ✅ Results retrieved ({retrieve_time:.3f}s)")
-    
-    # ===== 9. PROCESS AND DISPLAY RESULTS =====
-    print("\n🔍 SCAN RESULTS:")
-    print("=" * 50)
-    
-    matches_found = 0
-    total_occurrences = 0
-    matched_signatures = []
-    
-    for i, count in enumerate(results):
-        if count > 0:
-            matches_found += 1
-            total_occurrences += count
-            matched_signatures.append((sig_names[i], count))
-    
-    # Display match results prominently
-    if matches_found == 0:
-        print("✅ CLEAN - No malware signatures detected!")
-        print("   File appears to be safe.")
-    else:
-        print("🚨 MALWARE DETECTED!")
-        print(f"   Found {matches_found} different signature(s)")
-        print(f"   Total occurrences: {total_occurrences}")
-        print("\n📋 Detected signatures:")
-        for sig_name, count in matched_signatures:
-            print(f"   🔴 {sig_name} - {count} occurrence{'s' if count > 1 else ''}")
-    
-    # ===== 10. PERFORMANCE SUMMARY =====
-    total_time = time.time() - total_start
-    
-    print(f"\n⏱️ PERFORMANCE BREAKDOWN:")
-    print("=" * 50)
-    print(f"   Signature loading: {load_time:.3f}s")
-    print(f"   File reading: {read_time:.3f}s") 
-    print(f"   Signature processing: {prep_time:.3f}s")
-    print(f"   Array creation: {array_time:.3f}s")
-    print(f"   GPU configuration: {config_time:.3f}s")
-    print(f"   GPU memory transfer: {transfer_time:.3f}s")
-    print(f"   🚀 GPU kernel execution: {kernel_time:.3f}s ⭐")
-    print(f"   Result retrieval: {retrieve_time:.3f}s")
-    print(f"   ⏱️ TOTAL SCAN TIME: {total_time:.3f}s")
-    
-    # Performance metrics
-    bytes_per_second = file_len / total_time if total_time > 0 else 0
-    signatures_per_second = len(valid_patterns) / total_time if total_time > 0 else 0
-    scan_rate = (file_len * len(valid_patterns)) / total_time if total_time > 0 else 0
-    efficiency = (kernel_time / total_time) * 100 if total_time > 0 else 0
-    
-    print(f"\n📊 PERFORMANCE METRICS:")
-    print("=" * 50)
-    print(f"   File throughput: {bytes_per_second:,.0f} bytes/sec")
-    print(f"   Signature rate: {signatures_per_second:,.0f} sigs/sec")
-    print(f"   Scan rate: {scan_rate:,.0f} comparisons/sec")
-    print(f"   GPU efficiency: {efficiency:.1f}% compute time")
+    return blocks_per_grid, threads_per_block
+
+def _nonempty(array):
+    """Zero-length arrays can't be sent to the device; pad to one unused byte."""
+    return array if len(array) else np.zeros(1, dtype=array.dtype)
+
+def prefilter_enabled(prepared, prefilter=None):
+    """Whether to use the q-gram prefilter (None = when it covers enough patterns to pay off)."""
+    if prefilter is not None:
+        return prefilter
+    return int(np.count_nonzero(prepared.kernel_gram_offsets >= 0)) >= PREFILTER_MIN_PATTERNS
+
+class DevicePrefilter:
+    """
+    A prepared set's QGramFilter index, uploaded once. launch() hashes a
+    window on the host and verifies only the surviving offsets on the device.
+    """
+
+    def __init__(self, prepared):
+        self.filter = prepared.qgram_filter
+        self.bucket_start = cuda.to_device(self.filter.bucket_start)
+        self.bucket_patterns = cuda.to_device(_nonempty(self.filter.bucket_patterns))
+        self.gram_offsets = cuda.to_device(_nonempty(self.filter.gram_offsets))
+        self.pattern_bits = cuda.to_device(_nonempty(prepared.pattern_bits))
+
+    def launch(self, window, data_gpu, bytes_gpu, masks_gpu, offsets_gpu, targets, results_gpu, min_end, stats=None,
+               stream=0):
+        """Prefilter window (already copied to data_gpu) and launch the verification kernel on stream; asynchronous."""
+        positions, hashes = self.filter.candidates(window, stats)
+        if not len(positions):
+            return
+        blocks_per_grid, threads_per_block = launch_config(len(positions))
+        scan_kernel_prefiltered[blocks_per_grid, threads_per_block, stream](
+            data_gpu, len(window), cuda.to_device(positions, stream=stream), cuda.to_device(hashes, stream=stream),
+            self.bucket_start, self.bucket_patterns, self.gram_offsets,
+            bytes_gpu, masks_gpu, offsets_gpu, self.pattern_bits, np.uint32(target_bits(targets)), results_gpu, min_end
+        )
+
+class WindowPipeline:
+    """
+    Double-buffered window transfers: window k is copied into device buffer
+    k % 2 and scanned on stream k % 2, so its copy overlaps the kernels still
+    running on window k - 1 (and the host work on both). A buffer is reused
+    only once its stream has finished with the window before.
+
+    The host memory of a window must stay untouched until the window two
+    later is started (prefetch_file_windows with PREFETCH_DEPTH + 4 buffers);
+    pinned buffers make the copies truly asynchronous.
+    """
+
+    def __init__(self, size, device_buffers=None):
+        self.streams = (cuda.stream(), cuda.stream())
+        self.buffers = device_buffers or tuple(cuda.device_array(max(size, 1), dtype=np.uint8) for _ in range(2))
+        self.reset()
+
+    def reset(self):
+        self.started = [None, None]  # perf_counter of the work in flight on each stream
+        self.count = 0
+        self.busy_time = 0.0
+
+    def start(self, window):
+        """(stream, device buffer) with window being copied into it; launch its kernels on that stream."""
+        slot = self.count % 2
+        self.count += 1
+        self.wait(slot)
+        stream, data_gpu = self.streams[slot], self.buffers[slot]
+        self.started[slot] = time.perf_counter()
+        data_gpu[:len(window)].copy_to_device(np.frombuffer(window, dtype=np.uint8), stream=stream)
+        return stream, data_gpu
+
+    def wait(self, slot):
+        if self.started[slot] is not None:
+            self.streams[slot].synchronize()
+            self.busy_time += time.perf_counter() - self.started[slot]
+            self.started[slot] = None
+
+    def finish(self):
+        """Wait for both streams; returns the seconds the device was busy (copy and kernels) per window."""
+        for slot in range(2):
+            self.wait(slot)
+        return self.busy_time
+
+def gpu_malware_scan(file_path, signatures_data, max_signatures=None, chunk_size=None, cache=None,
+                     prefilter=None, verbose=False, progress=None, cancel=None):
+    """
+    Complete GPU malware scanner - one function does it all!
     
-    print(f"\n📈 SCAN SUMMARY:")
-    print("=" * 50)
-    print(f"   File scanned: {file_path}")
-    print(f"   File size: {file_len:,} bytes")
-    print(f"   Signatures checked: {len(valid_patterns):,}")
-    print(f"   Scan time: {total_time:.3f}s")
-    print(f"   Status: {'🚨 INFECTED' if matches_found > 0 else '✅ CLEAN'}")
+    Args:
+        file_path: Path to file to scan
+        signatures_data: List of signature dictionaries, compiled SignatureDB,
+                         PreparedSignatures (from prepare_signatures) OR path to JSON file
+        max_signatures: Limit number of signatures (optional)
+        chunk_size: Stream the file in overlapping chunks of this size
+                    (default: only for files above STREAM_THRESHOLD)
+        cache: ResultCache; an unchanged file is answered from it without scanning
+        prefilter: Use the 4-gram prefilter (default: when it covers enough patterns)
+        verbose: Print the verdict and the per-phase time breakdown
+        progress: Called with a ScanProgress after each scanned window (see progress.py)
+        cancel: threading.Event; once set, the scan stops with ScanCancelled
+
+    Phase times are always in result['phase_times']; with metrics enabled
+    they also go to METRICS (scan_phase_seconds{backend="gpu"}).
+    """
     
-    if matches_found > 0:
-        print(f"   Threats found: {matches_found}")
-        print(f"   Total detections: {total_occurrences}")
+    if cache is not None:
+        if isinstance(signatures_data, PreparedSignatures):
+            fingerprint = signatures_data.fingerprint
+        else:
+            fingerprint = signature_fingerprint(signatures_data, max_signatures)
+        result = cached_scan(cache, file_path, fingerprint,
+                             lambda path: gpu_malware_scan(path, signatures_data, max_signatures, chunk_size,
+                                                           prefilter=prefilter, verbose=verbose,
+                                                           progress=progress, cancel=cancel),
+                             progress)
+        if result and result.get('cached'):
+            if verbose:
+                print(f"⚡ Cached verdict for {file_path}: {result['status']}")
+        return result
+    
+    trace = METRICS.trace('gpu')
     
-    # Return results for programmatic use
-    return {
-    'file_path': file_path,
-    'file_size': file_len,
-    'signatures_checked': len(valid_patterns),
-    'matches_found': matches_found,
-    'total_occurrences': total_occurrences,
-    'matched_signatures': matched_signatures,  # List of (name, count) tuples
-    'scan_time': total_time,
-    'kernel_time': kernel_time,
-    'is_infected': matches_found > 0,
-    'status': 'INFECTED' if matches_found > 0 else 'CLEAN',
-    'threat_names': [sig_name for sig_name, count in matched_signatures]  # Just names for UI
-    }
+    # ===== 1. LOAD SIGNATURES =====
+    with trace.phase('load'):
+        # Handle prepared set, list, compiled DB and file path input
+        prepared = None
+        if isinstance(signatures_data, PreparedSignatures):
+            prepared = signatures_data
+            all_signatures = prepared.names
+        elif isinstance(signatures_data, (list, SignatureDB)):
+            all_signatures = signatures_data
+        else:
+            # Assume it's a file path (JSON array or JSON Lines)
+            all_signatures = list(stream_signatures(signatures_data))
+    
+    # The mapped target is closed however the scan ends (cancelled, no signatures, ...)
+    with ExitStack() as files:
+        # ===== 2. READ FILE =====
+        with trace.phase('read'):
+            file_len = os.path.getsize(file_path)
+            if chunk_size is None and file_len > STREAM_THRESHOLD:
+                chunk_size = STREAM_CHUNK_SIZE
+            elif chunk_size is None and file_len > PROGRESS_CHUNK_SIZE and (progress is not None or cancel is not None):
+                chunk_size = PROGRESS_CHUNK_SIZE  # windows to report progress (and cancel) between
+            tracker = reporter(file_path, file_len, chunk_size, progress, cancel)
+            if tracker:
+                tracker.start()
+        
+            if chunk_size:
+                file_bytes = None  # Read window by window during the scan
+                with open(file_path, "rb") as f:
+                    targets = classify(f.read(HEADER_SIZE))
+            else:
+                # Mapped, not read: the transfer and the host matcher read the page cache directly
+                file_bytes = files.enter_context(map_file(file_path, sequential=True))
+                file_len = len(file_bytes)
+                targets = classify(file_bytes)
+    
+        # ===== 3. PROCESS SIGNATURES =====
+        with trace.phase('prepare'):
+            # Hex decoding, masks and length filtering run as bulk array work over
+            # the whole set; an already prepared set is used as is
+            if prepared is None:
+                prepared = prepare_signatures(all_signatures, MAX_PATTERN_LENGTH, max_signatures)
+        
+            sig_names = prepared.names
+            kernel_index = prepared.kernel_index
+            host_index = prepared.host_index
+            kernel_count = prepared.kernel_count
+        
+            # Only signatures for this file's target types (plus type 0) are evaluated
+            kernel_ranges = prepared.kernel_ranges(targets)
+            use_prefilter = prefilter_enabled(prepared, prefilter)
+            if use_prefilter:
+                # Patterns with a literal 4-gram are verified only at prefilter survivors
+                kernel_ranges = prepared.brute_ranges(targets)
+            host_matcher = prepared.host_for(targets)
+            signatures_checked = prepared.signatures_evaluated(targets)
+    
+        if not prepared.signatures_checked:
+            print("❌ No valid signatures found!")
+            return
+    
+        # ===== 4. GPU CONFIGURATION =====
+        with trace.phase('config'):
+            # Packed layout: byte stream + mask stream + offsets, built during preparation
+            pattern_bytes = prepared.pattern_bytes
+            pattern_masks = prepared.pattern_masks
+            pattern_offsets = prepared.pattern_offsets
+        
+            # Stream windows overlap by the longest match minus one byte
+            overlap = prepared.max_span - 1
+            scan_len = min(file_len, chunk_size + overlap) if chunk_size else file_len
+            blocks_per_grid, threads_per_block = launch_config(scan_len)
+    
+        # ===== 5. GPU MEMORY TRANSFER =====
+        with trace.phase('transfer'):
+            # Transfer data to GPU (streaming alternates between two window-sized buffers)
+            if chunk_size:
+                pipeline = WindowPipeline(scan_len)
+            else:
+                file_data_gpu = cuda.to_device(_nonempty(np.frombuffer(file_bytes, dtype=np.uint8)))
+            bytes_gpu = cuda.to_device(_nonempty(pattern_bytes))
+            masks_gpu = cuda.to_device(_nonempty(pattern_masks))
+            offsets_gpu = cuda.to_device(pattern_offsets)
+            results_gpu = cuda.to_device(np.zeros(kernel_count, dtype=np.int32))
+            device_filter = DevicePrefilter(prepared) if use_prefilter else None
+            filter_stats = device_filter.filter.new_stats() if use_prefilter else None
+    
+        # ===== 6. GPU KERNEL EXECUTION =====
+        with trace.phase('kernel'):
+            host_state = host_matcher.new_stream() if host_matcher else None
+            if chunk_size:
+                # Each window: read ahead on a prefetch thread, copied into a device
+                # buffer on its own stream, counted (matches ending in the new bytes)
+                # while the next one is read and copied, and run through the host
+                # matcher meanwhile
+                buffers = [bytearray(scan_len) for _ in range(PREFETCH_DEPTH + 4)]
+                windows = track_windows(prefetch_file_windows(file_path, overlap, chunk_size, buffers=buffers), tracker)
+                for base, new_start, window in windows:
+                    window_len = len(window)
+                    stream, file_data_gpu = pipeline.start(window)
+                    for first, last in kernel_ranges:
+                        scan_kernel_optimized[blocks_per_grid, threads_per_block, stream](
+                            file_data_gpu, window_len, bytes_gpu, masks_gpu, offsets_gpu[first:last + 1],
+                            results_gpu[first:last], new_start
+                        )
+                    if device_filter:
+                        device_filter.launch(window, file_data_gpu, bytes_gpu, masks_gpu, offsets_gpu, targets,
+                                             results_gpu, new_start, filter_stats, stream)
+                    if host_matcher:
+                        host_matcher.scan_window(window, base, new_start, host_state)
+                pipeline.finish()
+            else:
+                # One launch per target-type range of the pattern table
+                for first, last in kernel_ranges:
+                    scan_kernel_optimized[blocks_per_grid, threads_per_block](
+                        file_data_gpu, file_len, bytes_gpu, masks_gpu, offsets_gpu[first:last + 1],
+                        results_gpu[first:last], 0
+                    )
+                if device_filter:
+                    device_filter.launch(file_bytes, file_data_gpu, bytes_gpu, masks_gpu, offsets_gpu, targets,
+                                         results_gpu, 0, filter_stats)
+                cuda.synchronize()
+    
+        # ===== 7. RETRIEVE RESULTS =====
+        with trace.phase('retrieve'):
+            kernel_results = results_gpu.copy_to_host()
+        
+            # Counts per signature, in input order
+            results = np.zeros(len(sig_names), dtype=np.int64)
+            results[kernel_index] = kernel_results
+    
+        # ===== 8. HOST MATCHING =====
+        # Variable-length signatures: anchor search + verification on the host
+        if host_matcher:
+            with trace.phase('host'):
+                if not chunk_size:
+                    host_matcher.scan_window(file_bytes, 0, 0, host_state)
+                    host_matcher.scan_offsets(file_bytes, host_state.counts)
+                else:
+                    with map_file(file_path) as mapped:
+                        host_matcher.scan_offsets(mapped, host_state.counts)
+                host_counts = host_state.counts
+                if host_index is None:
+                    results += host_counts
+                else:
+                    results[host_index] += host_counts
+    
+        # ===== 9. RESULTS =====
+        matched_signatures = matched_signatures_from_counts(results, sig_names)
+        total_time = trace.finish(file_len, signatures_checked, len(matched_signatures))
+        result = build_result(file_path, file_len, signatures_checked, matched_signatures, total_time,
+                              trace.seconds('kernel'), targets, filter_stats, phases=trace.as_dict())
+        if tracker:
+            tracker.done()
+        if verbose:
+            print_scan_report(result)
+        return result
+
+def print_scan_report(result):
+    """Human-readable verdict and phase breakdown of a result dict."""
+    print(f"{'🚨 INFECTED' if result['is_infected'] else '✅ CLEAN'}: {result['file_path']} "
+          f"({result['file_size']:,} bytes, {', '.join(result['file_types'])}, "
+          f"{result['signatures_checked']:,} signatures, {result['backend']})")
+    for sig_name, count in result['matched_signatures']:
+        print(f"   🔴 {sig_name} - {count} occurrence{'s' if count > 1 else ''}")
+    phases = result.get('phase_times', {})
+    breakdown = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in phases.items())
+    print(f"   ⏱️ {result['scan_time']:.3f}s" + (f" ({breakdown})" if breakdown else ""))
+    if 'prefilter' in result:
+        print(f"   Prefilter: {result['prefilter']['hit_rate']:.2%} of offsets survived, "
+              f"{result['prefilter']['reduction']:.2%} of pattern checks skipped")
 
 # Simple usage examples
 if __name__ == "__main__":
@@ -286,7 +455,7 @@ if __name__ == "__main__":
         {"name": "EICAR-Test-File", "pattern": "58354f21503f24...."},
         # ... more signatures
     ]
-    result = gpu_malware_scan("test_file.exe", signatures_list)
+    result = gpu_malware_scan("test_file.exe", signatures_list, verbose=True)
     
     # Example 2: Using a JSON file
     # result = gpu_malware_scan("test_file.exe", "signatures.json")
@@ -0,0 +1,198 @@
+"""
+4-gram hash prefilter for fixed-length kernel patterns.
+
+Most file offsets can't start any match. Every pattern with four
+consecutive literal bytes (its first literal q-gram) is indexed by the
+hash of that gram: a bitset says which hashes occur at all, and a CSR
+table lists the patterns per hash. A buffer is hashed at every offset
+with array ops, and only offsets whose hash is in the bitset are sent to
+exact verification, each against the few patterns in its bucket instead
+of the whole set. Patterns without a literal 4-gram (short, or
+wildcards every few bytes) keep the brute-force kernel.
+"""
+
+import numpy as np
+
+Q = 4
+HASH_BITS = 20
+_HASH_MULTIPLIER = np.uint32(0x9E3779B1)
+_BLOCK = 1 << 22  # offsets hashed per step, bounds the temporary arrays
+_VERIFY_BATCH = 1 << 16  # candidates verified per step on the host
+
+
+def literal_gram_offsets(values, masks, offsets):
+    """
+    Offset of the first run of Q literal bytes inside each packed pattern
+    (pattern s is values[offsets[s]:offsets[s + 1]]); -1 when there is none.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    gram_offsets = np.full(len(offsets) - 1, -1, dtype=np.int64)
+    total = len(masks)
+    if total < Q:
+        return gram_offsets
+
+    literal = np.asarray(masks) == 0xFF
+    run = literal[:total - Q + 1].copy()
+    for j in range(1, Q):
+        run &= literal[j:total - Q + 1 + j]
+    lengths = np.diff(offsets)
+    owner = np.repeat(np.arange(len(lengths)), lengths)[:total - Q + 1]
+    starts = np.flatnonzero(run & (np.arange(total - Q + 1) + Q <= offsets[owner + 1]))
+
+    # First run per pattern
+    patterns, first = np.unique(owner[starts], return_index=True)
+    gram_offsets[patterns] = starts[first] - offsets[patterns]
+    return gram_offsets
+
+
+def gram_hash(grams):
+    """Bucket of little-endian uint32 4-grams (multiplicative hash, HASH_BITS wide)."""
+    return (grams * _HASH_MULTIPLIER) >> np.uint32(32 - HASH_BITS)
+
+
+def buffer_grams(data):
+    """uint32 4-gram at every offset of a uint8 array (len(data) - 3 values)."""
+    count = len(data) - Q + 1
+    grams = data[:count].astype(np.uint32)
+    for j in range(1, Q):
+        grams |= data[j:count + j].astype(np.uint32) << np.uint32(8 * j)
+    return grams
+
+
+class FilterStats:
+    """Prefilter counters: how many offsets survived and how many pattern checks that cost."""
+
+    def __init__(self, filtered_patterns=0):
+        self.filtered_patterns = filtered_patterns
+        self.positions = 0        # offsets hashed
+        self.candidates = 0       # offsets whose hash is in the bitset
+        self.verifications = 0    # (offset, pattern) pairs sent to exact matching
+
+    def add(self, other):
+        self.positions += other.positions
+        self.candidates += other.candidates
+        self.verifications += other.verifications
+
+    @property
+    def hit_rate(self):
+        return self.candidates / self.positions if self.positions else 0.0
+
+    @property
+    def brute_force_checks(self):
+        """(offset, pattern) pairs the brute-force kernel would have tried for the same patterns."""
+        return self.positions * self.filtered_patterns
+
+    @property
+    def reduction(self):
+        """Fraction of brute-force pattern checks removed by the filter."""
+        brute = self.brute_force_checks
+        return 1.0 - self.verifications / brute if brute else 0.0
+
+    def as_dict(self):
+        return {
+            'filtered_patterns': self.filtered_patterns,
+            'positions': self.positions,
+            'candidates': self.candidates,
+            'hit_rate': self.hit_rate,
+            'verifications': self.verifications,
+            'brute_force_checks': self.brute_force_checks,
+            'reduction': self.reduction,
+        }
+
+
+class QGramFilter:
+    """
+    Prefilter index over packed patterns.
+
+        gram_offsets    offset of each pattern's first literal 4-gram (-1 = not filtered)
+        bitset          one bit per hash value that some pattern's gram has
+        bucket_start / bucket_patterns
+                        CSR: patterns per hash value
+    """
+
+    def __init__(self, values, masks, offsets, gram_offsets):
+        offsets = np.asarray(offsets, dtype=np.int64)
+        self.values = values
+        self.masks = masks
+        self.offsets = offsets
+        self.gram_offsets = np.asarray(gram_offsets, dtype=np.int32)
+        self.filtered = np.flatnonzero(self.gram_offsets >= 0)
+
+        gram_starts = offsets[self.filtered] + self.gram_offsets[self.filtered]
+        gram_bytes = np.asarray(values)[gram_starts[:, None] + np.arange(Q)].astype(np.uint32)
+        shifts = (8 * np.arange(Q)).astype(np.uint32)
+        hashes = gram_hash(np.bitwise_or.reduce(gram_bytes << shifts, axis=1).astype(np.uint32))
+        order = np.argsort(hashes, kind="stable")
+        self.bucket_patterns = self.filtered[order].astype(np.int32)
+        self.bucket_start = np.searchsorted(hashes[order], np.arange((1 << HASH_BITS) + 1)).astype(np.int32)
+        self.bitset = np.zeros((1 << HASH_BITS) // 8, dtype=np.uint8)
+        np.bitwise_or.at(self.bitset, hashes >> 3, (1 << (hashes & 7)).astype(np.uint8))
+        self.stats = FilterStats(len(self.filtered))  # cumulative over every candidates() call
+
+    def __len__(self):
+        return len(self.filtered)
+
+    def new_stats(self):
+        return FilterStats(len(self.filtered))
+
+    def candidates(self, data, stats=None):
+        """
+        Offsets of data (any bytes-like object) whose 4-gram hash is in the
+        bitset, with those hashes: (int64 offsets, uint32 hashes).
+        """
+        data = np.frombuffer(data, dtype=np.uint8)
+        positions = []
+        hashes = []
+        for first in range(0, max(len(data) - Q + 1, 0), _BLOCK):
+            block_hashes = gram_hash(buffer_grams(data[first:first + _BLOCK + Q - 1]))
+            hit = (self.bitset[block_hashes >> 3] >> (block_hashes & 7).astype(np.uint8)) & 1
+            survivors = np.flatnonzero(hit)
+            positions.append(survivors + first)
+            hashes.append(block_hashes[survivors])
+        positions = np.concatenate(positions) if positions else np.empty(0, dtype=np.int64)
+        hashes = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint32)
+
+        call = FilterStats(len(self.filtered))
+        call.positions = max(len(data) - Q + 1, 0)
+        call.candidates = len(positions)
+        call.verifications = int((self.bucket_start[hashes + 1] - self.bucket_start[hashes]).sum())
+        self.stats.add(call)
+        if stats is not None:
+            stats.add(call)
+        return positions, hashes
+
+    def count(self, data, min_end=0, active=None, stats=None):
+        """
+        Exact match counts of the filtered patterns (int64, one per pattern)
+        on the host: the same verification the prefiltered kernel does.
+        Matches ending at or before min_end are skipped; ``active`` (bool per
+        pattern) limits which patterns are checked.
+        """
+        buf = np.frombuffer(data, dtype=np.uint8)
+        counts = np.zeros(len(self.offsets) - 1, dtype=np.int64)
+        positions, hashes = self.candidates(buf, stats)
+        for first in range(0, len(positions), _VERIFY_BATCH):
+            self._verify(buf, positions[first:first + _VERIFY_BATCH], hashes[first:first + _VERIFY_BATCH],
+                         min_end, active, counts)
+        return counts
+
+    def _verify(self, buf, positions, hashes, min_end, active, counts):
+        # One pair per (candidate offset, pattern in its bucket)
+        first = self.bucket_start[hashes].astype(np.int64)
+        sizes = self.bucket_start[hashes + 1] - first
+        pair_pattern = self.bucket_patterns[np.repeat(first - np.cumsum(sizes) + sizes, sizes)
+                                            + np.arange(sizes.sum(), dtype=np.int64)]
+        pair_start = np.repeat(positions, sizes) - self.gram_offsets[pair_pattern]
+        lengths = self.offsets[pair_pattern + 1] - self.offsets[pair_pattern]
+        ok = (pair_start >= 0) & (pair_start + lengths <= len(buf)) & (pair_start + lengths > min_end)
+        if active is not None:
+            ok &= np.asarray(active, dtype=np.bool_)[pair_pattern]
+        pair_pattern, pair_start, lengths = pair_pattern[ok], pair_start[ok], lengths[ok]
+
+        # Compare every byte of every pair at once: mismatching pairs drop out
+        cell_pair = np.repeat(np.arange(len(pair_pattern)), lengths)
+        cell_step = np.arange(lengths.sum(), dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        src = self.offsets[pair_pattern][cell_pair] + cell_step
+        mismatch = (buf[pair_start[cell_pair] + cell_step] & self.masks[src]) != self.values[src]
+        bad = np.bincount(cell_pair[mismatch], minlength=len(pair_pattern)) > 0
+        np.add.at(counts, pair_pattern[~bad], 1)
@@ -0,0 +1,950 @@
+"""
+Long-lived scanner sessions.
+
+gpu_malware_scan prepares and uploads the whole signature set on every
+call. A Scanner does that once: the packed patterns stay resident on the
+device and each scan(path) / scan_bytes(buf) only transfers the target
+data. NumbaScanner runs the same patterns on every CPU core instead, and
+CPUScanner offers the same interface on top of the host matcher for
+machines without CUDA. AutoScanner (the default of create_scanner) picks
+one of them per scan from the input size, the signature count and
+measured costs, so small files never pay for a CUDA context. Given a ResultCache, scan(path) answers files
+that haven't changed since an earlier scan without reading them.
+scan_many(paths) scans a list of files with the next ones read on a
+prefetch thread meanwhile, and streamed files are read ahead window by
+window the same way, so I/O overlaps with matching. Files are otherwise
+memory-mapped and scanned in place, and scan_bytes takes any buffer
+(bytes, memoryview, mmap) without copying it.
+scan and scan_bytes report ScanProgress events to a progress callback
+and stop with ScanCancelled once a cancel event is set (see progress.py).
+
+A scanner loaded from a signature file picks up a new generation of it
+(see sigdb.update_signature_db) with refresh(): the new set is prepared
+next to the live one and swapped in at once, between scans.
+
+    scanner = create_scanner(load_signature_db("signatures.db"))
+    result = scanner.scan("sample.exe")   # same dict as gpu_malware_scan
+    result["backend"]                     # "gpu", "numba" or "cpu"
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+import numpy as np
+from numba import cuda
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'Code_to_get_signature'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'CPU'))
+
+from file_utils import (
+    prefetch, prefetch_file_windows, iter_buffer_windows, iter_mapped_windows, map_file,
+    STREAM_THRESHOLD, HOST_STREAM_THRESHOLD, STREAM_CHUNK_SIZE, PREFETCH_DEPTH,
+)
+from file_types import classify, parse_target_type, target_bits, HEADER_SIZE
+from metrics import METRICS
+from parallel_scan import scan_patterns_parallel, chunk_count
+from pattern_matcher import SignatureMatcher
+from progress import PROGRESS_CHUNK_SIZE, reporter, track_windows
+from result_cache import signature_fingerprint
+from sigdb import SignatureDB
+from signature_loader import PreparedSignatures, prepare_signatures, load_signatures, load_signature_db
+from gpu_scanner import (
+    scan_kernel_optimized, scan_kernel_batched, launch_config, build_result, matched_signatures_from_counts,
+    cached_scan, prefilter_enabled, DevicePrefilter, WindowPipeline, MAX_PATTERN_LENGTH, _nonempty,
+)
+
+# scan_many reads files up to this size ahead, whole, on a prefetch thread
+PREFETCH_FILE_LIMIT = 16 * 1024 * 1024
+
+# Batching: files up to SMALL_FILE_LIMIT are packed into one buffer per launch
+SMALL_FILE_LIMIT = 1024 * 1024
+BATCH_MAX_BYTES = 64 * 1024 * 1024
+BATCH_MAX_TABLE = 64 * 1024 * 1024  # result cells (files x kernel signatures) per launch
+
+
+class Scanner:
+    """GPU scanner with device-resident signatures."""
+
+    backend = "gpu"
+
+    def __init__(self, signatures, max_signatures=None, chunk_size=None, cache=None, prefilter=None):
+        """
+        Args:
+            signatures: list of signature dicts, compiled SignatureDB, PreparedSignatures
+                        or a path to a .db / .json / .jsonl signature file
+            max_signatures: Limit number of signatures (optional)
+            chunk_size: Stream inputs in overlapping chunks of this size
+                        (default: only for inputs above STREAM_THRESHOLD)
+            cache: ResultCache for scan(path) verdicts (optional)
+            prefilter: Verify patterns with a literal 4-gram only where the q-gram
+                       prefilter lets them (default: when enough patterns have one)
+        """
+        self.chunk_size = chunk_size
+        self.max_signatures = max_signatures
+        self.cache = cache
+        self.prefilter = prefilter
+        self._data_gpu = None
+        self._pipeline = None       # WindowPipeline (two streams and device buffers) of streamed scans
+        self._read_buffers = None   # pinned host buffers the prefetch thread reads windows into
+        self._filter_stats = None  # FilterStats of the last scan
+        self._lock = threading.RLock()  # held by every scan; a reload swaps in between scans
+        self._install(self._build(signatures))
+
+    def _build(self, signatures):
+        """Prepare and upload one signature generation (returned as attributes, not installed yet)."""
+        generation = self._prepare_generation(signatures)
+        prepared = generation["prepared"]
+
+        # Uploaded once, reused by every scan
+        zero_results = np.zeros(max(prepared.kernel_count, 1), dtype=np.int32)
+        generation.update({
+            "_bytes_gpu": cuda.to_device(_nonempty(prepared.pattern_bytes)),
+            "_masks_gpu": cuda.to_device(_nonempty(prepared.pattern_masks)),
+            "_offsets_gpu": cuda.to_device(prepared.pattern_offsets),
+            "_bits_gpu": cuda.to_device(_nonempty(prepared.pattern_bits)),
+            "_zero_results": zero_results,
+            "_results_gpu": cuda.to_device(zero_results),
+            "_prefilter": DevicePrefilter(prepared) if prefilter_enabled(prepared, self.prefilter) else None,
+        })
+        return generation
+
+    def _prepare_generation(self, signatures):
+        source = _source_identity(signatures)
+        signatures = _load(signatures)
+        if isinstance(signatures, PreparedSignatures):
+            prepared = signatures
+        else:
+            prepared = prepare_signatures(signatures, MAX_PATTERN_LENGTH, self.max_signatures)
+        fingerprint = None
+        if self.cache is not None:
+            # Same fingerprint as CPUScanner / gpu_malware_scan for the same source
+            fingerprint = (prepared.fingerprint if signatures is prepared
+                           else signature_fingerprint(signatures, self.max_signatures))
+        return {
+            "prepared": prepared,
+            "fingerprint": fingerprint,
+            "overlap": prepared.max_span - 1,
+            "_source": source,
+        }
+
+    def _install(self, generation):
+        with self._lock:
+            self.__dict__.update(generation)
+
+    def reload(self, signatures=None):
+        """
+        Load a new signature set (default: the source file again) and swap
+        it in atomically. Preparation happens beside the live set; only the
+        swap waits for a scan in progress.
+        """
+        if signatures is None:
+            if self._source is None:
+                raise ValueError("scanner was not loaded from a signature file")
+            signatures = self._source[0]
+        self._install(self._build(signatures))
+
+    def refresh(self):
+        """Reload if the signature file was replaced since it was loaded; True if it was."""
+        if self._source is None:
+            return False
+        path, identity = self._source
+        try:
+            if _file_identity(path) == identity:
+                return False
+        except OSError:
+            return False  # mid-replace or removed: keep the live generation
+        self.reload(path)
+        return True
+
+    @property
+    def names(self):
+        return self.prepared.names
+
+    @property
+    def signatures_checked(self):
+        return self.prepared.signatures_checked
+
+    def signatures_evaluated(self, targets):
+        """Signatures applied to a file of these target types."""
+        return self.prepared.signatures_evaluated(targets)
+
+    def scan(self, path, progress=None, cancel=None):
+        """
+        Scan a file, memory-mapped rather than read; files above
+        STREAM_THRESHOLD (HOST_STREAM_THRESHOLD for the host sessions) are
+        streamed in windows.
+        progress gets a ScanProgress after every window; once cancel (a
+        threading.Event) is set, the scan stops with ScanCancelled.
+        """
+        return self._scan_one(path, None, progress, cancel)
+
+    def scan_many(self, paths, progress=None, cancel=None, depth=PREFETCH_DEPTH):
+        """
+        Scan files in order, yielding (path, result dict); the next depth
+        files are read on a prefetch thread while one is scanned. A file
+        that can't be read yields (path, OSError). progress and cancel as in scan.
+        """
+        return _scan_many(self, paths, progress, cancel, depth)
+
+    def _scan_one(self, path, data, progress=None, cancel=None):
+        """scan() of a file whose contents may already have been read (data, or None)."""
+        with self._lock:
+            if self.cache is not None:
+                return cached_scan(self.cache, path, self.fingerprint,
+                                   lambda p: self._scan_path(p, progress, cancel, data), progress)
+            return self._scan_path(path, progress, cancel, data)
+
+    def _scan_path(self, path, progress=None, cancel=None, data=None):
+        trace = METRICS.trace(self.backend)
+        file_size = os.path.getsize(path) if data is None else len(data)
+        chunk_size = self._chunk_size_for(file_size, progress is not None or cancel is not None)
+        tracker = reporter(path, file_size, chunk_size, progress, cancel)
+        if tracker:
+            tracker.start()
+        if chunk_size:
+            with map_file(path, sequential=True) as mapped:
+                targets = classify(mapped)
+                windows = track_windows(self._file_windows(path, mapped, chunk_size), tracker)
+                counts, kernel_time = self._scan_windows(windows, chunk_size, mapped, targets)
+        else:
+            # Scanned in place from the page cache unless scan_many already read it
+            with nullcontext(data) if data is not None else map_file(path, sequential=True) as data:
+                targets = classify(data)
+                windows = track_windows([(0, 0, data)], tracker)
+                counts, kernel_time = self._scan_windows(windows, file_size, data, targets)
+        result = self._result(path, file_size, counts, trace, kernel_time, targets)
+        if tracker:
+            tracker.done()
+        return result
+
+    def scan_bytes(self, buf, name="<buffer>", progress=None, cancel=None):
+        """
+        Scan any buffer-protocol object (bytes, memoryview, mmap, ...) in
+        place, without copying it; progress and cancel as in scan.
+        """
+        with self._lock:
+            trace = METRICS.trace(self.backend)
+            size = memoryview(buf).nbytes
+            chunk_size = self._chunk_size_for(size, progress is not None or cancel is not None) or max(size, 1)
+            tracker = reporter(name, size, chunk_size, progress, cancel)
+            if tracker:
+                tracker.start()
+            targets = classify(buf)
+            windows = track_windows(iter_buffer_windows(buf, self.overlap, chunk_size), tracker)
+            counts, kernel_time = self._scan_windows(windows, chunk_size, buf, targets)
+            result = self._result(name, size, counts, trace, kernel_time, targets)
+            if tracker:
+                tracker.done()
+            return result
+
+    def counts(self, buf):
+        """Raw per-signature match counts for a buffer (no result dict)."""
+        return self._counts(buf)
+
+    def _counts(self, buf, release=False):
+        """counts(); release only for a map this session opened itself (see iter_mapped_windows)."""
+        with self._lock:
+            size = memoryview(buf).nbytes
+            chunk_size = self._chunk_size_for(size) or max(size, 1)
+            windows = iter_mapped_windows(buf, self.overlap, chunk_size, release)
+            return self._scan_windows(windows, chunk_size, buf, classify(buf))[0]
+
+    def scan_batch(self, paths):
+        """
+        Scan many files; returns an int64 table of shape (len(paths), len(names))
+        with the match count of every signature in every file.
+
+        Small files are read into one buffer and scanned together in a
+        single launch; larger ones go through counts() on their own.
+        """
+        with self._lock:
+            table = np.zeros((len(paths), len(self.names)), dtype=np.int64)
+            batch = []
+            batch_bytes = 0
+            for row, path in enumerate(paths):
+                if os.path.getsize(path) > SMALL_FILE_LIMIT:
+                    with map_file(path, sequential=True) as mapped:
+                        table[row] = self._counts(mapped, release=True)
+                    continue
+                with open(path, "rb") as f:
+                    batch.append((row, f.read()))
+                batch_bytes += len(batch[-1][1])
+                if batch_bytes >= BATCH_MAX_BYTES or len(batch) >= self._batch_file_limit():
+                    self._fill_batch(table, batch)
+                    batch = []
+                    batch_bytes = 0
+            if batch:
+                self._fill_batch(table, batch)
+            return table
+
+    def scan_batch_bytes(self, buffers):
+        """scan_batch for in-memory buffers."""
+        with self._lock:
+            table = np.zeros((len(buffers), len(self.names)), dtype=np.int64)
+            limit = self._batch_file_limit()
+            for first in range(0, len(buffers), limit):
+                self._fill_batch(table, list(enumerate(buffers[first:first + limit], first)))
+            return table
+
+    def _batch_file_limit(self):
+        return max(1, BATCH_MAX_TABLE // max(self.prepared.kernel_count, 1))
+
+    def _fill_batch(self, table, batch):
+        """Scan [(row, data), ...] in one kernel launch and write the rows of table."""
+        prepared = self.prepared
+        rows = [row for row, _ in batch]
+        lengths = [memoryview(data).nbytes for _, data in batch]
+        file_offsets = np.zeros(len(batch) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=file_offsets[1:])
+        total = int(file_offsets[-1])
+        targets = [classify(data) for _, data in batch]
+
+        if prepared.kernel_count and total:
+            packed = np.frombuffer(b"".join(data for _, data in batch), dtype=np.uint8)
+            data_gpu = self._device_buffer(total)
+            data_gpu[:total].copy_to_device(packed)
+            results_gpu = cuda.to_device(np.zeros((len(batch), prepared.kernel_count), dtype=np.int32))
+            file_targets = np.array([target_bits(t) for t in targets], dtype=np.uint32)
+            blocks_per_grid, threads_per_block = launch_config(total)
+            scan_kernel_batched[blocks_per_grid, threads_per_block](
+                data_gpu, total, cuda.to_device(file_offsets), cuda.to_device(file_targets),
+                self._bytes_gpu, self._masks_gpu, self._offsets_gpu, self._bits_gpu, results_gpu
+            )
+
+        # Host-matched signatures, file by file, while the kernel runs
+        if prepared.host_matcher:
+            host_columns = prepared.host_index
+            for (row, data), file_targets in zip(batch, targets):
+                host_counts = prepared.host_for(file_targets).scan(data)
+                if host_columns is None:
+                    table[row] += host_counts
+                else:
+                    table[row, host_columns] += host_counts
+
+        if prepared.kernel_count and total:
+            cuda.synchronize()
+            table[np.ix_(rows, prepared.kernel_index)] += results_gpu.copy_to_host()
+
+    def _chunk_size_for(self, size, tracked=False):
+        """Window size to stream an input in (None: in one piece); a tracked scan gets progress-sized windows."""
+        if self.chunk_size:
+            return self.chunk_size
+        if size > STREAM_THRESHOLD:
+            return STREAM_CHUNK_SIZE
+        return PROGRESS_CHUNK_SIZE if tracked and size > PROGRESS_CHUNK_SIZE else None
+
+    def _device_buffer(self, size):
+        """Reusable device input buffer; grows (doubling) when a larger input shows up."""
+        if self._data_gpu is None or self._data_gpu.size < size:
+            capacity = max(size, 2 * (self._data_gpu.size if self._data_gpu is not None else 0), 4096)
+            self._data_gpu = cuda.device_array(capacity, dtype=np.uint8)
+        return self._data_gpu
+
+    def _window_pipeline(self, size):
+        """Reusable WindowPipeline for windows up to size bytes; grows (doubling) like _device_buffer."""
+        pipeline = self._pipeline
+        if pipeline is None or pipeline.buffers[0].size < size:
+            capacity = max(size, 2 * (pipeline.buffers[0].size if pipeline is not None else 0), 4096)
+            self._pipeline = pipeline = WindowPipeline(capacity)
+        pipeline.reset()
+        return pipeline
+
+    def _file_windows(self, path, mapped, chunk_size):
+        """
+        Windows of a streamed file. The device copies need host memory, so
+        they are read ahead into pinned buffers (prefetch_file_windows), kept
+        between scans: enough for the read-ahead plus the two windows whose
+        asynchronous copies may still be reading from theirs.
+        """
+        size = chunk_size + self.overlap
+        if self._read_buffers is None or len(self._read_buffers[0]) < size:
+            self._read_buffers = [cuda.pinned_array(size, dtype=np.uint8) for _ in range(PREFETCH_DEPTH + 4)]
+        return prefetch_file_windows(path, self.overlap, chunk_size, buffers=self._read_buffers)
+
+    def _scan_windows(self, windows, chunk_size, source, targets):
+        """
+        Scan stream windows with the signatures for these target types;
+        ``source`` is the whole input, for offset-bound signatures. Windows
+        alternate between two streams (WindowPipeline), so one is copied
+        while the other is scanned.
+        """
+        prepared = self.prepared
+        device_filter = self._prefilter
+        if device_filter:
+            kernel_ranges = prepared.brute_ranges(targets)
+            self._filter_stats = device_filter.filter.new_stats()
+        else:
+            kernel_ranges = prepared.kernel_ranges(targets)
+            self._filter_stats = None
+        on_device = bool(kernel_ranges) or device_filter is not None
+        host_matcher = prepared.host_for(targets)
+        host_state = host_matcher.new_stream() if host_matcher else None
+
+        self._results_gpu.copy_to_device(self._zero_results)
+        pipeline = self._window_pipeline(chunk_size + self.overlap)
+        blocks_per_grid, threads_per_block = launch_config(chunk_size + self.overlap)
+
+        for base, new_start, window in windows:
+            window_len = len(window)
+            if on_device and window_len:
+                stream, data_gpu = pipeline.start(window)
+                for first, last in kernel_ranges:
+                    scan_kernel_optimized[blocks_per_grid, threads_per_block, stream](
+                        data_gpu, window_len, self._bytes_gpu, self._masks_gpu,
+                        self._offsets_gpu[first:last + 1], self._results_gpu[first:last], new_start
+                    )
+                # Hashing the window on the host overlaps with the brute-force launches
+                if device_filter:
+                    device_filter.launch(window, data_gpu, self._bytes_gpu, self._masks_gpu, self._offsets_gpu,
+                                         targets, self._results_gpu, new_start, self._filter_stats, stream)
+            # The host matcher overlaps with the kernels on this window (and the copy of the next)
+            if host_matcher:
+                host_matcher.scan_window(window, base, new_start, host_state)
+        kernel_time = pipeline.finish()
+        if host_matcher:
+            host_matcher.scan_offsets(source, host_state.counts)
+
+        kernel_counts = self._results_gpu.copy_to_host()[:prepared.kernel_count]
+        return self._merge_counts(kernel_counts, host_state), kernel_time
+
+    def _merge_counts(self, kernel_counts, host_state):
+        """Per-signature counts (input order) from kernel pattern counts and the host matcher stream."""
+        prepared = self.prepared
+        results = np.zeros(len(prepared.names), dtype=np.int64)
+        results[prepared.kernel_index] = kernel_counts
+        if host_state is not None:
+            if prepared.host_index is None:
+                results += host_state.counts
+            else:
+                results[prepared.host_index] += host_state.counts
+        return results
+
+    def _result(self, name, size, counts, trace, kernel_time, targets):
+        """Result dict of one scan; its phase times and counters also go to METRICS."""
+        matched = matched_signatures_from_counts(counts, self.names)
+        signatures = self.signatures_evaluated(targets)
+        trace.add("match", int(kernel_time * 1e9))
+        scan_time = trace.finish(size, signatures, len(matched))
+        return build_result(name, size, signatures, matched, scan_time, kernel_time, targets,
+                            self._filter_stats, self.backend, trace.as_dict())
+
+
+class NumbaScanner(Scanner):
+    """
+    Same split and result dict as Scanner, without a GPU: the kernel
+    patterns are matched by scan_patterns_parallel (scan_kernel_optimized's
+    test, spread over every core with prange) and the rest by the same host
+    matcher, so GPU and CPU hosts report identical detections.
+    """
+
+    backend = "numba"
+
+    def _build(self, signatures):
+        return self._prepare_generation(signatures)
+
+    def _batch_file_limit(self):
+        return 1
+
+    def _chunk_size_for(self, size, tracked=False):
+        return _host_chunk_size(self, size, tracked)
+
+    def _file_windows(self, path, mapped, chunk_size):
+        return iter_mapped_windows(mapped, self.overlap, chunk_size, release=True)
+
+    def _fill_batch(self, table, batch):
+        for row, data in batch:
+            table[row] = self._scan_windows([(0, 0, data)], memoryview(data).nbytes, data, classify(data))[0]
+
+    def _scan_windows(self, windows, chunk_size, source, targets):
+        prepared = self.prepared
+        ranges = np.array(prepared.kernel_ranges(targets), dtype=np.int64).reshape(-1, 2)
+        host_matcher = prepared.host_for(targets)
+        host_state = host_matcher.new_stream() if host_matcher else None
+        kernel_counts = np.zeros(prepared.kernel_count, dtype=np.int64)
+        kernel_time = 0.0
+
+        for base, new_start, window in windows:
+            window_len = len(window)
+            if len(ranges) and window_len:
+                kernel_start = time.perf_counter()
+                kernel_counts += scan_patterns_parallel(
+                    np.frombuffer(window, dtype=np.uint8), window_len, prepared.pattern_bytes,
+                    prepared.pattern_masks, prepared.pattern_offsets, ranges, new_start, chunk_count(window_len)
+                )
+                kernel_time += time.perf_counter() - kernel_start
+            if host_matcher:
+                host_matcher.scan_window(window, base, new_start, host_state)
+        if host_matcher:
+            host_matcher.scan_offsets(source, host_state.counts)
+        return self._merge_counts(kernel_counts, host_state), kernel_time
+
+
+class CPUScanner(Scanner):
+    """Same interface as Scanner, matched on the host only (no CUDA needed)."""
+
+    backend = "cpu"
+
+    def _build(self, signatures):
+        max_signatures = self.max_signatures
+        source = _source_identity(signatures)
+        signatures = _load(signatures)
+        if isinstance(signatures, SignatureDB):
+            matcher = signatures.matcher()
+            if max_signatures:
+                active = np.zeros(len(signatures), dtype=np.bool_)
+                active[:max_signatures] = True
+                matcher = matcher.restrict(active)
+        elif isinstance(signatures, PreparedSignatures):
+            raise TypeError("CPUScanner needs the signature list or DB, not a GPU-prepared set")
+        else:
+            if max_signatures:
+                signatures = signatures[:max_signatures]
+            types = [parse_target_type(sig.get("type", 0)) for sig in signatures]
+            matcher = SignatureMatcher([sig["name"] for sig in signatures],
+                                       [sig.get("pattern", "") for sig in signatures],
+                                       offsets=[sig.get("offset", "*") for sig in signatures],
+                                       types=np.array(types, dtype=np.int16))
+        return {
+            "matcher": matcher,
+            "overlap": matcher.max_span - 1,
+            "fingerprint": signature_fingerprint(signatures, max_signatures) if self.cache is not None else None,
+            "_source": source,
+        }
+
+    @property
+    def names(self):
+        return self.matcher.names
+
+    @property
+    def signatures_checked(self):
+        return self.matcher.signature_count
+
+    def signatures_evaluated(self, targets):
+        return self.matcher.for_targets(targets).signature_count
+
+    def _batch_file_limit(self):
+        return 1
+
+    def _chunk_size_for(self, size, tracked=False):
+        return _host_chunk_size(self, size, tracked)
+
+    def _file_windows(self, path, mapped, chunk_size):
+        """Streamed files are matched in place, straight from the mapping."""
+        return iter_mapped_windows(mapped, self.overlap, chunk_size, release=True)
+
+    def _fill_batch(self, table, batch):
+        for row, data in batch:
+            table[row] = self.matcher.for_targets(classify(data)).scan(data)
+
+    def _scan_windows(self, windows, chunk_size, source, targets):
+        matcher = self.matcher.for_targets(targets)
+        state = matcher.new_stream()
+        match_start = time.perf_counter()
+        for base, new_start, window in windows:
+            matcher.scan_window(window, base, new_start, state)
+        matcher.scan_offsets(source, state.counts)
+        return state.counts, time.perf_counter() - match_start
+
+
+def _host_chunk_size(scanner, size, tracked):
+    """_chunk_size_for of the host sessions: they stream from HOST_STREAM_THRESHOLD."""
+    if not scanner.chunk_size and size > HOST_STREAM_THRESHOLD:
+        return STREAM_CHUNK_SIZE
+    return Scanner._chunk_size_for(scanner, size, tracked)
+
+
+def _file_identity(path):
+    st = os.stat(path)
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def _source_identity(signatures):
+    """(path, file identity) of the signature file behind an input, None for in-memory lists."""
+    if isinstance(signatures, (str, os.PathLike)):
+        path = os.fspath(signatures)
+    elif isinstance(signatures, SignatureDB):
+        path = signatures.path
+    elif isinstance(signatures, PreparedSignatures) and signatures.source != "list":
+        path = signatures.source
+    else:
+        return None
+    return path, _file_identity(path)
+
+
+def _load(signatures):
+    """Open a signature file path; anything else is passed through."""
+    if isinstance(signatures, (str, os.PathLike)):
+        path = os.fspath(signatures)
+        return load_signature_db(path) if path.endswith(".db") else load_signatures(path)
+    return signatures
+
+
+# Automatic backend selection
+AUTO_BACKENDS = ("gpu", "cpu")  # candidates of AutoScanner, "numba" can be added
+OFFLOAD_MIN_FILE_SIZE = 256 * 1024  # smaller inputs always stay on the host matcher
+PROBE_BYTES = 4 * 1024 * 1024
+OBSERVE_MIN_BYTES = 1024 * 1024  # scans big enough to correct a cost model
+
+
+class BackendCost:
+    """
+    Expected seconds for one scan on a backend:
+
+        scale * (fixed + size * (per_byte + transfer_per_byte + per_byte_signature * signatures))
+
+    The terms are measured once by AutoScanner; scale then tracks how real
+    scans compare to the model.
+    """
+
+    def __init__(self, fixed=0.0, per_byte=0.0, per_byte_signature=0.0, transfer_per_byte=0.0):
+        self.fixed = fixed
+        self.per_byte = per_byte
+        self.per_byte_signature = per_byte_signature
+        self.transfer_per_byte = transfer_per_byte
+        self.scale = 1.0
+
+    def estimate(self, size, signature_count):
+        per_byte = self.per_byte + self.transfer_per_byte + self.per_byte_signature * signature_count
+        return self.scale * (self.fixed + size * per_byte)
+
+    def observe(self, size, signature_count, seconds):
+        """Fold the time of a real scan into scale (geometric moving average)."""
+        if size < OBSERVE_MIN_BYTES:
+            return
+        predicted = self.estimate(size, signature_count)
+        if predicted > 0 and seconds > 0:
+            self.scale *= (seconds / predicted) ** 0.2
+
+    def as_dict(self):
+        return {
+            'fixed': self.fixed,
+            'per_byte': self.per_byte,
+            'per_byte_signature': self.per_byte_signature,
+            'transfer_per_byte': self.transfer_per_byte,
+            'scale': self.scale,
+        }
+
+
+def choose_backend(file_size, signature_count, gpu_available, costs):
+    """
+    Backend expected to finish a scan first, from the measured costs
+    ({backend: BackendCost}). Inputs under OFFLOAD_MIN_FILE_SIZE never
+    leave the host matcher: a CUDA context, an upload or a thread pool
+    costs more than scanning them.
+    """
+    if "cpu" not in costs:
+        raise ValueError("backend costs must include 'cpu', the fallback for every input")
+    candidates = [backend for backend in costs
+                  if backend == "cpu" or (file_size >= OFFLOAD_MIN_FILE_SIZE and (backend != "gpu" or gpu_available))]
+    return min(candidates, key=lambda backend: costs[backend].estimate(file_size, signature_count))
+
+
+class AutoScanner:
+    """
+    Scanner session that picks the backend per scan with choose_backend.
+
+    The CPUScanner is always built. The first time an input is large
+    enough to consider offloading it, a warm-up thread builds the GPU and
+    Numba sessions and measures every backend on a probe buffer; scans keep
+    running on the host matcher meanwhile (no scan waits for a CUDA context
+    or a JIT) and the sessions and costs are swapped in together once all
+    are measured. Results are the same dict whichever backend ran, with its
+    name in 'backend'.
+    """
+
+    backend = "auto"
+
+    def __init__(self, signatures, max_signatures=None, chunk_size=None, cache=None, prefilter=None,
+                 backends=AUTO_BACKENDS):
+        self.max_signatures = max_signatures
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.prefilter = prefilter
+        self.backends = tuple(backends)
+        self.gpu_available = "gpu" in self.backends and cuda.is_available()
+        self._signatures = signatures
+        self._lock = threading.RLock()
+        # The host session also keeps the verdict cache fingerprint current
+        self.cpu = CPUScanner(signatures, max_signatures, chunk_size, cache)
+        # Until the warm-up has measured them, every input stays on the host
+        self.costs = {"cpu": BackendCost()}
+        self._scanners = {"cpu": self.cpu}
+        self._warm_up_thread = None
+        self._generation = 0  # bumped by reload, so a warm-up started before it is discarded
+
+    def reload(self, signatures=None):
+        """Reload every backend session built so far (see Scanner.reload)."""
+        with self._lock:
+            if signatures is not None:
+                self._signatures = signatures
+            self._generation += 1
+            for scanner in self._scanners.values():
+                scanner.reload(signatures)
+
+    def refresh(self):
+        """Reload if the signature file was replaced since it was loaded; True if it was."""
+        with self._lock:
+            if not self.cpu.refresh():
+                return False
+            for scanner in self._scanners.values():
+                if scanner is not self.cpu:
+                    scanner.refresh()
+            return True
+
+    @property
+    def names(self):
+        return self.cpu.names
+
+    @property
+    def signatures_checked(self):
+        return self.cpu.signatures_checked
+
+    def signatures_evaluated(self, targets):
+        return self.cpu.signatures_evaluated(targets)
+
+    def select(self, size, targets=(0,)):
+        """(scanner, signature count) for an input of this size and these target types."""
+        signature_count = self.cpu.signatures_evaluated(targets)
+        if size >= OFFLOAD_MIN_FILE_SIZE:
+            self.warm_up()
+        with self._lock:
+            scanners, costs, gpu_available = self._scanners, self.costs, self.gpu_available
+        return scanners[choose_backend(size, signature_count, gpu_available, costs)], signature_count
+
+    def warm_up(self, wait=False):
+        """
+        Build the offload sessions and measure every backend on a background
+        thread (once; again after a reload). With wait, block until it is done.
+        """
+        with self._lock:
+            thread = self._warm_up_thread
+            if thread is None:
+                thread = self._warm_up_thread = threading.Thread(
+                    target=self._warm_up, args=(self._generation,), name="scanner-warm-up", daemon=True)
+                thread.start()
+        if wait:
+            thread.join()
+
+    def scan(self, path, progress=None, cancel=None):
+        """Scan a file on the backend chosen for its size and type (progress and cancel as in Scanner.scan)."""
+        return self._scan_one(path, None, progress, cancel)
+
+    def scan_many(self, paths, progress=None, cancel=None, depth=PREFETCH_DEPTH):
+        """Scanner.scan_many, each file on the backend chosen for it."""
+        return _scan_many(self, paths, progress, cancel, depth)
+
+    def _scan_one(self, path, data, progress=None, cancel=None):
+        if self.cache is not None:
+            return cached_scan(self.cache, path, self.cpu.fingerprint,
+                               lambda p: self._scan_path(p, progress, cancel, data), progress)
+        return self._scan_path(path, progress, cancel, data)
+
+    def _scan_path(self, path, progress=None, cancel=None, data=None):
+        if data is None:
+            size = os.path.getsize(path)
+            with open(path, "rb") as f:
+                head = f.read(HEADER_SIZE)
+        else:
+            size = len(data)
+            head = data[:HEADER_SIZE]
+        scanner, signature_count = self.select(size, classify(head))
+        with scanner._lock:
+            result = scanner._scan_path(path, progress, cancel, data)
+        self._observe(scanner.backend, size, signature_count, result['scan_time'])
+        return result
+
+    def scan_bytes(self, buf, name="<buffer>", progress=None, cancel=None):
+        size = memoryview(buf).nbytes
+        scanner, signature_count = self.select(size, classify(buf))
+        result = scanner.scan_bytes(buf, name, progress, cancel)
+        self._observe(scanner.backend, size, signature_count, result['scan_time'])
+        return result
+
+    def counts(self, buf):
+        size = memoryview(buf).nbytes
+        scanner, signature_count = self.select(size, classify(buf))
+        start = time.perf_counter()
+        counts = scanner.counts(buf)
+        self._observe(scanner.backend, size, signature_count, time.perf_counter() - start)
+        return counts
+
+    def scan_batch(self, paths):
+        """Scanner.scan_batch on the backend chosen for the total size of the batch."""
+        size = sum(os.path.getsize(path) for path in paths)
+        scanner, _ = self.select(size)
+        return scanner.scan_batch(paths)
+
+    def scan_batch_bytes(self, buffers):
+        size = sum(memoryview(buf).nbytes for buf in buffers)
+        scanner, _ = self.select(size)
+        return scanner.scan_batch_bytes(buffers)
+
+    def _warm_up(self, generation):
+        """Warm-up thread: sessions and costs are built outside the lock, then published together."""
+        scanners = {"cpu": self.cpu}
+        costs = {}
+        for backend in dict.fromkeys(("cpu",) + self.backends):
+            scanner = self._build_backend(backend)
+            if scanner is not None:
+                scanners[backend] = scanner
+                costs[backend] = self._measure(scanner)
+        with self._lock:
+            if generation != self._generation:
+                # Reloaded meanwhile: these sessions hold the old signatures, measure again
+                self._warm_up_thread = None
+                return
+            self._scanners = scanners
+            self.costs = costs
+
+    def _build_backend(self, backend):
+        """Session for a backend (None when the GPU isn't usable; a GPU that fails to start is dropped)."""
+        if backend == "cpu":
+            return self.cpu
+        if backend == "gpu":
+            if not self.gpu_available:
+                return None
+            try:
+                return Scanner(self._signatures, self.max_signatures, self.chunk_size, prefilter=self.prefilter)
+            except cuda.CudaSupportError:
+                self.gpu_available = False
+                return None
+        return NumbaScanner(self._signatures, self.max_signatures, self.chunk_size)
+
+    def _measure(self, scanner):
+        """BackendCost of a session from timed scans of a small and a PROBE_BYTES random buffer."""
+        probe = np.random.default_rng(0).integers(0, 256, PROBE_BYTES, dtype=np.uint8).tobytes()
+        scanner.counts(probe[:HEADER_SIZE])  # warm-up: JIT compilation, device buffers
+        fixed = min(_timed(scanner.counts, probe[:HEADER_SIZE]) for _ in range(3))
+        total = min(_timed(scanner.counts, probe) for _ in range(2))
+        variable = max(total - fixed, 0.0) / len(probe)
+        if scanner.backend == "cpu":
+            # The automaton's cost doesn't grow with the number of signatures
+            return BackendCost(fixed, per_byte=variable)
+
+        transfer = 0.0
+        if scanner.backend == "gpu":
+            host = np.frombuffer(probe, dtype=np.uint8)
+            device = cuda.device_array(len(host), dtype=np.uint8)
+            transfer = min(_timed(_copy_to_device, device, host) for _ in range(3)) / len(host)
+        signature_count = max(scanner.signatures_evaluated(classify(probe)), 1)
+        return BackendCost(fixed, per_byte_signature=max(variable - transfer, 0.0) / signature_count,
+                           transfer_per_byte=transfer)
+
+    def _observe(self, backend, size, signature_count, seconds):
+        with self._lock:
+            if backend in self.costs:
+                self.costs[backend].observe(size, signature_count, seconds)
+
+
+def _read_ahead(paths, chunk_size):
+    """(path, contents or None, error) per path; files that will be streamed (or can't be read) are left unread."""
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+            if chunk_size or size > PREFETCH_FILE_LIMIT:
+                yield path, None, None
+                continue
+            with open(path, "rb") as f:
+                yield path, f.read(), None
+        except OSError as e:
+            yield path, None, e
+
+
+def _scan_many(session, paths, progress, cancel, depth):
+    """scan_many of a Scanner or AutoScanner: file contents are read on a prefetch thread, depth files ahead."""
+    for path, data, error in prefetch(_read_ahead(paths, session.chunk_size), depth):
+        if error is not None:
+            yield path, error
+            continue
+        try:
+            result = session._scan_one(path, data, progress, cancel)
+        except OSError as e:
+            result = e
+        yield path, result
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def _copy_to_device(device, host):
+    device.copy_to_device(host)
+    cuda.synchronize()
+
+
+def create_scanner(signatures, max_signatures=None, chunk_size=None, cache=None, prefilter=None, backend="auto"):
+    """
+    Scanner session for a backend: "gpu" (Scanner), "numba" (NumbaScanner),
+    "cpu" (CPUScanner) or "auto" (AutoScanner, picks one per scan). The
+    prefilter only applies to the GPU.
+    """
+    if backend == "auto":
+        return AutoScanner(signatures, max_signatures, chunk_size, cache, prefilter)
+    if backend == "gpu":
+        return Scanner(signatures, max_signatures, chunk_size, cache, prefilter)
+    if backend == "numba":
+        return NumbaScanner(signatures, max_signatures, chunk_size, cache)
+    if backend == "cpu":
+        return CPUScanner(signatures, max_signatures, chunk_size, cache)
+    raise ValueError(f"unknown backend: {backend!r}")
+
+
+_sessions = {}
+_object_sessions = OrderedDict()  # (id, options) -> (signature object, session), least recently used first
+MAX_OBJECT_SESSIONS = 4
+
+
+def malware_scan(file_path, signatures, max_signatures=None, chunk_size=None, cache=None, backend="auto",
+                 progress=None, cancel=None):
+    """
+    Scan one file with any backend; returns the same result dict as
+    gpu_malware_scan, whose 'backend' names the engine that ran. Sessions
+    are kept between calls: per signature file (refreshed when the file
+    changes), and for the last MAX_OBJECT_SESSIONS signature lists or DB
+    objects passed in. A kept session is bound to this call's cache object.
+    progress and cancel are passed to Scanner.scan.
+    """
+    cache_path = os.path.abspath(cache.path) if cache is not None else None
+    options = (max_signatures, chunk_size, cache_path, backend)
+    if isinstance(signatures, (str, os.PathLike)):
+        key = (os.path.abspath(os.fspath(signatures)),) + options
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = create_scanner(signatures, max_signatures, chunk_size, cache, backend=backend)
+        else:
+            session.refresh()
+    else:
+        session = _object_session(signatures, options, cache)
+    _bind_cache(session, cache)
+    return session.scan(file_path, progress, cancel)
+
+
+def _object_session(signatures, options, cache):
+    """
+    Kept session for an in-memory signature set. Lists can't be weakly
+    referenced, so the entry holds the object: its id can't be reused by
+    another set while the entry exists, and identity is checked on a hit.
+    """
+    key = (id(signatures),) + options
+    entry = _object_sessions.get(key)
+    if entry is not None and entry[0] is signatures:
+        _object_sessions.move_to_end(key)
+        return entry[1]
+    session = create_scanner(signatures, options[0], options[1], cache, backend=options[3])
+    _object_sessions[key] = (signatures, session)
+    while len(_object_sessions) > MAX_OBJECT_SESSIONS:
+        _object_sessions.popitem(last=False)
+    return session
+
+
+def _bind_cache(session, cache):
+    """Point a kept session at the caller's cache object (same file, possibly a new connection)."""
+    session.cache = cache
+    if isinstance(session, AutoScanner):
+        session.cpu.cache = cache
@@ -1,47 +1,361 @@
-import json
+import hashlib
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'Code_to_get_signature'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'CPU'))
+
+from file_types import parse_target_type, KNOWN_TARGETS
+from ndb_offset import OffsetTable
+from ndb_pattern import compile_pattern
+from pattern_matcher import SignatureMatcher
+from qgram_filter import QGramFilter, literal_gram_offsets
+from result_cache import signature_fingerprint
+from sigdb import open_signature_db, SignatureDB, PATTERN_NIBBLE, PATTERN_INVALID
+from signature_stream import stream_signatures
+
+# Per-character codes for bulk hex decoding
+_CODE_WILDCARD = 16   # '?'
+_CODE_OPERATOR = 254  # NDB gap/alternation syntax: needs the full pattern compiler
+_CODE_INVALID = 255
+
+_CHAR_CODES = np.full(256, _CODE_INVALID, dtype=np.uint8)
+for _i, _c in enumerate(b"0123456789abcdef"):
+    _CHAR_CODES[_c] = _i
+for _i, _c in enumerate(b"ABCDEF"):
+    _CHAR_CODES[_c] = 10 + _i
+_CHAR_CODES[ord("?")] = _CODE_WILDCARD
+for _c in b"*{}[]()|-!":
+    _CHAR_CODES[_c] = _CODE_OPERATOR
+
+# decode_hex_patterns status codes
+STATUS_FIXED = 0
+STATUS_VARIABLE = 1
+STATUS_INVALID = 2
 
 def hex_to_bytes_and_mask(hex_str, sig_name=None):
-    # Handle odd-length hex strings by padding with '0'
-    if len(hex_str) % 2 != 0:
+    """
+    Decode a fixed-length NDB body into (bytes, mask). '??' gives mask 0x00 and
+    nibble wildcards give 0xF0 / 0x0F. Bodies with gaps or alternations have no
+    fixed byte layout and return (None, None); they are matched on the host.
+    """
+    # Handle odd-length plain hex strings by padding with '0'
+    if len(hex_str) % 2 != 0 and all(c in "0123456789abcdefABCDEF?" for c in hex_str):
         hex_str = hex_str + '0'  # Pad with zero at the end
 
-    byte_array = bytearray()
-    mask_array = bytearray()
+    try:
+        program = compile_pattern(hex_str)
+    except ValueError as e:
+        raise ValueError(f"Invalid pattern in signature {sig_name}: {e}")
 
-    i = 0
-    while i < len(hex_str):
-        pair = hex_str[i:i+2]
-        if pair == "??":
-            byte_array.append(0x00)
-            mask_array.append(0x00)
-        else:
-            try:
-                byte_array.append(int(pair, 16))
-                mask_array.append(0xFF)
-            except ValueError:
-                raise ValueError(f"Invalid hex pair '{pair}' in signature {sig_name}")
-        i += 2
+    if not program.is_fixed:
+        return None, None
+
+    token = program.parts[0].tokens[0]
+    return token.values, token.masks
+
+
+def decode_hex_patterns(patterns, pad_odd=False):
+    """
+    Bulk-decode many NDB bodies with NumPy instead of a per-pair Python loop.
+
+    Returns (values, masks, offsets, status): the packed value and mask
+    streams of every fixed-length body, CSR offsets (len(patterns) + 1, zero
+    length for non-fixed bodies) and a STATUS_* code per body. Bodies using
+    gaps or alternations are STATUS_VARIABLE and left to the pattern compiler.
+    With pad_odd, odd-length plain hex gets a trailing '0' nibble.
+    """
+    encoded = [p.strip().encode("ascii", "replace") for p in patterns]
+    count = len(encoded)
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=count)
+    codes = _CHAR_CODES[np.frombuffer(b"".join(encoded), dtype=np.uint8)]
+    sig_of_char = np.repeat(np.arange(count), lengths)
+
+    invalid = np.bincount(sig_of_char[codes == _CODE_INVALID], minlength=count) > 0
+    variable = np.bincount(sig_of_char[codes == _CODE_OPERATOR], minlength=count) > 0
+    odd = lengths % 2 == 1
+    fixed = ~invalid & ~variable & (lengths > 0) & (~odd | pad_odd)
 
-    return bytes(byte_array), bytes(mask_array)
+    status = np.full(count, STATUS_INVALID, dtype=np.uint8)
+    status[fixed] = STATUS_FIXED
+    status[~invalid & variable] = STATUS_VARIABLE
+
+    # Characters of fixed bodies, with a '0' nibble appended to odd ones
+    chars = codes[fixed[sig_of_char]]
+    char_lengths = lengths[fixed]
+    pad = odd[fixed]
+    if pad.any():
+        ends = np.cumsum(char_lengths)[pad]
+        chars = np.insert(chars, ends, 0)
+        char_lengths = char_lengths + pad
+
+    hi = chars[0::2]
+    lo = chars[1::2]
+    values = ((hi & 0x0F) << 4 | (lo & 0x0F)).astype(np.uint8)
+    masks = (np.where(hi != _CODE_WILDCARD, 0xF0, 0) | np.where(lo != _CODE_WILDCARD, 0x0F, 0)).astype(np.uint8)
+
+    byte_lengths = np.zeros(count, dtype=np.int64)
+    byte_lengths[fixed] = char_lengths // 2
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(byte_lengths, out=offsets[1:])
+    return values, masks, offsets, status
+
+
+def gather_packed(values, masks, offsets, index):
+    """Pull the patterns at `index` out of a packed stream into a new packed stream."""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = (offsets[1:] - offsets[:-1])[index]
+    starts = offsets[:-1][index]
+    new_offsets = np.zeros(len(index) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    src = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    return values[src], masks[src], new_offsets
 
 
 def load_signatures(filename):
-    with open(filename, "r") as f:
-        raw_sigs = json.load(f)
+    """Decode a signatures.json (array) or signatures.jsonl file for scanning."""
+    raw_sigs = list(stream_signatures(filename))
+
+    patterns = [sig.get("pattern", "") for sig in raw_sigs]
+    values, masks, offsets, status = decode_hex_patterns(patterns, pad_odd=True)
 
     processed = []
     
-    for sig in raw_sigs:
-        try:
-            pattern = sig.get("pattern", "")
-            byte_seq, mask = hex_to_bytes_and_mask(pattern, sig.get("name"))
-            sig["bytes"] = byte_seq
-            sig["mask"] = mask
-            
-            processed.append(sig)
-            
-        except Exception as e:
+    for i, sig in enumerate(raw_sigs):
+        if status[i] == STATUS_FIXED:
+            sig["bytes"] = values[offsets[i]:offsets[i + 1]].tobytes()
+            sig["mask"] = masks[offsets[i]:offsets[i + 1]].tobytes()
+        elif status[i] == STATUS_VARIABLE:
+            try:
+                compile_pattern(patterns[i])
+            except ValueError:
+                continue
+            sig["bytes"] = None  # Gaps/alternations: matched on the host
+            sig["mask"] = None
+        else:
             continue
+        processed.append(sig)
 
     print(f"✅ Loaded {len(processed)} valid signatures.")
-    return processed
\ No newline at end of file
+    return processed
+
+
+class PreparedSignatures:
+    """
+    A signature set split and packed for scanning, built once by
+    prepare_signatures and handed to the scanner as is.
+
+        pattern_bytes / pattern_masks / pattern_offsets
+                        packed fixed-length patterns that run on the kernel
+        kernel_index    signature index of each kernel pattern, grouped by target type
+        kernel_types    NDB target type of each kernel pattern (contiguous runs)
+        kernel_gram_offsets
+                        offset of each kernel pattern's first literal 4-gram (-1 = none);
+                        inside a type run, patterns without one come first
+        host_matcher    SignatureMatcher for gapped / alternation / oversized patterns
+                        and for offset-bound signatures (checked in their window only)
+        host_index      signature index of each host matcher entry (None = identity)
+    """
+
+    def __init__(self, names, pattern_bytes, pattern_masks, pattern_offsets,
+                 kernel_index, kernel_types, host_matcher, host_index, skipped, source,
+                 kernel_gram_offsets=None):
+        self.names = names
+        self.pattern_bytes = pattern_bytes
+        self.pattern_masks = pattern_masks
+        self.pattern_offsets = pattern_offsets
+        self.kernel_index = kernel_index
+        self.kernel_types = kernel_types
+        self.host_matcher = host_matcher
+        self.host_index = host_index
+        self.skipped = skipped
+        self.source = source
+        if kernel_gram_offsets is None:
+            kernel_gram_offsets = np.full(len(kernel_index), -1, dtype=np.int64)
+        self.kernel_gram_offsets = kernel_gram_offsets
+
+        # Kernel patterns of one target type are a contiguous range
+        run_types, run_starts, run_counts = np.unique(kernel_types, return_index=True, return_counts=True)
+        self.type_ranges = {int(t): (int(start), int(start + count))
+                            for t, start, count in zip(run_types, run_starts, run_counts)}
+        unfiltered = np.cumsum(np.concatenate([[0], kernel_gram_offsets < 0]))
+        self._brute_ranges = {t: (start, start + int(unfiltered[stop] - unfiltered[start]))
+                              for t, (start, stop) in self.type_ranges.items()}
+        self._pattern_bits = None
+        self._qgram_filter = None
+        self._fingerprint = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def fingerprint(self):
+        """
+        Identity of the prepared set for the result cache: the source DB
+        fingerprint (or the names and host bodies of a list) plus which
+        signatures ended up on the kernel and on the host.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=32)
+            if self.source == "list":
+                digest.update("\0".join(self.names).encode("utf-8", "replace"))
+                if self.host_matcher:
+                    digest.update("\0".join(self.host_matcher.bodies).encode("utf-8", "replace"))
+            else:
+                digest.update(signature_fingerprint(self.source).encode())
+            arrays = [self.pattern_bytes, self.pattern_masks, self.pattern_offsets, self.kernel_index, self.kernel_types]
+            if self.host_matcher and self.host_matcher.active is not None:
+                arrays.append(np.asarray(self.host_matcher.active, dtype=np.bool_))
+            if self.host_index is not None:
+                arrays.append(self.host_index)
+            for array in arrays:
+                digest.update(np.ascontiguousarray(array).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    @property
+    def kernel_count(self):
+        return len(self.kernel_index)
+
+    @property
+    def signatures_checked(self):
+        return self.kernel_count + (self.host_matcher.signature_count if self.host_matcher else 0)
+
+    def kernel_ranges(self, targets):
+        """Kernel pattern ranges [start, stop) to launch for a file of these target types."""
+        return [span for t, span in sorted(self.type_ranges.items())
+                if t in targets or t not in KNOWN_TARGETS]
+
+    def brute_ranges(self, targets):
+        """kernel_ranges without the patterns the q-gram prefilter covers (the head of each range)."""
+        return [self._brute_ranges[t] for t, _ in sorted(self.type_ranges.items())
+                if (t in targets or t not in KNOWN_TARGETS) and self._brute_ranges[t][1] > self._brute_ranges[t][0]]
+
+    @property
+    def qgram_filter(self):
+        """QGramFilter over the kernel patterns that have a literal 4-gram (built on first use)."""
+        if self._qgram_filter is None:
+            self._qgram_filter = QGramFilter(self.pattern_bytes, self.pattern_masks, self.pattern_offsets,
+                                             self.kernel_gram_offsets)
+        return self._qgram_filter
+
+    def host_for(self, targets):
+        return self.host_matcher.for_targets(targets) if self.host_matcher else None
+
+    def signatures_evaluated(self, targets):
+        """Number of signatures applied to a file of these target types."""
+        kernel = sum(stop - start for start, stop in self.kernel_ranges(targets))
+        host = self.host_for(targets)
+        return kernel + (host.signature_count if host else 0)
+
+    @property
+    def pattern_bits(self):
+        """Per kernel pattern, the bit of its target type in a file's target bitmask (see target_bits)."""
+        if self._pattern_bits is None:
+            known = np.isin(self.kernel_types, KNOWN_TARGETS)
+            self._pattern_bits = np.where(known, self.kernel_types, 31).astype(np.uint8)
+        return self._pattern_bits
+
+    @property
+    def max_span(self):
+        """Longest possible match (stream windows overlap by max_span - 1)."""
+        lengths = np.diff(self.pattern_offsets)
+        return max(int(lengths.max()) if len(lengths) else 1,
+                   self.host_matcher.max_span if self.host_matcher else 1)
+
+
+def prepare_signatures(signatures, max_pattern_length, max_signatures=None):
+    """
+    Split signatures into kernel patterns and host-matched ones, and pack the
+    kernel patterns, using bulk NumPy work over the whole set.
+
+    Accepts a compiled SignatureDB (zero-copy), a list from load_signatures
+    (reuses its "bytes"/"mask") or a plain list of {"name", "pattern"} dicts.
+    """
+    if isinstance(signatures, SignatureDB):
+        return _prepare_from_db(signatures, max_pattern_length, max_signatures)
+
+    if max_signatures:
+        signatures = signatures[:max_signatures]
+    names = [sig["name"] for sig in signatures]
+
+    if signatures and all("bytes" in sig for sig in signatures):
+        # Already decoded by load_signatures: just concatenate
+        fixed = np.fromiter((sig["bytes"] is not None for sig in signatures), dtype=np.bool_, count=len(signatures))
+        byte_lengths = np.fromiter((len(sig["bytes"] or b"") for sig in signatures), dtype=np.int64, count=len(signatures))
+        offsets = np.zeros(len(signatures) + 1, dtype=np.int64)
+        np.cumsum(byte_lengths, out=offsets[1:])
+        values = np.frombuffer(b"".join(sig["bytes"] or b"" for sig in signatures), dtype=np.uint8)
+        masks = np.frombuffer(b"".join(sig["mask"] or b"" for sig in signatures), dtype=np.uint8)
+        status = np.where(fixed, STATUS_FIXED, STATUS_VARIABLE).astype(np.uint8)
+    else:
+        values, masks, offsets, status = decode_hex_patterns([sig["pattern"] for sig in signatures])
+
+    # Offset-bound signatures (EP+n, EOF-n, ...) are checked in their window on
+    # the host; only '*' signatures are swept by the kernel
+    offset_table = OffsetTable([sig.get("offset", "*") for sig in signatures])
+    types = np.array([parse_target_type(sig.get("type", 0)) for sig in signatures], dtype=np.int16)
+
+    lengths = np.diff(offsets)
+    on_kernel = (status == STATUS_FIXED) & (lengths <= max_pattern_length) & ~offset_table.bounded
+    on_host = (status != STATUS_INVALID) & ~on_kernel
+    gram_offsets = literal_gram_offsets(values, masks, offsets)
+    kernel_index = _group_by_type(np.flatnonzero(on_kernel), types, gram_offsets >= 0)
+    pattern_bytes, pattern_masks, pattern_offsets = gather_packed(values, masks, offsets, kernel_index)
+
+    host_index = np.flatnonzero(on_host)
+    host_matcher = None
+    if len(host_index):
+        host_matcher = SignatureMatcher([names[i] for i in host_index],
+                                        [signatures[i]["pattern"] for i in host_index],
+                                        offsets=offset_table.subset(host_index),
+                                        types=types[host_index])
+    skipped = int(np.count_nonzero(status == STATUS_INVALID))
+    if host_matcher:
+        skipped += host_matcher.skipped
+
+    return PreparedSignatures(names, pattern_bytes, pattern_masks, pattern_offsets,
+                              kernel_index, types[kernel_index], host_matcher, host_index, skipped, "list",
+                              gram_offsets[kernel_index])
+
+
+def _prepare_from_db(db, max_pattern_length, max_signatures=None):
+    """Same split for a compiled DB, without per-signature objects."""
+    usable = np.ones(len(db), dtype=np.bool_)
+    if max_signatures:
+        usable[max_signatures:] = False
+
+    kinds = db.kinds
+    bounded = db.matcher().offset_table.bounded
+    on_kernel = usable & (kinds <= PATTERN_NIBBLE) & (db.pattern_lengths <= max_pattern_length) & ~bounded
+    on_host = usable & ~on_kernel & (kinds != PATTERN_INVALID)
+    skipped = int(np.count_nonzero(usable & (kinds == PATTERN_INVALID)))
+    gram_offsets = literal_gram_offsets(db.pattern_bytes, db.pattern_masks, db.pattern_offsets)
+    kernel_index = _group_by_type(np.flatnonzero(on_kernel), db.types, gram_offsets >= 0)
+
+    if np.array_equal(kernel_index, np.arange(len(db))):
+        # Every signature runs on the kernel: use the mapped streams as they are
+        packed = db.pattern_bytes, db.pattern_masks, db.pattern_offsets.astype(np.int64)
+    else:
+        packed = gather_packed(db.pattern_bytes, db.pattern_masks, db.pattern_offsets, kernel_index)
+
+    host_matcher = db.matcher().restrict(on_host) if on_host.any() else None
+    # The DB matcher already reports in DB order, so host_index is None
+    return PreparedSignatures(db.names, *packed, kernel_index, db.types[kernel_index],
+                              host_matcher, None, skipped, db.path, gram_offsets[kernel_index])
+
+
+def _group_by_type(index, types, filtered):
+    """
+    Stable-sort signature indices by target type so each type is one
+    contiguous kernel range, with the prefilter-covered patterns last in it.
+    """
+    return index[np.lexsort((filtered[index], types[index]))]
+
+def load_signature_db(filename):
+    """Open a compiled signature DB (see sigdb.py). Pattern data stays in the mmap."""
+    db = open_signature_db(filename)
+    print(f"✅ Loaded {len(db)} signatures from compiled DB.")
+    return db
@@ -1,27 +1,120 @@
+import time
+_STARTUP_START = time.perf_counter()  # everything in the startup profile is relative to this
+
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import threading
-import time
 from PIL import Image, ImageTk
+import json
 import os
 import sys
 import traceback
 
 # Add the path to your GPU scanner
 sys.path.append(os.path.join(os.path.dirname(__file__), 'GPU'))
+sys.path.append(os.path.join(os.path.dirname(__file__), 'Code_to_get_signature'))
+
+from metrics import METRICS
+from progress import ScanCancelled
 
-# Import your backend functions
-try:
-    from GPU.signature_loader import load_signatures
-    from GPU.gpu_scanner import gpu_malware_scan  # Your main scanning function
+SIGNATURE_DB = "C:/Users/mahme/Downloads/extract/Backend/signatures.db"
+SIGNATURE_JSON = "C:/Users/mahme/Downloads/extract/Backend/signatures.json"
+METRICS_PATH = os.path.join(os.path.dirname(__file__), "scan_metrics.prom")
+STARTUP_PROFILE_PATH = os.path.join(os.path.dirname(__file__), "startup_profile.json")
+
+
+class EngineLoader:
+    """
+    Loads the scan engine on a background thread: the numba / CUDA imports,
+    the signature set (compiled DB is mmapped, JSON is parsed) and the
+    scanner session. The window comes up at once; ``ready`` is set when
+    loading has finished, successfully (``scanner``) or not (``error``).
+    Every step's time since process start goes into ``profile``.
+    """
+    
+    STEPS = ("import engine", "load signatures", "create scanner")
+    
+    def __init__(self):
+        self.ready = threading.Event()
+        self.signatures = []
+        self.scanner = None
+        self.error = None
+        self.status = "Starting..."
+        self.steps_done = 0
+        self.profile = {}  # step -> {"start": s, "seconds": s}, times since process start
+    
+    def start(self):
+        threading.Thread(target=self.load, name="engine-loader", daemon=True).start()
+    
+    def mark(self, step, start):
+        now = time.perf_counter()
+        self.profile[step] = {"start": start - _STARTUP_START, "seconds": now - start}
+    
+    def load(self):
+        try:
+            self.status = "Loading scan engine..."
+            start = time.perf_counter()
+            from GPU.signature_loader import load_signatures, load_signature_db
+            from GPU.scanner import create_scanner  # Your main scanning session
+            from result_cache import ResultCache
+            self.mark("import engine", start)
+            self.steps_done += 1
+            
+            self.status = "Loading signatures..."
+            start = time.perf_counter()
+            if os.path.exists(SIGNATURE_DB):
+                self.signatures = load_signature_db(SIGNATURE_DB)
+            else:
+                self.signatures = load_signatures(SIGNATURE_JSON)
+            self.mark("load signatures", start)
+            self.steps_done += 1
+            print(f"Loaded {len(self.signatures)} signatures successfully")
+            
+            # Prepare the signatures once; every scan reuses them and runs on the
+            # backend (GPU, CPU) expected to be fastest for that file.
+            # Verdicts of unchanged files are reused until the signature set changes
+            self.status = "Initializing scanner..."
+            start = time.perf_counter()
+            cache = ResultCache(os.path.join(os.path.dirname(__file__), "scan_cache.sqlite"))
+            self.scanner = create_scanner(self.signatures, cache=cache)
+            self.mark("create scanner", start)
+            self.steps_done += 1
+            print(f"Scanner ready ({self.scanner.backend.upper()})")
+            
+            # Scan times, sizes and per-phase breakdowns go to scan_metrics.prom after every scan
+            METRICS.enable()
+            METRICS.describe("frontend_scan_seconds", "Wall time of one scan as seen by the GUI")
+            self.status = "Ready to scan!"
+        except Exception as e:
+            print(f"Error loading signatures: {e}")
+            self.error = e
+            self.status = "Signatures could not be loaded"
+        finally:
+            self.profile["engine ready"] = {"start": time.perf_counter() - _STARTUP_START, "seconds": 0.0}
+            self.ready.set()
     
-    # Load signatures once at startup
-    signatures = load_signatures("C:/Users/mahme/Downloads/extract/Backend/signatures.json")
-    print(f"Loaded {len(signatures)} signatures successfully")
-except Exception as e:
-    print(f"Error loading signatures: {e}")
-    signatures = []
+    @property
+    def progress(self):
+        return self.steps_done / len(self.STEPS)
+
+
+def format_startup_profile(profile):
+    """One line per startup step, in the order they started."""
+    return "\n".join(
+        f"[startup] {step:<16} at {times['start'] * 1000:8.1f} ms, took {times['seconds'] * 1000:8.1f} ms"
+        for step, times in sorted(profile.items(), key=lambda item: item[1]["start"])
+    )
+
+
+def write_startup_profile(profile, path=STARTUP_PROFILE_PATH):
+    """Save the startup profile as JSON (seconds since process start), for tracking across versions."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+
+
+engine = EngineLoader()
+engine.mark("import ui", _STARTUP_START)
 
 # Set the appearance mode and color theme
 ctk.set_appearance_mode("light")  # "light" or "dark"
@@ -45,6 +138,7 @@ class MalwareScannerApp:
         self.progress_animation_running = False
         self.current_progress = 0
         self.target_progress = 0
+        self.cancel_event = threading.Event()
         
         # Create frames
         self.loading_frame = None
@@ -54,9 +148,10 @@ class MalwareScannerApp:
         
         # Show loading screen first
         self.show_loading_screen()
+        engine.mark("window", _STARTUP_START + engine.profile["import ui"]["seconds"])
         
-        # Start the app
-        self.root.after(3000, self.show_main_menu)  # Show loading for 3 seconds
+        # The splash stays up only until the engine has loaded
+        self.wait_for_engine()
     
     def show_loading_screen(self):
         """Display the loading screen with logo and app name"""
@@ -114,19 +209,21 @@ class MalwareScannerApp:
         )
         self.loading_text.pack()
         
-        # Animate loading
-        self.animate_loading()
     
-    def animate_loading(self):
-        """Animate the loading progress bar"""
-        for i in range(101):
-            self.root.after(i * 30, lambda progress=i/100: self.loading_progress.set(progress))
-            if i < 33:
-                self.root.after(i * 30, lambda: self.loading_text.configure(text="Loading components..."))
-            elif i < 66:
-                self.root.after(i * 30, lambda: self.loading_text.configure(text="Initializing scanner..."))
-            else:
-                self.root.after(i * 30, lambda: self.loading_text.configure(text="Ready to scan!"))
+    def wait_for_engine(self):
+        """Show the loader's real progress; open the main menu once it is ready"""
+        self.loading_progress.set(engine.progress)
+        self.loading_text.configure(text=engine.status)
+        if not engine.ready.is_set():
+            self.root.after(30, self.wait_for_engine)
+            return
+        
+        self.show_main_menu()
+        engine.mark("main menu", time.perf_counter())
+        try:
+            write_startup_profile(engine.profile)
+        except OSError:
+            pass
     
     def show_main_menu(self):
         """Display the main scanning interface"""
@@ -258,6 +355,7 @@ class MalwareScannerApp:
         self.current_progress = 0
         self.target_progress = 0
         self.progress_animation_running = True
+        self.cancel_event = threading.Event()
         
         self.show_scanning_overlay()
         
@@ -346,7 +444,22 @@ class MalwareScannerApp:
             font=ctk.CTkFont(size=12),
             text_color="#9CA3AF"
         )
-        self.detailed_status.pack(pady=(0, 30))
+        self.detailed_status.pack(pady=(0, 15))
+        
+        # Cancel button (the engine stops between chunks)
+        cancel_btn = ctk.CTkButton(
+            scan_container,
+            text="Cancel",
+            font=ctk.CTkFont(size=14),
+            height=32,
+            width=120,
+            corner_radius=16,
+            fg_color="#E5E7EB",
+            hover_color="#D1D5DB",
+            text_color="#374151",
+            command=self.cancel_scan
+        )
+        cancel_btn.pack(pady=(0, 25))
         
         # Start animations
         self.animate_scan_overlay()
@@ -401,84 +514,42 @@ class MalwareScannerApp:
             pass
     
     def real_scan(self):
-        """Perform actual GPU malware scanning with smooth progress"""
+        """Run the scan; the progress bar follows the engine's progress events"""
         self.scanning = True
         self.scan_result = None
         
         try:
-            # Phase 1: Initialization (0-15%)
-            self.root.after(0, lambda: self.set_progress(5, "Initializing scan...", "Checking file accessibility"))
-            time.sleep(0.5)
-            
             # Check if file exists
             if not os.path.exists(self.selected_file):
                 raise FileNotFoundError(f"File not found: {self.selected_file}")
             
-            self.root.after(0, lambda: self.set_progress(10, "Validating file...", "Verifying file integrity"))
-            time.sleep(0.3)
-            
             # Check if signatures are loaded
-            if not signatures:
+            scanner = engine.scanner
+            if not engine.signatures or scanner is None:
                 raise ValueError("No signatures loaded")
             
-            self.root.after(0, lambda: self.set_progress(15, "Loading signatures...", f"Loaded {len(signatures)} threat signatures"))
-            time.sleep(0.4)
-            
-            # Phase 2: Pre-scan setup (15-25%)
-            self.root.after(0, lambda: self.set_progress(20, "Preparing GPU scanner...", "Initializing CUDA cores"))
-            time.sleep(0.6)
-            
-            self.root.after(0, lambda: self.set_progress(25, "Allocating memory...", "Setting up GPU memory buffers"))
-            time.sleep(0.4)
-            
-            # Phase 3: File analysis (25-40%)
-            file_size = os.path.getsize(self.selected_file)
-            self.root.after(0, lambda: self.set_progress(30, "Analyzing file structure...", f"File size: {file_size:,} bytes"))
-            time.sleep(0.5)
-            
-            self.root.after(0, lambda: self.set_progress(35, "Reading file data...", "Loading file into memory"))
-            time.sleep(0.4)
-            
-            self.root.after(0, lambda: self.set_progress(40, "Preprocessing data...", "Converting to GPU format"))
-            time.sleep(0.3)
-            
-            # Phase 4: GPU Scanning (40-85%)
-            self.root.after(0, lambda: self.set_progress(45, "Starting GPU scan...", "Launching parallel scanning threads"))
-            time.sleep(0.5)
-            
-            # Simulate progressive scanning
-            scan_phases = [
-                (50, "Scanning for malware patterns...", "Checking signature database 1/4"),
-                (55, "Deep pattern analysis...", "Checking signature database 2/4"),
-                (60, "Behavioral analysis...", "Checking signature database 3/4"),
-                (65, "Heuristic scanning...", "Checking signature database 4/4"),
-                (70, "Cross-referencing threats...", "Analyzing pattern matches"),
-                (75, "Validating detections...", "Filtering false positives"),
-                (80, "Finalizing scan results...", "Compiling threat report")
-            ]
-            
-            for progress, status, detail in scan_phases:
-                self.root.after(0, lambda p=progress, s=status, d=detail: self.set_progress(p, s, d))
-                time.sleep(0.4)
-            
-            # Now perform the actual GPU scan
-            self.root.after(0, lambda: self.set_progress(85, "Processing with GPU...", "Running deep malware analysis"))
-            
-            # Call your actual GPU scanner
-            result = gpu_malware_scan(self.selected_file, signatures)
-            
-            # Phase 5: Results processing (85-100%)
-            self.root.after(0, lambda: self.set_progress(90, "Processing results...", "Analyzing scan findings"))
-            time.sleep(0.3)
+            # Pick up a signature DB updated by `pyt.py --update` since the last scan
+            if scanner.refresh():
+                print("Loaded updated signature generation")
             
-            self.root.after(0, lambda: self.set_progress(95, "Generating report...", "Preparing threat assessment"))
-            time.sleep(0.2)
+            # Every window the engine finishes moves the bar; Cancel stops it between windows
+            with METRICS.timer("frontend_scan_seconds"):
+                result = scanner.scan(self.selected_file, progress=self.on_scan_progress, cancel=self.cancel_event)
+            METRICS.write(METRICS_PATH)
             
             # Store the result
             self.scan_result = result
-            
             self.root.after(0, lambda: self.set_progress(100, "Scan complete!", "Analysis finished successfully"))
-            time.sleep(0.5)
+        
+        except ScanCancelled:
+            self.scan_result = {
+                'is_infected': False,
+                'matches_found': 0,
+                'cancelled': True,
+                'status': 'CANCELLED',
+                'file_path': self.selected_file,
+                'threat_names': []
+            }
             
         except Exception as e:
             print(f"Scan error: {e}")
@@ -496,13 +567,28 @@ class MalwareScannerApp:
             }
             
             self.root.after(0, lambda: self.set_progress(100, "Scan error occurred", f"Error: {str(e)[:50]}..."))
-            time.sleep(1)
         
         finally:
             self.scanning = False
             self.progress_animation_running = False
-            # Wait a moment to show 100% completion
-            self.root.after(1000, self.show_scan_results)
+            self.root.after(0, self.show_scan_results)
+    
+    def on_scan_progress(self, event):
+        """Progress callback of the scan thread: hand the event to the UI thread"""
+        if event.phase == "start":
+            status, detail = "Scanning...", f"File size: {event.bytes_total:,} bytes"
+        elif event.phase == "done":
+            status, detail = "Scan complete!", "Analysis finished successfully"
+        else:
+            status = "Scanning..."
+            detail = (f"{event.bytes_done / 2**20:,.1f} of {event.bytes_total / 2**20:,.1f} MB "
+                      f"(chunk {event.chunks_done}/{event.chunks_total})")
+        self.root.after(0, lambda: self.set_progress(event.fraction * 100, status, detail))
+    
+    def cancel_scan(self):
+        """Ask the running scan to stop after its current window"""
+        self.cancel_event.set()
+        self.set_progress(self.target_progress, "Cancelling...", "Stopping after the current chunk")
     
     def show_scan_results(self):
         """Show scan results in a new screen"""
@@ -533,8 +619,14 @@ class MalwareScannerApp:
         if hasattr(self, 'scan_result') and self.scan_result:
             result = self.scan_result
             
-            # Handle error case
-            if 'error' in result:
+            # Handle error and cancelled cases
+            if result.get('cancelled'):
+                result_icon = "⏹️"
+                result_color = "#6B7280"
+                result_title = "Scan Cancelled"
+                result_message = "The scan was stopped before it finished"
+                bg_color = "#F3F4F6"
+            elif 'error' in result:
                 result_icon = "❌"
                 result_color = "#EF4444"
                 result_title = "Scan Error"
@@ -632,7 +724,7 @@ class MalwareScannerApp:
         if hasattr(self, 'scan_result') and self.scan_result and 'scan_time' in self.scan_result:
             scan_stats = ctk.CTkLabel(
                 result_card,
-                text=f"Scan time: {self.scan_result['scan_time']:.2f}s | Signatures checked: {self.scan_result.get('signatures_checked', 'N/A'):,}",
+                text=f"Scan time: {self.scan_result['scan_time']:.2f}s | Signatures checked: {self.scan_result.get('signatures_checked', 'N/A'):,} | Engine: {self.scan_result.get('backend', 'gpu').upper()}",
                 font=ctk.CTkFont(size=12),
                 text_color="#6B7280"
             )
@@ -683,5 +775,13 @@ class MalwareScannerApp:
 
 # Run the application
 if __name__ == "__main__":
+    if "--profile-startup" in sys.argv:
+        # Time the engine load without a window: python frontend.py --profile-startup
+        engine.load()
+        print(format_startup_profile(engine.profile))
+        sys.exit(1 if engine.error else 0)
+    
+    # Load the engine while the window is built
+    engine.start()
     app = MalwareScannerApp()
     app.run()
\ No newline at end of file
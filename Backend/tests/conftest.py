@@ -0,0 +1,8 @@
+import os
+import sys
+
+BACKEND = os.path.join(os.path.dirname(__file__), '..')
+
+# The modules import each other through these folders, as the scripts do
+for folder in ('Code_to_get_signature', 'CPU', 'GPU', 'Daemon'):
+    sys.path.insert(0, os.path.join(BACKEND, folder))
@@ -0,0 +1,63 @@
+"""AhoCorasick against naive per-pattern search: counts, reported hits, streaming and persistence."""
+
+import numpy as np
+import pytest
+
+from aho_corasick import AhoCorasick
+
+# Shared prefixes, suffixes and patterns inside other patterns exercise the failure links
+PATTERNS = [b"he", b"she", b"his", b"hers", b"ab", b"abab", b"b", b"\x00\xff", b"\xff\xff\xff", b"she"]
+
+
+def naive_ends(data, pattern):
+    """End offsets of every (overlapping) occurrence of pattern in data."""
+    ends = []
+    pos = data.find(pattern)
+    while pos >= 0:
+        ends.append(pos + len(pattern))
+        pos = data.find(pattern, pos + 1)
+    return ends
+
+
+def sample(seed, size=5000):
+    rng = np.random.default_rng(seed)
+    alphabet = np.frombuffer(b"abehirs\x00\xff", dtype=np.uint8)
+    return rng.choice(alphabet, size).tobytes()
+
+
+@pytest.fixture(scope="module")
+def automaton():
+    return AhoCorasick(PATTERNS)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_counts_match_naive_search(automaton, seed):
+    data = sample(seed)
+    counts, _ = automaton.scan(data)
+    assert counts.tolist() == [len(naive_ends(data, p)) for p in PATTERNS]
+
+
+def test_reported_hits_are_every_occurrence(automaton):
+    data = sample(7)
+    report = np.zeros(len(PATTERNS), dtype=np.bool_)
+    report[[1, 5]] = True
+    _, _, hits = automaton.scan(data, report=report)
+    found = sorted(map(tuple, hits.tolist()))
+    assert found == sorted([(1, end) for end in naive_ends(data, b"she")] +
+                           [(5, end) for end in naive_ends(data, b"abab")])
+
+
+def test_state_carries_matches_across_chunks(automaton):
+    data = sample(3)
+    counts = None
+    state = 0
+    for start in range(0, len(data), 97):
+        counts, state = automaton.scan(data[start:start + 97], counts, state)
+    assert np.array_equal(counts, automaton.scan(data)[0])
+
+
+def test_arrays_round_trip(automaton):
+    data = sample(4)
+    restored = AhoCorasick(arrays=automaton.arrays())
+    assert np.array_equal(restored.scan(data)[0], automaton.scan(data)[0])
+    assert sorted(restored.patterns()) == sorted(PATTERNS)
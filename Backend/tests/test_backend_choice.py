@@ -0,0 +1,52 @@
+"""Backend choice: cost-based selection, the warm-up and kept malware_scan sessions."""
+
+import pytest
+
+import scanner as scanners
+from scanner import AutoScanner, BackendCost, choose_backend, malware_scan, OFFLOAD_MIN_FILE_SIZE
+from result_cache import ResultCache
+
+SIGNATURES = [
+    {"name": "Test.Mark", "type": 0, "offset": "*", "pattern": "c0debabe"},
+    {"name": "Test.Other", "type": 0, "offset": "*", "pattern": "feedfacecafef00d"},
+]
+
+
+def test_costs_without_the_host_matcher_are_rejected():
+    with pytest.raises(ValueError):
+        choose_backend(OFFLOAD_MIN_FILE_SIZE, 10, False, {"numba": BackendCost()})
+
+
+def test_small_inputs_stay_on_the_host():
+    costs = {"cpu": BackendCost(per_byte=1.0), "numba": BackendCost()}
+    assert choose_backend(OFFLOAD_MIN_FILE_SIZE - 1, 10, False, costs) == "cpu"
+    assert choose_backend(OFFLOAD_MIN_FILE_SIZE, 10, False, costs) == "numba"
+
+
+def test_warm_up_publishes_measured_costs():
+    auto = AutoScanner(SIGNATURES, backends=("cpu",))
+    assert auto.select(OFFLOAD_MIN_FILE_SIZE)[0] is auto.cpu
+    auto.warm_up(wait=True)
+    assert list(auto.costs) == ["cpu"]
+    assert auto.select(OFFLOAD_MIN_FILE_SIZE)[0] is auto.cpu
+
+
+def test_signature_objects_keep_their_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(scanners, "_object_sessions", type(scanners._object_sessions)())
+    target = tmp_path / "sample.bin"
+    target.write_bytes(bytes(64) + bytes.fromhex("c0debabe"))
+    first = ResultCache(str(tmp_path / "cache.db"))
+    assert malware_scan(str(target), SIGNATURES, cache=first, backend="cpu")["threat_names"] == ["Test.Mark"]
+    (session_signatures, session), = scanners._object_sessions.values()
+    assert session_signatures is SIGNATURES
+
+    # Same cache file through a new connection: the session is kept and rebound
+    second = ResultCache(str(tmp_path / "cache.db"))
+    result = malware_scan(str(target), SIGNATURES, cache=second, backend="cpu")
+    assert result["threat_names"] == ["Test.Mark"] and result.get("cached")
+    assert list(scanners._object_sessions.values()) == [(SIGNATURES, session)]
+    assert session.cache is second
+
+    # An equal but distinct list gets its own session
+    malware_scan(str(target), list(SIGNATURES), backend="cpu")
+    assert len(scanners._object_sessions) == 2
@@ -0,0 +1,48 @@
+"""Batched multi-file scans: one row per file, and no match across two files of a batch."""
+
+import numpy as np
+import pytest
+from numba import cuda
+
+import scanner as scanners
+from scanner import CPUScanner, NumbaScanner, Scanner
+
+MARK = bytes.fromhex("0badc0dedeadbeef")
+SIGNATURES = [
+    {"name": "Test.Mark", "type": 0, "offset": "*", "pattern": MARK.hex()},
+    {"name": "Test.Wild", "type": 0, "offset": "*", "pattern": "0bad??de"},
+    {"name": "Test.Gapped", "type": 0, "offset": "*", "pattern": "0badc0de*deadbeef"},
+]
+
+BACKENDS = [CPUScanner, NumbaScanner,
+            pytest.param(Scanner, marks=pytest.mark.skipif(not cuda.is_available(), reason="needs a CUDA device"))]
+
+
+def buffers():
+    # The halves of MARK end one buffer and start the next
+    return [b"\x00" * 8 + MARK[:4], MARK[4:] + b"\x00" * 8, MARK * 2, b"", b"\x11" * 3000 + MARK]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_buffers_are_scanned_apart(backend):
+    session = backend(SIGNATURES)
+    table = session.scan_batch_bytes(buffers())
+    expected = np.array([session.counts(data) for data in buffers()])
+    assert np.array_equal(table, expected)
+    assert table[:2].sum() == table[0, 1] == 1  # only the wildcard fits in the first half
+    assert table[2].tolist() == [2, 2, 1]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_file_batches_match_single_scans(backend, tmp_path, monkeypatch):
+    # A tiny small-file limit sends the last file through counts() on its own
+    monkeypatch.setattr(scanners, "SMALL_FILE_LIMIT", 1024)
+    paths = []
+    for i, data in enumerate(buffers()):
+        path = tmp_path / f"file{i}.bin"
+        path.write_bytes(data)
+        paths.append(str(path))
+    session = backend(SIGNATURES)
+    table = session.scan_batch(paths)
+    assert table.shape == (len(paths), len(SIGNATURES))
+    assert np.array_equal(table, session.scan_batch_bytes(buffers()))
@@ -0,0 +1,59 @@
+"""Directory sweeps: per-file verdicts, and failures that must not stop the sweep."""
+
+import json
+
+import numpy as np
+
+import directory_scanner
+from cpu_scanner_caller import build_signature_matcher
+from directory_scanner import scan_directory
+from parallel_scan import chunk_count, scan_patterns_parallel
+
+SIGNATURES = [{"name": "Test.Mark", "type": 0, "offset": "*", "pattern": "c0debabe"}]
+
+
+def _tree(tmp_path):
+    root = tmp_path / "tree"
+    (root / "sub").mkdir(parents=True)
+    (root / "clean.bin").write_bytes(bytes(128))
+    (root / "sub" / "infected.bin").write_bytes(bytes(16) + bytes.fromhex("c0debabe"))
+    signature_path = tmp_path / "signatures.json"
+    signature_path.write_text(json.dumps(SIGNATURES))
+    return root, str(signature_path)
+
+
+def test_sweep_reports_infected_files(tmp_path):
+    root, signature_path = _tree(tmp_path)
+    summary = scan_directory(str(root), signature_path, workers=1)
+    assert summary["files_scanned"] == 2
+    assert summary["infected"] == {str(root / "sub" / "infected.bin"): ["Test.Mark"]}
+    assert summary["errors"] == {}
+
+
+def test_sweep_after_numba_threads_started(tmp_path):
+    # A forked worker would inherit the prange pool's locks held by threads it doesn't have
+    data = np.zeros(1 << 18, dtype=np.uint8)
+    ranges = np.array([[0, 1]], dtype=np.int64)
+    scan_patterns_parallel(data, len(data), np.zeros(1, np.uint8), np.full(1, 0xFF, np.uint8),
+                           np.array([0, 1], dtype=np.int64), ranges, 0, chunk_count(len(data)))
+    root, signature_path = _tree(tmp_path)
+    assert scan_directory(str(root), signature_path, workers=2)["files_scanned"] == 2
+
+
+def test_a_failing_file_becomes_its_error(tmp_path, monkeypatch):
+    root, signature_path = _tree(tmp_path)
+    monkeypatch.setattr(directory_scanner, "_worker_matcher", build_signature_matcher(signature_path))
+    broken = str(root / "clean.bin")
+    scan_result = directory_scanner._scan_result
+
+    def failing(path, targets):
+        if path == broken:
+            raise ValueError("malformed header")
+        return scan_result(path, targets)
+
+    monkeypatch.setattr(directory_scanner, "_scan_result", failing)
+    assert directory_scanner._scan_one(broken) == (broken, None, "ValueError: malformed header", 0.0)
+    path, result, error, _ = directory_scanner._scan_one(str(root / "sub" / "infected.bin"))
+    assert error is None and result["threat_names"] == ["Test.Mark"]
+    missing = str(root / "gone.bin")
+    assert directory_scanner._scan_one(missing)[2].startswith("FileNotFoundError")
@@ -0,0 +1,61 @@
+"""Metrics registry: disabled no-ops, Prometheus text and JSON snapshots."""
+
+import json
+
+from metrics import Metrics
+
+
+def test_disabled_registry_records_nothing():
+    metrics = Metrics()
+    metrics.inc("files_scanned_total", backend="cpu")
+    metrics.record_scan("cpu", 100, 5, 1, 0.01)
+    with metrics.timer("scan_seconds", backend="cpu") as timer:
+        pass
+    assert timer.elapsed == 0.0
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {} and snapshot["histograms"] == {}
+
+    # A trace still keeps its phases for the scan's own report
+    trace = metrics.trace("cpu")
+    with trace.phase("read"):
+        pass
+    assert list(trace.as_dict()) == ["read"]
+
+
+def test_prometheus_text_has_cumulative_buckets():
+    metrics = Metrics(enabled=True)
+    metrics.record_scan("cpu", 5000, 10, 2, 0.003)
+    metrics.record_scan("cpu", 5000, 10, 0, 0.2)
+    metrics.record_scan("gpu", 1 << 20, 10, 1, 0.02, cached=True)
+    lines = metrics.to_prometheus().splitlines()
+
+    assert "# TYPE files_scanned_total counter" in lines
+    assert 'files_scanned_total{backend="cpu"} 2' in lines
+    assert 'bytes_scanned_total{backend="cpu"} 10000' in lines
+    assert 'matches_total{backend="cpu"} 2' in lines
+    assert 'cache_hits_total{backend="gpu"} 1' in lines
+    assert 'scan_seconds_bucket{backend="cpu",le="0.005"} 1' in lines
+    assert 'scan_seconds_bucket{backend="cpu",le="0.25"} 2' in lines
+    assert 'scan_seconds_bucket{backend="cpu",le="+Inf"} 2' in lines
+    assert 'scan_seconds_count{backend="cpu"} 2' in lines
+    buckets = [int(line.rsplit(" ", 1)[1]) for line in lines if line.startswith("file_size_bytes_bucket")]
+    assert buckets == sorted(buckets) and buckets[-1] == 2
+
+
+def test_json_and_prometheus_files(tmp_path):
+    metrics = Metrics(enabled=True)
+    trace = metrics.trace("numba")
+    with trace.phase("match"):
+        pass
+    trace.finish(4096, 3, 1)
+
+    metrics.write(str(tmp_path / "scan.json"))
+    snapshot = json.loads((tmp_path / "scan.json").read_text())
+    assert snapshot["counters"]["files_scanned_total"] == [{"labels": {"backend": "numba"}, "value": 1}]
+    phases = snapshot["histograms"]["scan_phase_seconds"]
+    assert phases[0]["labels"] == {"backend": "numba", "phase": "match"} and phases[0]["count"] == 1
+
+    metrics.write(str(tmp_path / "scan.prom"))
+    text = (tmp_path / "scan.prom").read_text()
+    assert 'scan_phase_seconds_count{backend="numba",phase="match"} 1' in text
+    assert not list(tmp_path.glob("*.tmp"))
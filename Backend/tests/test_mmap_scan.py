@@ -0,0 +1,116 @@
+"""Scanning memory-mapped input in place: windows, page release and caller-owned maps."""
+
+import json
+import mmap
+import os
+
+import numpy as np
+import pytest
+
+from file_utils import iter_buffer_windows, iter_mapped_windows, map_file, open_mapped
+from cpu_scanner_caller import scan_file
+from pattern_matcher import SignatureMatcher
+from scanner import CPUScanner
+
+PATTERN = bytes.fromhex("0badc0dedeadbeef")
+SIGNATURES = [
+    {"name": "Test.Literal", "type": 0, "offset": "*", "pattern": PATTERN.hex()},
+    {"name": "Test.Gapped", "type": 0, "offset": "*", "pattern": "0badc0de{0-4}deadbeef"},
+    {"name": "Test.Absent", "type": 0, "offset": "*", "pattern": "feedfacecafef00d"},
+]
+CHUNK = 3 * mmap.PAGESIZE
+SIZE = 16 * mmap.PAGESIZE
+
+
+def planted(size=SIZE, step=mmap.PAGESIZE):
+    # One copy across every page boundary, so some straddle window boundaries
+    data = bytearray(size)
+    for boundary in range(step, size, step):
+        data[boundary - 3:boundary - 3 + len(PATTERN)] = PATTERN
+    return data
+
+
+@pytest.fixture
+def scanner():
+    return CPUScanner(SIGNATURES, chunk_size=CHUNK)
+
+
+@pytest.fixture
+def sample(tmp_path):
+    path = tmp_path / "sample.bin"
+    path.write_bytes(planted())
+    return str(path)
+
+
+def matched(result):
+    return dict(result["matched_signatures"])
+
+
+@pytest.mark.parametrize("release", [False, True])
+def test_mapped_windows_are_the_buffer_windows(sample, release):
+    expected = [(base, new_start, bytes(window))
+                for base, new_start, window in iter_buffer_windows(planted(), 100, CHUNK)]
+    with map_file(sample) as mapped:
+        windows = [(base, new_start, bytes(window))
+                   for base, new_start, window in iter_mapped_windows(mapped, 100, CHUNK, release)]
+        assert bytes(mapped) == bytes(planted())
+    assert windows == expected
+
+
+def test_empty_file_maps_to_no_bytes(tmp_path):
+    path = tmp_path / "empty.bin"
+    path.write_bytes(b"")
+    assert open_mapped(str(path)) == b""
+    assert list(iter_mapped_windows(b"", 10, CHUNK)) == [(0, 0, memoryview(b""))]
+
+
+def test_path_scan_matches_in_memory_scan(scanner, sample):
+    streamed = matched(scanner.scan(sample))
+    assert streamed == {"Test.Literal": 15, "Test.Gapped": 15}
+    assert matched(scanner.scan_bytes(bytes(planted()))) == streamed
+
+
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview, lambda b: np.frombuffer(bytes(b), dtype=np.uint8)])
+def test_buffer_types_scan_alike(scanner, wrap):
+    assert matched(scanner.scan_bytes(wrap(planted()))) == {"Test.Literal": 15, "Test.Gapped": 15}
+
+
+def test_caller_copy_on_write_map_is_left_intact(scanner, tmp_path):
+    # The file is clean; the matches only exist in the caller's private pages,
+    # which MADV_DONTNEED would silently throw away
+    path = tmp_path / "clean.bin"
+    path.write_bytes(bytes(SIZE))
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    try:
+        mapped[:] = planted()
+        first = scanner.counts(mapped).tolist()
+        assert bytes(mapped) == bytes(planted())
+        assert matched(scanner.scan_bytes(mapped)) == {"Test.Literal": 15, "Test.Gapped": 15}
+        assert bytes(mapped) == bytes(planted())
+        assert scanner.counts(mapped).tolist() == first == [15, 15, 0]
+    finally:
+        mapped.close()
+
+
+def _mapped(path):
+    with open("/proc/self/maps") as f:
+        return os.path.realpath(path) in f.read()
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/maps"), reason="needs /proc/self/maps")
+def test_failed_scan_leaves_no_mapping_behind(sample, tmp_path, monkeypatch):
+    signature_path = tmp_path / "signatures.json"
+    signature_path.write_text(json.dumps(SIGNATURES))
+    assert scan_file(sample, str(signature_path))["matches_found"] == 2
+    assert not _mapped(sample)
+
+    def broken(self, data):
+        raise RuntimeError("matcher failed")
+
+    monkeypatch.setattr(SignatureMatcher, "scan", broken)
+    # The traceback keeps the scan's frame (and its locals) alive
+    with pytest.raises(RuntimeError) as failure:
+        scan_file(sample, str(signature_path))
+    assert failure.traceback
+    assert not _mapped(sample)
@@ -0,0 +1,98 @@
+"""NDB converter: reject categories, line-aligned ranges and range-independent output."""
+
+import json
+
+import numpy as np
+import pytest
+
+import ndb_convert
+from ndb_convert import convert_ndb, format_report, normalize_ndb_line, split_ranges
+from parallel_scan import scan_patterns_parallel
+from signature_stream import stream_signatures
+
+
+@pytest.mark.parametrize("line, category", [
+    ("Sig.Short:0:*\n", "malformed"),
+    (" :0:*:deadbeef\n", "empty_name"),
+    ("Sig.Type:x1:*:deadbeef\n", "bad_type"),
+    ("Sig.Body:0:*:  \n", "empty_body"),
+    ("Sig.Odd:0:*:deadbee\n", "invalid_hex"),
+    ("Sig.Hex:0:*:deadbeeg\n", "invalid_hex"),
+    ("Sig.Gap:0:*:dead{4-2}beef\n", "invalid_pattern"),
+    ("Sig.Alt:0:*:dead(be|\n", "invalid_pattern"),
+])
+def test_rejected_lines_get_their_category(line, category):
+    assert normalize_ndb_line(line) == (None, category)
+
+
+@pytest.mark.parametrize("line", ["\n", "   \n", "# comment:0:*:deadbeef\n"])
+def test_blank_and_comment_lines_are_skipped(line):
+    assert normalize_ndb_line(line) == (None, None)
+
+
+def test_accepted_lines_are_normalized():
+    assert normalize_ndb_line(" Sig.Ok : 1 ::DEAD??BEEF{2-4}(01|02)*00 :73\r\n") == (
+        {"name": "Sig.Ok", "type": "1", "offset": "*", "pattern": "dead??beef{2-4}(01|02)*00"}, None)
+
+
+def ndb_file(path, count=400):
+    lines = []
+    for i in range(count):
+        if i % 10 == 3:
+            lines.append(f"Sig.Bad{i}:0:*:abc\n".encode())
+        elif i % 10 == 7:
+            lines.append(b"Sig.Latin\xe9:0:*:deadbeef\n")
+        else:
+            lines.append(f"Sig.{i}:{i % 7}:EOF-{i}:{i:08x}??{(i * 7919) % 65536:04x}\n".encode())
+    path.write_bytes(b"".join(lines))
+    return str(path)
+
+
+def test_ranges_start_on_lines_and_cover_the_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(ndb_convert, "MIN_RANGE_BYTES", 100)
+    path = ndb_file(tmp_path / "main.ndb")
+    data = open(path, "rb").read()
+    ranges = split_ranges(path, 9)
+    assert len(ranges) == 9
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start and data[start - 1:start] == b"\n"
+
+
+@pytest.mark.parametrize("jsonl", [False, True])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_split_conversion_matches_a_single_range(tmp_path, monkeypatch, jsonl, workers):
+    path = ndb_file(tmp_path / "main.ndb")
+    suffix = ".jsonl" if jsonl else ".json"
+    whole = convert_ndb(path, str(tmp_path / ("whole" + suffix)), workers=1)
+    monkeypatch.setattr(ndb_convert, "MIN_RANGE_BYTES", 64)
+    split = convert_ndb(path, str(tmp_path / ("split" + suffix)), workers=workers)
+
+    assert split == whole
+    assert whole["accepted"] == 320 and whole["rejected"]["invalid_hex"] == 40
+    assert whole["rejected"]["encoding"] == 40 and whole["rejected_total"] == 80
+    assert len(whole["examples"]["encoding"]) == ndb_convert.REJECT_EXAMPLES
+    assert list(stream_signatures(str(tmp_path / ("split" + suffix)))) == \
+        list(stream_signatures(str(tmp_path / ("whole" + suffix))))
+    if not jsonl:
+        assert len(json.load(open(tmp_path / "split.json"))) == 320
+    assert not list(tmp_path.glob("*.part*")) and not list(tmp_path.glob("*.tmp"))
+    assert "invalid_hex: 40" in format_report(split)
+
+
+def test_no_accepted_lines_give_an_empty_array(tmp_path):
+    path = tmp_path / "bad.ndb"
+    path.write_text("Sig.A:0:*:zz\n# only a comment\n")
+    report = convert_ndb(str(path), str(tmp_path / "out.json"), workers=1)
+    assert report["accepted"] == 0 and report["rejected_total"] == 1
+    assert json.load(open(tmp_path / "out.json")) == []
+
+
+def test_pool_after_numba_threads_started(tmp_path, monkeypatch):
+    # Forked workers would inherit the prange pool's held locks and never finish
+    data = np.zeros(1 << 18, dtype=np.uint8)
+    scan_patterns_parallel(data, len(data), np.zeros(1, np.uint8), np.full(1, 0xFF, np.uint8),
+                           np.array([0, 1], dtype=np.int64), np.array([[0, 1]], dtype=np.int64), 0, 1)
+    monkeypatch.setattr(ndb_convert, "MIN_RANGE_BYTES", 64)
+    path = ndb_file(tmp_path / "main.ndb")
+    assert convert_ndb(path, str(tmp_path / "out.jsonl"), workers=2)["accepted"] == 320
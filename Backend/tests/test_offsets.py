@@ -0,0 +1,100 @@
+"""EP / EOF / section offsets resolved on small hand-built PE and ELF files."""
+
+import struct
+
+import numpy as np
+import pytest
+
+from file_types import classify, TARGET_ELF, TARGET_PE
+from ndb_offset import parse_executable
+from pattern_matcher import SignatureMatcher
+
+MARK = bytes.fromhex("c0debabe")
+
+
+def make_pe():
+    """PE32 with .text (raw 0x200, entry point at +0x10) and .data (raw 0x300)."""
+    data = bytearray(0x400)
+    data[:2] = b"MZ"
+    struct.pack_into("<I", data, 0x3C, 0x80)
+    data[0x80:0x84] = b"PE\0\0"
+    struct.pack_into("<H", data, 0x80 + 6, 2)     # sections
+    struct.pack_into("<H", data, 0x80 + 20, 0xE0)  # optional header size
+    optional = 0x80 + 24
+    struct.pack_into("<I", data, optional + 16, 0x1010)  # entry point RVA
+    table = optional + 0xE0
+    for i, (name, rva, raw) in enumerate([(b".text", 0x1000, 0x200), (b".data", 0x2000, 0x300)]):
+        entry = table + 40 * i
+        data[entry:entry + len(name)] = name
+        struct.pack_into("<IIII", data, entry + 8, 0x100, rva, 0x100, raw)
+    return data
+
+
+def make_elf():
+    """ELF64 with one PT_LOAD over the file, entry point at 0x200, .text at 0x200 and .data at 0x300."""
+    data = bytearray(0x400)
+    data[:6] = b"\x7fELF\x02\x01"
+    struct.pack_into("<QQQ", data, 24, 0x400200, 0x40, 0x100)  # entry, phoff, shoff
+    struct.pack_into("<HHHH", data, 54, 56, 1, 64, 3)          # phentsize, phnum, shentsize, shnum
+    struct.pack_into("<IIQQQQ", data, 0x40, 1, 5, 0, 0x400000, 0x400000, 0x400)
+    for i, (sh_type, offset, size) in enumerate([(0, 0, 0), (1, 0x200, 0x80), (1, 0x300, 0x40)]):
+        struct.pack_into("<IIQQQQ", data, 0x100 + 64 * i, 0, sh_type, 0, 0, offset, size)
+    return data
+
+
+def offset_matcher(specs, types=None):
+    names = [f"at {spec}" for spec in specs]
+    if types is not None:
+        types = np.array(types, dtype=np.int16)
+    return SignatureMatcher(names, [MARK.hex()] * len(specs), offsets=specs, types=types)
+
+
+def counts_by_spec(matcher, data):
+    return dict(zip(matcher.names, matcher.scan(bytes(data)).tolist()))
+
+
+def test_headers_are_parsed():
+    pe = parse_executable(bytes(make_pe()))
+    assert (pe.entry_point, pe.sections[1][0]) == (0x210, 0x300)
+    elf = parse_executable(bytes(make_elf()))
+    assert (elf.entry_point, elf.sections[0][0]) == (0x200, 0x200)
+    assert classify(make_pe()) == tuple(sorted({0, TARGET_PE}))
+    assert classify(make_elf()) == tuple(sorted({0, TARGET_ELF}))
+
+
+@pytest.mark.parametrize("build, planted, expected", [
+    (make_pe, 0x210, {"EP+0", "EP+0,8", "SE0", "*"}),
+    (make_pe, 0x218, {"EP+8", "EP+0,8", "SE0", "*"}),
+    (make_pe, 0x308, {"S1+8", "SL+8", "SE1", "*"}),
+    (make_pe, 0x3FC, {"EOF-4", "SL+252", "SE1", "*"}),
+    (make_pe, 0x50, {"80", "*"}),
+    (make_elf, 0x200, {"EP+0", "EP+0,8", "S0+0", "SE0", "*"}),
+    (make_elf, 0x308, {"S1+8", "SL+8", "SE1", "*"}),
+    (make_elf, 0x3FC, {"EOF-4", "SL+252", "*"}),  # past .data: SE1 misses
+])
+def test_offset_bound_signatures_match_only_at_their_offset(build, planted, expected):
+    specs = ["*", "80", "EOF-4", "EP+0", "EP+8", "EP+0,8", "S0+0", "S1+8", "SL+8", "SL+252", "SE0", "SE1"]
+    data = build()
+    data[planted:planted + len(MARK)] = MARK
+    counts = counts_by_spec(offset_matcher(specs), data)
+    assert {name[3:] for name, count in counts.items() if count} == expected
+
+
+def test_ep_offsets_need_an_executable():
+    data = bytearray(0x400)
+    data[0x10:0x14] = MARK
+    counts = counts_by_spec(offset_matcher(["EP+16", "S0+16", "*"]), data)
+    assert counts == {"at EP+16": 0, "at S0+16": 0, "at *": 1}
+
+
+@pytest.mark.parametrize("spec, planted, found", [
+    ("EP-1024,1100", 0x10, True),    # window starts before the file: clipped to 0
+    ("EP-1024,1100", 0x260, False),  # past the window's end
+    ("EOF-2000,1200", 0x50, True),   # file shorter than n
+    ("EOF-2000", 0x0, False),        # whole window before the file
+    ("1020,100", 0x3FC, True),       # starts inside, window reaches past EOF
+])
+def test_windows_reaching_outside_the_file_are_clipped(spec, planted, found):
+    data = make_pe()
+    data[planted:planted + len(MARK)] = MARK
+    assert counts_by_spec(offset_matcher([spec]), data)[f"at {spec}"] == int(found)
@@ -0,0 +1,71 @@
+"""Numba prange backend against the Aho-Corasick engine and the host scanner."""
+
+import numpy as np
+import pytest
+
+from aho_corasick import AhoCorasick
+from parallel_scan import scan_patterns_parallel
+from scanner import CPUScanner, NumbaScanner
+
+PATTERNS = [b"\x01\x02", b"\x01\x02\x01", b"\x02\x02\x02", b"\x00\x01\x02\x03", b"\x03", b"\x03\x03\x01\x00\x02"]
+
+
+def packed(patterns, masks=None):
+    offsets = np.zeros(len(patterns) + 1, dtype=np.int64)
+    np.cumsum([len(p) for p in patterns], out=offsets[1:])
+    values = np.frombuffer(b"".join(patterns), dtype=np.uint8)
+    masks = np.full(len(values), 0xFF, dtype=np.uint8) if masks is None else masks
+    return values, masks, offsets
+
+
+def parallel_counts(data, values, masks, offsets, min_end=0, chunks=1, ranges=None):
+    if ranges is None:
+        ranges = np.array([[0, len(offsets) - 1]], dtype=np.int64)
+    return scan_patterns_parallel(data, len(data), values, masks, offsets, ranges, min_end, chunks)
+
+
+@pytest.fixture(scope="module")
+def data():
+    return np.random.default_rng(0).integers(0, 4, 50000, dtype=np.uint8)
+
+
+@pytest.mark.parametrize("chunks", [1, 3, 8])
+def test_literal_counts_match_aho_corasick(data, chunks):
+    values, masks, offsets = packed(PATTERNS)
+    expected, _ = AhoCorasick(PATTERNS).scan(data)
+    assert parallel_counts(data, values, masks, offsets, chunks=chunks).tolist() == expected.tolist()
+
+
+def test_masked_bytes_and_stream_rules(data):
+    # 0x01 ?? 0x0? : mask 0x00 is '??', 0xF0 keeps the high nibble
+    values, masks, offsets = packed([b"\x01\x00\x00"], np.array([0xFF, 0x00, 0xF0], dtype=np.uint8))
+    windows = np.lib.stride_tricks.sliding_window_view(data, 3)
+    starts = np.flatnonzero((windows[:, 0] == 1) & (windows[:, 2] < 0x10))
+    assert parallel_counts(data, values, masks, offsets, chunks=4).tolist() == [len(starts)]
+    assert parallel_counts(data, values, masks, offsets, min_end=20000).tolist() == [np.count_nonzero(starts + 3 > 20000)]
+
+
+def test_ranges_limit_the_patterns_tried(data):
+    values, masks, offsets = packed(PATTERNS)
+    expected, _ = AhoCorasick(PATTERNS).scan(data)
+    counts = parallel_counts(data, values, masks, offsets, ranges=np.array([[1, 3]], dtype=np.int64))
+    assert counts.tolist() == [0, expected[1], expected[2], 0, 0, 0]
+
+
+def test_numba_scanner_reports_like_the_host_scanner(tmp_path):
+    signatures = [
+        {"name": "Test.Literal", "type": 0, "offset": "*", "pattern": "0badc0dedeadbeef"},
+        {"name": "Test.Wild", "type": 0, "offset": "*", "pattern": "0bad??de"},
+        {"name": "Test.Gapped", "type": 0, "offset": "*", "pattern": "0badc0de{0-4}deadbeef"},
+        {"name": "Test.Absent", "type": 0, "offset": "*", "pattern": "feedfacecafef00d"},
+    ]
+    data = bytearray(np.random.default_rng(1).integers(0, 256, 200000, dtype=np.uint8).tobytes())
+    for pos in range(1000, len(data) - 100, 17000):
+        data[pos:pos + 8] = bytes.fromhex("0badc0dedeadbeef")
+    path = tmp_path / "sample.bin"
+    path.write_bytes(data)
+    numba_result = NumbaScanner(signatures, chunk_size=65536).scan(str(path))
+    cpu_result = CPUScanner(signatures, chunk_size=65536).scan(str(path))
+    assert numba_result["matched_signatures"] == cpu_result["matched_signatures"]
+    assert dict(numba_result["matched_signatures"])["Test.Literal"] == 12
+    assert numba_result["backend"] == "numba"
@@ -0,0 +1,144 @@
+"""SignatureMatcher against a regex oracle of the NDB body syntax."""
+
+import re
+
+import numpy as np
+import pytest
+
+from ndb_pattern import candidate_starts, compile_pattern, match_part_at
+from pattern_matcher import SignatureMatcher
+
+BODIES = [
+    "deadbeef",                      # literal
+    "de??beef",                      # any byte
+    "dea?be?f",                      # high nibble / low nibble
+    "d?ad??ef",
+    "6a617661{2-4}c0ffee",           # bounded gap
+    "6a617661{-3}c0ffee",
+    "6a617661{3}c0ffee",
+    "cafe(0102|aabbcc)babe",         # alternation
+    "0badf00d*feedface",             # unbounded gap: two parts
+    "0badf00d{4-}feedface",
+    "11223344*(5566|7788)*99aabbcc", # three parts
+    "d?a?b?e?",                      # no literal byte: no anchor
+    "?e{1-3}a?(b1|c2)",
+    "0badf00d*c?f?{0-2}e?",          # anchorless second part
+]
+
+
+def ndb_regex(body):
+    """Regex over bytes equivalent to an NDB body."""
+    out = []
+    i = 0
+    while i < len(body):
+        c = body[i]
+        if c == "*":
+            out.append(b".*")
+            i += 1
+        elif c in "{[":
+            close = body.index("}" if c == "{" else "]", i)
+            lo, sep, hi = body[i + 1:close].partition("-")
+            if not sep:
+                out.append(b".{%d}" % int(lo))
+            else:
+                out.append(b".{%d,%s}" % (int(lo or 0), hi.encode()))
+            i = close + 1
+        elif c == "(":
+            close = body.index(")", i)
+            options = [ndb_regex(option) for option in body[i + 1:close].split("|")]
+            out.append(b"(?:" + b"|".join(options) + b")")
+            i = close + 1
+        else:
+            out.append(_byte_class(body[i:i + 2]))
+            i += 2
+    return b"".join(out)
+
+
+def _byte_class(pair):
+    if pair == "??":
+        return b"."
+    if "?" not in pair:
+        return re.escape(bytes.fromhex(pair))
+    values = [int(pair[0] + h, 16) if pair[1] == "?" else int(h + pair[1], 16) for h in "0123456789abcdef"]
+    return b"[" + b"".join(re.escape(bytes([v])) for v in values) + b"]"
+
+
+def planted_data(seed, size=20000, copies=6):
+    """Random bytes with every body's literal form (wildcards filled in) planted a few times."""
+    rng = np.random.default_rng(seed)
+    data = bytearray(rng.integers(0, 256, size, dtype=np.uint8).tobytes())
+    for body in BODIES:
+        sample = _instance(body, rng)
+        for _ in range(copies):
+            pos = int(rng.integers(0, size - len(sample)))
+            data[pos:pos + len(sample)] = sample
+    return bytes(data)
+
+
+def _instance(body, rng):
+    """One byte string matching body: wildcards random, gaps at their minimum (plus a few bytes for '*')."""
+    out = bytearray()
+    i = 0
+    while i < len(body):
+        c = body[i]
+        if c == "*":
+            out += rng.integers(0, 256, 5, dtype=np.uint8).tobytes()
+            i += 1
+        elif c in "{[":
+            close = body.index("}" if c == "{" else "]", i)
+            lo = body[i + 1:close].partition("-")[0]
+            out += rng.integers(0, 256, int(lo or 0), dtype=np.uint8).tobytes()
+            i = close + 1
+        elif c == "(":
+            close = body.index(")", i)
+            out += _instance(body[i + 1:close].split("|")[0], rng)
+            i = close + 1
+        else:
+            pair = body[i:i + 2]
+            hi = pair[0] if pair[0] != "?" else "%x" % rng.integers(16)
+            lo = pair[1] if pair[1] != "?" else "%x" % rng.integers(16)
+            out.append(int(hi + lo, 16))
+            i += 2
+    return bytes(out)
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return SignatureMatcher([f"sig{i}" for i in range(len(BODIES))], BODIES)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_agree_with_regex_oracle(matcher, seed):
+    data = planted_data(seed)
+    counts = matcher.scan(data)
+    for i, body in enumerate(BODIES):
+        found = re.search(ndb_regex(body), data, re.DOTALL) is not None
+        assert (counts[i] > 0) == found, body
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_fixed_length_counts_match_every_start(matcher, seed):
+    data = planted_data(seed)
+    counts = matcher.scan(data)
+    for i, body in enumerate(BODIES):
+        if i not in (0, 1, 2, 3, 11):
+            continue
+        starts = len(re.findall(b"(?=" + ndb_regex(body) + b")", data, re.DOTALL))
+        assert counts[i] == starts, body
+
+
+@pytest.mark.parametrize("body", ["d?a?b?e?", "?e{1-3}a?(b1|c2)", "{2}c?f?", "(a?|?b){0-4}??1?"])
+def test_anchorless_candidates_keep_every_match(body):
+    data = planted_data(3, size=4000)
+    part = compile_pattern(body).parts[0]
+    assert part.anchor is None
+    every = [pos for pos in range(len(data) - part.min_len + 1) if match_part_at(part, data, pos) is not None]
+    candidates = candidate_starts(part, data).tolist()
+    assert set(every) <= set(candidates)
+    assert len(candidates) < len(data) // 4
+    assert [pos for pos in candidate_starts(part, data, 1000).tolist()
+            if match_part_at(part, data, pos) is not None] == [pos for pos in every if pos >= 1000]
+
+
+def test_no_match_in_clean_data(matcher):
+    assert not matcher.scan(bytes(4096)).any()
@@ -0,0 +1,100 @@
+"""4-gram prefilter: no false negatives against brute-force matching of the packed patterns."""
+
+import numpy as np
+import pytest
+
+from qgram_filter import literal_gram_offsets, QGramFilter, Q
+
+
+def packed(patterns):
+    """CSR-pack (values, masks) pairs like signature_loader does."""
+    offsets = np.zeros(len(patterns) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v, _ in patterns], out=offsets[1:])
+    values = np.frombuffer(b"".join(v for v, _ in patterns), dtype=np.uint8)
+    masks = np.frombuffer(b"".join(m for _, m in patterns), dtype=np.uint8)
+    return values, masks, offsets
+
+
+def random_patterns(rng, count=60):
+    """Patterns over a small alphabet (so they recur), some with wildcard bytes and nibbles."""
+    patterns = []
+    for _ in range(count):
+        length = int(rng.integers(2, 12))
+        masks = rng.choice(np.array([0xFF, 0xFF, 0xFF, 0xFF, 0x00, 0xF0], dtype=np.uint8), length)
+        values = rng.integers(0, 4, length, dtype=np.uint8) & masks
+        patterns.append((values.tobytes(), masks.tobytes()))
+    return patterns
+
+
+def match_starts(data, v, m):
+    windows = np.lib.stride_tricks.sliding_window_view(data, len(v))
+    return np.flatnonzero(((windows & m) == v).all(axis=1))
+
+
+def brute_counts(data, values, masks, offsets, min_end=0):
+    counts = np.zeros(len(offsets) - 1, dtype=np.int64)
+    for s in range(len(counts)):
+        v, m = values[offsets[s]:offsets[s + 1]], masks[offsets[s]:offsets[s + 1]]
+        counts[s] = np.count_nonzero(match_starts(data, v, m) + len(v) > min_end)
+    return counts
+
+
+def test_gram_offsets_find_the_first_literal_run():
+    values, masks, offsets = packed([
+        (bytes(6), b"\xff" * 6),
+        (bytes(6), b"\x00\xff\xff\xff\xff\x00"),
+        (bytes(6), b"\xff\xff\xff\x00\xff\xff"),
+        (bytes(3), b"\xff" * 3),
+    ])
+    assert literal_gram_offsets(values, masks, offsets).tolist() == [0, 1, -1, -1]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_filtered_counts_have_no_false_negatives(seed):
+    rng = np.random.default_rng(seed)
+    values, masks, offsets = packed(random_patterns(rng))
+    gram_offsets = literal_gram_offsets(values, masks, offsets)
+    prefilter = QGramFilter(values, masks, offsets, gram_offsets)
+    assert len(prefilter) > 0
+    data = rng.integers(0, 4, 3000, dtype=np.uint8)
+
+    expected = brute_counts(data, values, masks, offsets)
+    counts = prefilter.count(data)
+    filtered = gram_offsets >= 0
+    assert counts[filtered].tolist() == expected[filtered].tolist()
+    assert not counts[~filtered].any()
+
+    # Every match start is among the candidates (shifted by its gram offset)
+    positions = set(prefilter.candidates(data)[0].tolist())
+    for s in np.flatnonzero(filtered & (expected > 0)):
+        v, m = values[offsets[s]:offsets[s + 1]], masks[offsets[s]:offsets[s + 1]]
+        assert set((match_starts(data, v, m) + gram_offsets[s]).tolist()) <= positions
+
+
+def test_min_end_and_active_limit_the_counts():
+    rng = np.random.default_rng(9)
+    values, masks, offsets = packed(random_patterns(rng))
+    gram_offsets = literal_gram_offsets(values, masks, offsets)
+    prefilter = QGramFilter(values, masks, offsets, gram_offsets)
+    data = rng.integers(0, 4, 2000, dtype=np.uint8)
+    filtered = gram_offsets >= 0
+
+    expected = brute_counts(data, values, masks, offsets, min_end=1000)
+    assert prefilter.count(data, min_end=1000)[filtered].tolist() == expected[filtered].tolist()
+
+    active = np.zeros(len(offsets) - 1, dtype=np.bool_)
+    active[::2] = True
+    counts = prefilter.count(data, active=active)
+    assert not counts[~active].any()
+    assert counts[active & filtered].tolist() == brute_counts(data, values, masks, offsets)[active & filtered].tolist()
+
+
+def test_stats_account_for_every_offset():
+    values, masks, offsets = packed([(b"\x01\x02\x03\x04\x05", b"\xff" * 5)])
+    prefilter = QGramFilter(values, masks, offsets, literal_gram_offsets(values, masks, offsets))
+    data = np.zeros(1000, dtype=np.uint8)
+    data[500:505] = [1, 2, 3, 4, 5]
+    stats = prefilter.new_stats()
+    assert prefilter.count(data, stats=stats).tolist() == [1]
+    assert stats.positions == len(data) - Q + 1
+    assert 1 <= stats.candidates < 10
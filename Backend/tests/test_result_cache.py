@@ -0,0 +1,123 @@
+"""ResultCache: hits, invalidation by content and signature set, LRU eviction."""
+
+import os
+
+import pytest
+
+from result_cache import ResultCache, signature_fingerprint
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def sample(tmp_path):
+    path = tmp_path / "sample.bin"
+    path.write_bytes(b"MZ" + bytes(1000))
+    return str(path)
+
+
+class Counter:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        return self.result
+
+
+def test_unchanged_file_is_answered_from_the_cache(cache, sample):
+    scan = Counter({"matches": ["a"]})
+    assert cache.scan(sample, "fp", scan) == {"matches": ["a"]}
+    assert cache.scan(sample, "fp", scan) == {"matches": ["a"], "cached": True}
+    assert scan.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_changed_content_is_rescanned(cache, sample):
+    scan = Counter(["a"])
+    cache.scan(sample, "fp", scan, kind="names")
+    with open(sample, "r+b") as f:
+        f.write(b"ZM")
+    os.utime(sample, ns=(1, 1))
+    cache.scan(sample, "fp", scan, kind="names")
+    assert scan.calls == 2
+
+
+def test_copies_share_the_verdict(cache, sample, tmp_path):
+    copy = tmp_path / "copy.bin"
+    copy.write_bytes(open(sample, "rb").read())
+    scan = Counter(["a"])
+    cache.scan(sample, "fp", scan, kind="names")
+    assert cache.scan(str(copy), "fp", scan, kind="names") == ["a"]
+    assert scan.calls == 1
+
+
+def test_signature_sets_keep_their_own_verdicts(cache, sample):
+    old, new = Counter(["old"]), Counter(["new"])
+    cache.scan(sample, "fp-a", old, kind="names")
+    cache.scan(sample, "fp-b", new, kind="names")
+    # Alternating sets must not invalidate each other
+    assert cache.scan(sample, "fp-a", old, kind="names") == ["old"]
+    assert cache.scan(sample, "fp-b", new, kind="names") == ["new"]
+    assert (old.calls, new.calls) == (1, 1)
+
+
+def test_drop_stale_keeps_only_the_current_set(cache, sample):
+    content_hash = cache.content_hash(sample)
+    cache.put(content_hash, "fp-a", ["old"], "names")
+    cache.put(content_hash, "fp-b", ["new"], "names")
+    assert cache.drop_stale("fp-b") == 1
+    assert cache.get(content_hash, "fp-a", "names") is None
+    assert cache.get(content_hash, "fp-b", "names") == ["new"]
+
+
+def test_kinds_are_separate(cache, sample):
+    content_hash = cache.content_hash(sample)
+    cache.put(content_hash, "fp", ["a"], "names")
+    assert cache.get(content_hash, "fp", "result") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / "small.sqlite"), max_bytes=20000)
+    try:
+        for i in range(100):
+            cache.put(f"hash{i:03d}", "fp", {"pad": "x" * 400}, "result")
+        assert cache.size() <= 20000
+        assert cache.get("hash099", "fp") is not None
+        assert cache.get("hash000", "fp") is None
+    finally:
+        cache.close()
+
+
+def test_fingerprint_follows_the_signature_set(tmp_path):
+    signatures = [{"name": "a", "type": 0, "offset": "*", "pattern": "deadbeef"}]
+    changed = [dict(signatures[0], pattern="deadbeee")]
+    assert signature_fingerprint(signatures) == signature_fingerprint(list(signatures))
+    assert signature_fingerprint(signatures) != signature_fingerprint(changed)
+    path = tmp_path / "sigs.json"
+    path.write_text("[]")
+    assert signature_fingerprint(str(path)) != signature_fingerprint(str(path), max_signatures=1)
+
+
+def test_running_size_matches_the_tables(tmp_path, sample):
+    cache = ResultCache(str(tmp_path / "sized.sqlite"), max_bytes=6000)
+    try:
+        content_hash = cache.content_hash(sample)
+        for i in range(40):
+            cache.put(content_hash, f"fp{i % 3}", {"pad": "x" * (i * 7)}, "result")
+            cache.put(f"hash{i}", "fp0", ["a"] * i, "names")
+        cache.drop_stale("fp0")
+        assert cache.size() == cache._total()
+    finally:
+        cache.close()
+    reopened = ResultCache(str(tmp_path / "sized.sqlite"), max_bytes=6000)
+    try:
+        assert reopened.size() == reopened._total() <= 6000
+    finally:
+        reopened.close()
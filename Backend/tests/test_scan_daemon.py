@@ -0,0 +1,110 @@
+"""Scan daemon protocol: framing of every request kind, errors, and pipelined requests."""
+
+import asyncio
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+import pytest
+
+from scan_client import ScanClient, ScanDaemonError
+from scan_daemon import ScanDaemon, SessionEngine
+
+MARK = bytes.fromhex("0badc0dedeadbeef")
+SIGNATURES = [{"name": "Test.Mark", "type": 0, "offset": "*", "pattern": MARK.hex()}]
+
+
+@pytest.fixture(scope="module")
+def socket_path(tmp_path_factory):
+    signature_path = tmp_path_factory.mktemp("daemon") / "signatures.json"
+    signature_path.write_text(json.dumps(SIGNATURES))
+    # AF_UNIX paths are short: keep the socket out of pytest's deep tmp tree
+    socket_dir = tempfile.mkdtemp(prefix="scand-")
+    path = os.path.join(socket_dir, "scan.sock")
+    engine = SessionEngine(str(signature_path), backend="cpu")
+    daemon = ScanDaemon(engine, path)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(daemon.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield path
+    asyncio.run_coroutine_threadsafe(daemon.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    engine.shutdown()
+    shutil.rmtree(socket_dir)
+
+
+@pytest.fixture
+def files(tmp_path):
+    infected = tmp_path / "infected.bin"
+    infected.write_bytes(b"\n" * 10 + MARK + b"\r\n")
+    clean = tmp_path / "clean.bin"
+    clean.write_bytes(bytes(100))
+    return str(infected), str(clean)
+
+
+def raw_exchange(socket_path, request):
+    """Send raw request bytes, then read response lines until the daemon closes or goes quiet."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(10)
+        sock.connect(socket_path)
+        sock.sendall(request)
+        sock.shutdown(socket.SHUT_WR)
+        data = b""
+        while chunk := sock.recv(65536):
+            data += chunk
+    return [json.loads(line) for line in data.splitlines()]
+
+
+def test_requests_share_one_connection(socket_path, files):
+    infected, clean = files
+    with ScanClient(socket_path, timeout=30) as client:
+        assert client.ping()
+        assert client.scan(infected)["matched_signatures"] == [("Test.Mark", 1)]
+        assert client.scan(clean)["matches_found"] == 0
+        # Raw bytes with line breaks inside must not be read as requests
+        assert client.scan_bytes(b"\n\n" + MARK + b"\nSCAN x\n")["threat_names"] == ["Test.Mark"]
+        assert client.scan_bytes(b"")["file_size"] == 0
+        results = client.scan_batch([infected, clean + ".missing", clean])
+        assert [r.get("threat_names") for r in results] == [["Test.Mark"], None, []]
+        assert "error" in results[1]
+        assert client.stats()["requests"] >= 7
+
+
+def test_errors_keep_the_connection(socket_path, files):
+    infected, _ = files
+    with ScanClient(socket_path, timeout=30) as client:
+        with pytest.raises(ScanDaemonError, match="unknown command"):
+            client._request(b"FROB\n")
+        with pytest.raises(ScanDaemonError):
+            client.scan(infected + ".missing")
+        with pytest.raises(ScanDaemonError, match="needs a path"):
+            client._request(b"SCAN\n")
+        assert client.ping()
+
+
+def test_pipelined_requests_answer_in_order(socket_path, files):
+    infected, clean = files
+    body = MARK * 3
+    request = (b"PING\n" + f"SCAN {infected}\n".encode() + f"INSTREAM {len(body)}\n".encode() + body
+               + f"BATCH 2\n{clean}\n{infected}\n".encode() + b"PING\n")
+    responses = raw_exchange(socket_path, request)
+    assert [r["ok"] for r in responses] == [True] * 5
+    assert responses[1]["result"]["matches_found"] == 1
+    assert responses[2]["result"]["matched_signatures"] == [["Test.Mark", 3]]
+    assert [r["threat_names"] for r in responses[3]["results"]] == [[], ["Test.Mark"]]
+
+
+@pytest.mark.parametrize("header", [b"INSTREAM abc\n", b"INSTREAM -1\n", b"INSTREAM 999999999999\n", b"BATCH 100001\n"])
+def test_bad_lengths_answer_then_close(socket_path, header):
+    # The body can't be skipped, so whatever follows is never read as a request
+    responses = raw_exchange(socket_path, header + b"PING\n")
+    assert len(responses) == 1 and not responses[0]["ok"]
+
+
+def test_truncated_stream_closes_quietly(socket_path):
+    assert raw_exchange(socket_path, b"INSTREAM 100\n" + b"x" * 10) == []
@@ -0,0 +1,104 @@
+"""Compiled signature DB: build/open round trip and incremental updates against a fresh build."""
+
+import numpy as np
+import pytest
+
+from pattern_matcher import SignatureMatcher
+from sigdb import build_sections, compile_signature_db, open_signature_db, update_signature_db
+
+
+def _signature(i, pattern, type_=0, offset="*"):
+    return {"name": f"Test.Sig{i}", "type": type_, "offset": offset, "pattern": pattern}
+
+
+SIGNATURES = [
+    _signature(0, "deadbeef"),
+    _signature(1, "de??beef", type_=1),
+    _signature(2, "6a617661{2-4}c0ffee"),
+    _signature(3, "0badf00d*feedface"),
+    _signature(4, "cafe(0102|aabbcc)babe", offset="0"),
+    _signature(5, "d?a?b?e?"),
+    _signature(6, "not hex at all"),
+]
+
+
+def sample():
+    data = bytearray(4096)
+    for pos, hex_bytes in ((10, "deadbeef"), (100, "de00beef"), (200, "6a617661aabbccc0ffee"),
+                           (400, "0badf00d"), (900, "feedface"), (1500, "deadbeef")):
+        data[pos:pos + len(hex_bytes) // 2] = bytes.fromhex(hex_bytes)
+    data[0:6] = bytes.fromhex("cafe0102babe")
+    return bytes(data)
+
+
+def _counts(path, data):
+    db = open_signature_db(path)
+    try:
+        return dict(zip(db.names, db.matcher().scan(data).tolist()))
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return compile_signature_db(SIGNATURES, str(tmp_path / "signatures.db"))
+
+
+def test_open_returns_what_was_compiled(db_path):
+    db = open_signature_db(db_path)
+    try:
+        assert list(db.names) == [s["name"] for s in SIGNATURES]
+        assert list(db.bodies) == [s["pattern"] for s in SIGNATURES]
+        assert list(db.offsets) == [s["offset"] for s in SIGNATURES]
+        assert db.types.tolist() == [s["type"] for s in SIGNATURES]
+        assert db.generation == 0
+    finally:
+        db.close()
+
+
+def test_mapped_matcher_matches_a_fresh_one(db_path):
+    data = sample()
+    fresh = SignatureMatcher([s["name"] for s in SIGNATURES], [s["pattern"] for s in SIGNATURES])
+    counts = _counts(db_path, data)
+    assert list(counts.values()) == fresh.scan(data).tolist()
+    assert counts["Test.Sig0"] == 2 and counts["Test.Sig4"] == 1 and counts["Test.Sig6"] == 0
+
+
+def test_sections_do_not_depend_on_the_batch_size():
+    whole = build_sections(SIGNATURES)
+    for batch_size in (1, 3):
+        batched = build_sections(SIGNATURES, batch_size=batch_size)
+        assert batched.keys() == whole.keys()
+        for name in whole:
+            assert np.array_equal(batched[name], whole[name]), name
+
+
+def test_update_matches_a_fresh_build(db_path, tmp_path):
+    upserts = [_signature(1, "deadbeef"), _signature(7, "feedface")]
+    summary = update_signature_db(db_path, upserts, drops=["Test.Sig3", "Test.Missing"])
+    assert summary == {"generation": 1, "signatures": 7, "added": 1, "replaced": 1, "dropped": 1}
+
+    final = [s for s in SIGNATURES if s["name"] not in ("Test.Sig1", "Test.Sig3")] + upserts
+    fresh_path = compile_signature_db(final, str(tmp_path / "fresh.db"))
+    data = sample()
+    assert _counts(db_path, data) == _counts(fresh_path, data)
+    assert _counts(db_path, data)["Test.Sig1"] == 2
+
+    db = open_signature_db(db_path)
+    try:
+        assert db.generation == 1
+        assert list(db.names) == [s["name"] for s in final]
+        assert db.types.tolist() == [s["type"] for s in final]
+    finally:
+        db.close()
+
+
+def test_open_db_keeps_its_generation_across_an_update(db_path):
+    db = open_signature_db(db_path)
+    try:
+        update_signature_db(db_path, [], drops=["Test.Sig0"])
+        assert "Test.Sig0" in list(db.names)
+        assert db.matcher().scan(sample()).tolist()[0] == 2
+    finally:
+        db.close()
+    assert "Test.Sig0" not in _counts(db_path, sample())
@@ -0,0 +1,52 @@
+"""Streaming signature reader: JSON arrays and JSON Lines, whatever the block boundaries."""
+
+import json
+
+import pytest
+
+from signature_stream import stream_signatures, write_signatures_jsonl
+
+SIGNATURES = [
+    {"name": "Test.Plain", "type": 0, "offset": "*", "pattern": "deadbeef"},
+    {"name": 'Test.Quote\\"},{"name": "fake"}', "type": 1, "offset": "EP+0", "pattern": "c0ffee"},
+    {"name": "Test.Nested", "type": 10, "offset": "*", "pattern": "0badf00d", "extra": {"list": [1, {"a": "}]"}]}},
+    {"name": "Test.Unicode é☃", "type": 0, "offset": "0,100", "pattern": "cafe(01|02)babe"},
+    {"name": "Test.Number", "type": 6, "offset": "*", "pattern": "ab" * 300, "weight": 12345678901234},
+]
+
+
+def _write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_json_array_round_trips(tmp_path, block_size, indent):
+    path = _write(tmp_path / "signatures.json", json.dumps(SIGNATURES, indent=indent))
+    assert list(stream_signatures(path, block_size)) == SIGNATURES
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 1 << 20])
+def test_json_lines_round_trip(tmp_path, block_size):
+    path = str(tmp_path / "signatures.jsonl")
+    write_signatures_jsonl(SIGNATURES, path)
+    assert list(stream_signatures(path, block_size)) == SIGNATURES
+
+
+def test_format_comes_from_the_content(tmp_path):
+    lines = "\n\n" + "\n".join(json.dumps(sig) for sig in SIGNATURES) + "\n\n\n"
+    assert list(stream_signatures(_write(tmp_path / "named.json", lines), 16)) == SIGNATURES
+    array = "  \n" + json.dumps(SIGNATURES)
+    assert list(stream_signatures(_write(tmp_path / "named.jsonl", array), 5)) == SIGNATURES
+
+
+@pytest.mark.parametrize("text", ["", "   \n", "[]", " [ \n ] "])
+def test_empty_files_yield_nothing(tmp_path, text):
+    assert list(stream_signatures(_write(tmp_path / "empty.json", text), 2)) == []
+
+
+@pytest.mark.parametrize("text", ['[{"name": "a"}', '[{"name": "a"} {"name": "b"}]', '[{"name": "a"},'])
+def test_malformed_arrays_raise(tmp_path, text):
+    with pytest.raises(ValueError):
+        list(stream_signatures(_write(tmp_path / "bad.json", text), 4))
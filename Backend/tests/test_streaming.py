@@ -0,0 +1,55 @@
+"""Streaming scans: overlapping windows count every match, boundary-straddling ones exactly once."""
+
+import numpy as np
+import pytest
+
+from cpu_scanner_caller import scan_stream
+from file_utils import iter_buffer_windows, read_file_with_overlap
+from pattern_matcher import SignatureMatcher
+from test_pattern_matcher import BODIES, planted_data
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return SignatureMatcher([f"sig{i}" for i in range(len(BODIES))], BODIES)
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64, 1000, 4093])
+def test_stream_windows_count_boundary_matches_once(matcher, chunk_size):
+    data = planted_data(11)
+    state = matcher.new_stream()
+    for base, new_start, window in iter_buffer_windows(data, matcher.max_span - 1, chunk_size):
+        matcher.scan_window(window, base, new_start, state)
+    matcher.scan_offsets(data, state.counts)
+    assert np.array_equal(state.counts, matcher.scan(data))
+
+
+def test_match_straddling_every_window_boundary():
+    # One copy of the pattern across each boundary of 100-byte chunks
+    matcher = SignatureMatcher(["literal", "wild", "gapped"], ["a1b2c3d4e5", "a1??c3d4e5", "a1b2{1-2}d4e5"])
+    data = bytearray(1000)
+    for boundary in range(100, 1000, 100):
+        data[boundary - 3:boundary + 2] = bytes.fromhex("a1b2c3d4e5")
+    data = bytes(data)
+    state = matcher.new_stream()
+    for base, new_start, window in iter_buffer_windows(data, matcher.max_span - 1, 100):
+        matcher.scan_window(window, base, new_start, state)
+    assert state.counts.tolist() == [9, 9, 9]
+
+
+@pytest.mark.parametrize("chunk_size", [100, 4096])
+def test_file_windows_cover_the_file_once(tmp_path, chunk_size):
+    data = planted_data(5, size=10000)
+    path = tmp_path / "sample.bin"
+    path.write_bytes(data)
+    fresh = b"".join(window[new_start:] for _, new_start, window in read_file_with_overlap(str(path), 37, chunk_size))
+    assert fresh == data
+    for base, _, window in read_file_with_overlap(str(path), 37, chunk_size):
+        assert data[base:base + len(window)] == window
+
+
+def test_stream_scan_of_a_file_matches_the_whole_buffer(matcher, tmp_path):
+    data = planted_data(7)
+    path = tmp_path / "sample.bin"
+    path.write_bytes(data)
+    assert np.array_equal(scan_stream(matcher, str(path), chunk_size=4096), matcher.scan(data))
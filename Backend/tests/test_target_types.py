@@ -0,0 +1,69 @@
+"""Target-type dispatch: file classification and the signatures evaluated per file."""
+
+import json
+
+import numpy as np
+import pytest
+
+from cpu_scanner_caller import scan_file
+from file_types import classify, TARGET_ANY, TARGET_ELF, TARGET_PDF, TARGET_PE
+from pattern_matcher import SignatureMatcher
+from scanner import CPUScanner
+
+MARK = "c0debabe"
+SIGNATURES = [
+    {"name": "Any.Mark", "type": "0", "offset": "*", "pattern": MARK},
+    {"name": "Pe.Mark", "type": "1", "offset": "*", "pattern": MARK},
+    {"name": "Pdf.Mark", "type": "10", "offset": "*", "pattern": MARK},
+    {"name": "Elf.Mark", "type": "6", "offset": "*", "pattern": MARK},
+]
+
+
+def pdf_bytes():
+    return b"%PDF-1.7\n" + bytes.fromhex(MARK) + b"\n%%EOF\n"
+
+
+@pytest.mark.parametrize("data, expected", [
+    (b"%PDF-1.4\n", (TARGET_ANY, TARGET_PDF)),
+    (b"\x7fELF\x02\x01" + bytes(64), (TARGET_ANY, TARGET_ELF)),
+    (bytes(range(256)) * 4, (TARGET_ANY,)),
+])
+def test_classify_by_magic(data, expected):
+    assert classify(data) == expected
+
+
+def test_for_targets_keeps_type_0_and_the_file_type():
+    matcher = SignatureMatcher([s["name"] for s in SIGNATURES], [MARK] * 4,
+                               types=np.array([0, TARGET_PE, TARGET_PDF, TARGET_ELF], dtype=np.int16))
+    data = pdf_bytes()
+    restricted = matcher.for_targets(classify(data))
+    assert restricted.scan(data).tolist() == [1, 0, 1, 0]
+    assert restricted.signature_count == 2
+    assert matcher.for_targets(classify(data)) is restricted
+
+
+@pytest.fixture
+def signature_path(tmp_path):
+    path = tmp_path / "signatures.json"
+    path.write_text(json.dumps(SIGNATURES))
+    return str(path)
+
+
+def test_scan_file_reports_the_evaluated_set(tmp_path, signature_path):
+    target = tmp_path / "doc.pdf"
+    target.write_bytes(pdf_bytes())
+    result = scan_file(str(target), signature_path)
+    assert result["threat_names"] == ["Any.Mark", "Pdf.Mark"]
+    assert result["target_types"] == [TARGET_ANY, TARGET_PDF]
+    assert result["signatures_checked"] == 2
+    assert result["backend"] == "cpu"
+
+
+def test_cpu_paths_return_the_same_schema(tmp_path, signature_path):
+    target = tmp_path / "doc.pdf"
+    target.write_bytes(pdf_bytes())
+    from_file = scan_file(str(target), signature_path)
+    from_session = CPUScanner(signature_path).scan(str(target))
+    assert from_file.keys() == from_session.keys()
+    for key in ("matched_signatures", "target_types", "file_types", "signatures_checked"):
+        assert from_file[key] == from_session[key]